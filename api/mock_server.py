@@ -0,0 +1,223 @@
+"""Local stand-in for the NovelAI image endpoint, for offline load testing
+
+Run a server:
+    python -m api.mock_server --port 8765 --latency 0.5 --error-rate 0.05
+
+Point the app at it with IMAGE_BASE_URL=http://127.0.0.1:8765, or measure
+client-side throughput directly:
+    python -m api.mock_server --load-test 500 --concurrency 16
+"""
+import argparse
+import io
+import json
+import random
+import struct
+import threading
+import time
+import zipfile
+import zlib
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.png_metadata import PNG_SIGNATURE, make_chunk, text_chunk
+
+
+@lru_cache(maxsize=64)
+def _solid_idat(width: int, height: int, rgb: tuple) -> bytes:
+    """Compressed pixel data for a solid colour image (cached - encoding dominates)"""
+    row = b'\x00' + bytes(rgb) * width
+    return zlib.compress(row * height, 1)
+
+
+def make_png(width: int, height: int, seed: int, comment: str = '') -> bytes:
+    """Build a solid colour PNG whose colour is derived from the seed"""
+    rng = random.Random(seed)
+    rgb = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+
+    chunks = [make_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))]
+    for key, value in (("Software", "NovelAI"), ("Source", "LocalNAI mock server"), ("Comment", comment)):
+        if value:
+            chunks.append(text_chunk(key, value))
+    chunks.append(make_chunk(b'IDAT', _solid_idat(width, height, rgb)))
+    chunks.append(make_chunk(b'IEND', b''))
+    return PNG_SIGNATURE + b''.join(chunks)
+
+
+class MockNovelAIHandler(BaseHTTPRequestHandler):
+    """Implements POST /ai/generate-image with the behaviour configured on the server"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        server = self.server
+
+        if self.path != '/ai/generate-image':
+            return self._reply(404, b'Not found', 'text/plain')
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            return self._reply(401, b'Unauthorized', 'text/plain')
+
+        try:
+            request_data = json.loads(body)
+            params = request_data['parameters']
+        except (ValueError, KeyError):
+            return self._reply(400, b'Malformed request', 'text/plain')
+
+        with server.stats_lock:
+            server.stats['requests'] += 1
+            # Concurrency limit mirrors NovelAI answering 429 for parallel generations
+            over_limit = server.max_concurrent and server.active >= server.max_concurrent
+            if not over_limit:
+                server.active += 1
+
+        if over_limit or random.random() < server.rate_limit_rate:
+            with server.stats_lock:
+                server.stats['429'] += 1
+                if not over_limit:
+                    server.active -= 1
+            return self._reply(429, b'Concurrent generation is locked', 'text/plain')
+
+        try:
+            time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+
+            if random.random() < server.error_rate:
+                with server.stats_lock:
+                    server.stats['500'] += 1
+                return self._reply(500, b'Simulated server error', 'text/plain')
+
+            content = self._build_zip(request_data, params)
+            with server.stats_lock:
+                server.stats['200'] += 1
+            self._reply(200, content, 'application/x-zip-compressed')
+        finally:
+            with server.stats_lock:
+                server.active -= 1
+
+    def _build_zip(self, request_data: dict, params: dict) -> bytes:
+        width = int(params.get('width', 832))
+        height = int(params.get('height', 1216))
+        seed = int(params.get('seed', 0))
+        n_samples = max(1, int(params.get('n_samples', 1)))
+
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) as zip_file:
+            for index in range(n_samples):
+                comment = dict(params, seed=seed + index, model=request_data.get('model'))
+                comment.pop('v4_prompt', None)
+                comment.pop('v4_negative_prompt', None)
+                zip_file.writestr(f"image_{index}.png", make_png(width, height, seed + index, json.dumps(comment)))
+        return output.getvalue()
+
+    def _reply(self, status: int, content: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class MockNovelAIServer(ThreadingHTTPServer):
+    """Threaded mock server with configurable latency, error rate and 429s"""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 max_concurrent: int = 0, verbose: bool = False):
+        super().__init__((host, port), MockNovelAIHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.max_concurrent = max_concurrent  # 0 = unlimited
+        self.verbose = verbose
+        self.active = 0
+        self.stats = {'requests': 0, '200': 0, '429': 0, '500': 0}
+        self.stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve from a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def run_load_test(client, total: int, concurrency: int, n_samples: int = 1) -> dict:
+    """Fire total generations through client from concurrency threads and time them"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def generate(index):
+        # Distinct seeds so requests are neither coalesced nor cached
+        return len(client.generate_images(f"load test {index}", seed=index, n_samples=n_samples))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        images = sum(executor.map(generate, range(total)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'requests': total,
+        'images': images,
+        'seconds': elapsed,
+        'requests_per_second': total / elapsed if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock NovelAI image generation server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds per generation")
+    parser.add_argument('--jitter', type=float, default=0.0, help="+/- seconds added to latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of 500 responses")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="fraction of 429 responses")
+    parser.add_argument('--max-concurrent', type=int, default=0, help="429 above this many active requests")
+    parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--load-test', type=int, default=0, metavar='N',
+                        help="run N generations against an in-process server and exit")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--samples', type=int, default=1)
+    args = parser.parse_args()
+
+    server = MockNovelAIServer(args.host, 0 if args.load_test else args.port, args.latency, args.jitter,
+                               args.error_rate, args.rate_limit_rate, args.max_concurrent, args.verbose)
+
+    if args.load_test:
+        from novelai_api import NovelAIClient
+        server.start()
+        try:
+            client = NovelAIClient(api_key='mock', image_base_url=server.url)
+            result = run_load_test(client, args.load_test, args.concurrency, args.samples)
+        finally:
+            server.stop()
+        print(f"{result['requests']} requests, {result['images']} images in {result['seconds']:.2f}s "
+              f"({result['requests_per_second']:.1f} req/s) - server stats: {server.stats}")
+        return
+
+    print(f"Mock NovelAI server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
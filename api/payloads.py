@@ -0,0 +1,123 @@
+"""Prebuilt /ai/generate-image request templates and payload encoding"""
+import json
+from types import MappingProxyType
+from typing import Dict
+
+try:
+    import orjson  # Optional - much faster encoding for batch payload building
+except ImportError:
+    orjson = None
+
+# Models offered in the parameters panel
+MODELS = (
+    'nai-diffusion-4-5-full',
+    'nai-diffusion-4-5-curated',
+    'nai-diffusion-4-full',
+    'nai-diffusion-4-curated-preview',
+    'nai-diffusion-3',
+    'nai-diffusion-furry-3',
+)
+
+# Parameter skeleton in wire order. Keys set to None are filled per call;
+# empty lists are tuples so templates can be shared without being mutated.
+_PARAMETER_SKELETON = {
+    "params_version": 1,
+    "width": None,
+    "height": None,
+    "scale": None,
+    "sampler": None,
+    "steps": None,
+    "seed": None,
+    "n_samples": None,
+    "ucPreset": 3,
+    "qualityToggle": False,
+    "sm": False,
+    "sm_dyn": False,
+    "dynamic_thresholding": False,
+    "skip_cfg_above_sigma": None,
+    "controlnet_strength": 1.0,
+    "legacy": False,
+    "add_original_image": False,
+    "cfg_rescale": 0.0,
+    "noise_schedule": None,
+    "legacy_v3_extend": False,
+    "uncond_scale": 1.0,
+    "negative_prompt": None,
+    "prompt": None,
+    "reference_image_multiple": (),
+    "reference_information_extracted_multiple": (),
+    "reference_strength_multiple": (),
+    "extra_noise_seed": None,
+    "v4_prompt": None,
+    "v4_negative_prompt": None,
+}
+
+
+class PayloadTemplate:
+    """Immutable request skeleton for one model; build() fills in the per-call fields"""
+    
+    __slots__ = ('model', 'parameters')
+    
+    def __init__(self, model: str):
+        self.model = model
+        self.parameters = MappingProxyType(dict(_PARAMETER_SKELETON))
+    
+    def build(self, prompt: str, negative_prompt: str = 'lowres', width: int = 832,
+              height: int = 1216, scale: float = 5.0, sampler: str = 'k_euler',
+              steps: int = 28, seed: int = 0, n_samples: int = 1,
+              scheduler: str = 'native') -> dict:
+        """Return a request payload for this model"""
+        # A dict copy of a flat mapping is a single C-level pass; nested values
+        # that never vary are shared with the template
+        params = dict(self.parameters)
+        params.update(
+            width=width,
+            height=height,
+            scale=scale,
+            sampler=sampler,
+            steps=steps,
+            seed=seed,
+            n_samples=n_samples,
+            noise_schedule=scheduler,
+            negative_prompt=negative_prompt,
+            prompt=prompt,
+            extra_noise_seed=seed,
+            v4_prompt=_v4_caption(prompt),
+            v4_negative_prompt=_v4_caption(negative_prompt),
+        )
+        
+        return {
+            "input": prompt,
+            "model": self.model,
+            "action": "generate",
+            "parameters": params
+        }
+
+
+def _v4_caption(caption: str) -> dict:
+    return {
+        "use_coords": False,
+        "use_order": False,
+        "caption": {
+            "base_caption": caption,
+            "char_captions": ()
+        }
+    }
+
+
+_TEMPLATES: Dict[str, PayloadTemplate] = {model: PayloadTemplate(model) for model in MODELS}
+
+
+def get_payload_template(model: str) -> PayloadTemplate:
+    """Get the template for a model, creating one for models outside MODELS"""
+    template = _TEMPLATES.get(model)
+    if template is None:
+        template = _TEMPLATES.setdefault(model, PayloadTemplate(model))
+    return template
+
+
+def encode_payload(request_data: dict) -> bytes:
+    """Serialize a request payload to compact JSON bytes (orjson when installed)"""
+    if orjson is not None:
+        return orjson.dumps(request_data)
+    return json.dumps(request_data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
@@ -0,0 +1,42 @@
+"""HTTP transports used by NovelAIClient"""
+import threading
+
+
+class TransportResponse:
+    """Minimal response returned by every transport"""
+    
+    __slots__ = ('status_code', 'content')
+    
+    def __init__(self, status_code: int, content: bytes):
+        self.status_code = status_code
+        self.content = content
+    
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+
+class Transport:
+    """Base transport - subclasses send a POST and return a TransportResponse"""
+    
+    def post(self, url: str, headers: dict, body: bytes, timeout: float) -> TransportResponse:
+        raise NotImplementedError
+
+
+class RequestsTransport(Transport):
+    """Default transport backed by requests, with one pooled session per thread"""
+    
+    def __init__(self):
+        self._local = threading.local()
+    
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            import requests
+            session = requests.Session()
+            self._local.session = session
+        return session
+    
+    def post(self, url: str, headers: dict, body: bytes, timeout: float) -> TransportResponse:
+        response = self._session().post(url, headers=headers, data=body, timeout=timeout)
+        return TransportResponse(response.status_code, response.content)
@@ -0,0 +1,134 @@
+"""Headless generation without Qt, for scripts, servers and cron
+
+    python -m cli "1girl, smile, {red|blue} dress" --count 4 --output ./out
+    python -m cli --manifest jobs.jsonl
+
+Prompts go through the same wildcard expansion and assembly as the GUI, and
+images are written by the background AutoSaver with their NovelAI metadata.
+Progress goes to stdout. Nothing here imports Qt, and the API client, saver
+and wildcard library are only imported once arguments have been checked.
+"""
+import argparse
+import random
+import sys
+from utils.batch_runner import DEFAULT_PARAMS as DEFAULTS
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Generate NovelAI images without the GUI")
+    parser.add_argument('prompt', nargs='?', help="prompt ({a|b} and __wildcard__ are expanded per image)")
+    parser.add_argument('--manifest', help="run a JSONL batch manifest instead (resumable, see utils/batch_runner.py)")
+    parser.add_argument('-n', '--negative', default='', help="negative prompt")
+    parser.add_argument('--model', default=DEFAULTS['model'])
+    parser.add_argument('--width', type=int, default=DEFAULTS['width'])
+    parser.add_argument('--height', type=int, default=DEFAULTS['height'])
+    parser.add_argument('--steps', type=int, default=DEFAULTS['steps'])
+    parser.add_argument('--scale', type=float, default=DEFAULTS['scale'], help="CFG scale")
+    parser.add_argument('--sampler', default=DEFAULTS['sampler'])
+    parser.add_argument('--scheduler', default=DEFAULTS['scheduler'])
+    parser.add_argument('--seed', type=int, default=-1,
+                        help="seed of the first image; later requests continue from it (-1: random)")
+    parser.add_argument('--samples', type=int, default=1, choices=range(1, 5), metavar='1-4',
+                        help="images per request")
+    parser.add_argument('--count', type=int, default=1, help="number of requests")
+    parser.add_argument('--wildcard-mode', default='random', choices=('random', 'combinatorial'))
+    parser.add_argument('--no-quality', action='store_true', help="don't append the positive quality tags")
+    parser.add_argument('--no-negative-quality', action='store_true', help="don't append the negative quality tags")
+    parser.add_argument('-o', '--output', help="output folder (default: AUTO_SAVE_DIR)")
+    parser.add_argument('--name', help="filename template, e.g. {timestamp}_{seed}_{model} (default: AUTO_SAVE_TEMPLATE)")
+    return parser
+
+
+def generate(args) -> int:
+    """Run --count requests from the command line prompt - returns the number that failed"""
+    from config import Config
+    from novelai_api import NovelAIClient
+    from utils.auto_saver import AutoSaver
+    from utils.prompt_assembly import PromptInputs, assemble_prompt
+    from utils.wildcards import PromptExpander, WildcardLibrary, expand_prompt_inputs, has_wildcards
+
+    client = NovelAIClient()
+    saver = AutoSaver(args.output or Config.AUTO_SAVE_DIR, args.name or Config.AUTO_SAVE_TEMPLATE,
+                      Config.AUTO_SAVE_FSYNC)
+    library = WildcardLibrary(Config.WILDCARD_DIR)
+
+    inputs = PromptInputs(args.prompt or '', args.negative, not args.no_quality, not args.no_negative_quality)
+    first_seed = args.seed if args.seed >= 0 else random.randint(0, 2147483647)
+    params = {
+        'model': args.model,
+        'width': args.width,
+        'height': args.height,
+        'steps': args.steps,
+        'scale': args.scale,
+        'sampler': args.sampler,
+        'scheduler': args.scheduler,
+        'n_samples': args.samples,
+    }
+
+    attempted = failed = 0
+    try:
+        expander = PromptExpander(library)
+        # Combinatorial expansion ends after the last combination; everything else fills --count
+        total = args.count
+        if args.wildcard_mode == 'combinatorial' and has_wildcards(inputs.prompt):
+            total = min(total, expander.count(inputs.prompt))
+        jobs = expand_prompt_inputs(inputs, expander, args.count, args.wildcard_mode, first_seed)
+        for number, job in enumerate(jobs, 1):
+            attempted = number
+            if args.seed >= 0:
+                # Step past the seeds NovelAI gives this request's other samples, so no image repeats
+                seed = (first_seed + (number - 1) * args.samples) % 2147483648
+            else:
+                seed = first_seed if number == 1 else random.randint(0, 2147483647)
+            assembled = assemble_prompt(job)
+            print(f"[{number}/{total}] seed {seed}: {assembled.prompt}", flush=True)
+
+            images = client.generate_images(assembled.prompt, seed=seed,
+                                            negative_prompt=assembled.negative_prompt, **params)
+            if not images:
+                failed += 1
+                print(f"[{number}/{total}] failed", flush=True)
+                continue
+
+            metadata = dict(params, prompt=assembled.prompt, negative_prompt=assembled.negative_prompt,
+                            n_samples=len(images))
+            for image_bytes, image_seed in images:
+                saver.submit(image_bytes, dict(metadata, seed=image_seed),
+                             on_saved=lambda path: print(f"  saved {path}", flush=True))
+    finally:
+        saver.close()  # Waits for queued images to reach the disk
+        library.close()
+    print(f"Done ({attempted - failed}/{attempted} requests succeeded)")
+    return failed
+
+
+def run_manifest(args) -> int:
+    from utils.batch_runner import main as batch_main
+    argv = [args.manifest] + (['--output', args.output] if args.output else [])
+    return batch_main(argv)
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.manifest and args.prompt:
+        parser.error("give either a prompt or --manifest, not both")
+    if not args.manifest and not args.prompt:
+        parser.error("a prompt is required")
+    if args.count < 1:
+        parser.error("--count must be at least 1")
+
+    try:
+        if args.manifest:
+            return run_manifest(args)
+        return 1 if generate(args) else 0
+    except ValueError as e:  # Missing API key, invalid manifest
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        print("Interrupted", file=sys.stderr)
+        return 130
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,6 +6,33 @@ load_dotenv()
 class Config:
     API_KEY = os.getenv('API_KEY')
     API_BASE_URL = os.getenv('API_BASE_URL', 'https://api.novelai.net')
+    IMAGE_BASE_URL = os.getenv('IMAGE_BASE_URL', 'https://image.novelai.net')
+    DATA_DIR = os.getenv('DATA_DIR', os.path.join(os.path.expanduser('~'), '.localnai'))
+    
+    # Response cache is off unless enabled; identical requests are then served from disk
+    REQUEST_CACHE = os.getenv('REQUEST_CACHE', '').lower() in ('1', 'true', 'yes')
+    REQUEST_CACHE_DIR = os.getenv('REQUEST_CACHE_DIR', os.path.join(DATA_DIR, 'request_cache'))
+    REQUEST_CACHE_MAX_MB = int(os.getenv('REQUEST_CACHE_MAX_MB', '1024'))
+    
+    THUMBNAIL_DIR = os.getenv('THUMBNAIL_DIR', os.path.join(DATA_DIR, 'thumbnails'))
+    
+    # Auto-save writes every result to AUTO_SAVE_DIR in the background
+    AUTO_SAVE = os.getenv('AUTO_SAVE', '').lower() in ('1', 'true', 'yes')
+    AUTO_SAVE_DIR = os.getenv('AUTO_SAVE_DIR', os.path.join(DATA_DIR, 'outputs'))
+    AUTO_SAVE_TEMPLATE = os.getenv('AUTO_SAVE_TEMPLATE', '{timestamp}_{seed}_{model}')
+    AUTO_SAVE_FSYNC = os.getenv('AUTO_SAVE_FSYNC', 'batch')  # never, always or batch
+    
+    HISTORY_DB = os.getenv('HISTORY_DB', os.path.join(DATA_DIR, 'history.db'))
+    
+    # __name__ in a prompt expands to a line of WILDCARD_DIR/name.txt
+    WILDCARD_DIR = os.getenv('WILDCARD_DIR', os.path.join(DATA_DIR, 'wildcards'))
+    
+    # clip_tokenizer.json / t5_tokenizer.json here give exact token counts (estimated otherwise)
+    TOKENIZER_DIR = os.getenv('TOKENIZER_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tags'))
+    
+    # Grid / XYZ plot output (cell images and contact sheets) and requests in flight at once
+    GRID_DIR = os.getenv('GRID_DIR', os.path.join(DATA_DIR, 'grids'))
+    GRID_CONCURRENCY = int(os.getenv('GRID_CONCURRENCY', '1'))
     
     @classmethod
     def validate(cls):
@@ -0,0 +1,368 @@
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+                             QListView, QFileDialog, QAbstractItemView, QLineEdit)
+from PyQt6.QtCore import (Qt, QAbstractListModel, QModelIndex, QObject, QRunnable,
+                          QThreadPool, QSize, QBuffer, QIODevice, pyqtSignal)
+from PyQt6.QtGui import QImage, QPixmap, QColor
+from collections import OrderedDict
+import os
+import tempfile
+import threading
+from utils.image_cache import content_key
+from utils.png_metadata import read_text_chunks, metadata_from_novelai_comment
+from utils.png_indexer import index_folder
+
+
+class GalleryEntry:
+    """One gallery item - either a session image or a PNG on disk.
+
+    Session images start out in memory and are moved to a spill file by a
+    SpillTask; path is set before image_bytes is dropped, so readers on other
+    threads always find one of them.
+    """
+
+    __slots__ = ('row', 'key', 'image_bytes', 'path', 'metadata', 'label', 'session')
+
+    def __init__(self, image_bytes=None, path=None, metadata=None, label=""):
+        self.row = -1
+        self.key = content_key(image_bytes) if image_bytes is not None else None
+        self.image_bytes = image_bytes
+        self.path = path
+        self.metadata = metadata
+        self.label = label
+        self.session = image_bytes is not None
+
+    def load(self):
+        """Return (image_bytes, metadata), reading disk entries on demand"""
+        image_bytes = self.image_bytes
+        if image_bytes is not None:
+            return image_bytes, self.metadata or {}
+        if self.session:
+            with open(self.path, 'rb') as f:
+                return f.read(), self.metadata or {}
+
+        with open(self.path, 'rb') as f:
+            image_bytes = f.read()
+        metadata = {}
+        try:
+            comment = read_text_chunks(image_bytes).get('Comment')
+            if comment:
+                metadata = metadata_from_novelai_comment(comment)
+        except ValueError:
+            pass
+        return image_bytes, metadata
+
+
+class SpillTask(QRunnable):
+    """Move a session image's bytes to a file in folder so the gallery only keeps its path"""
+
+    def __init__(self, entry: GalleryEntry, folder: str):
+        super().__init__()
+        self.entry = entry
+        self.folder = folder
+
+    def run(self):
+        entry = self.entry
+        path = os.path.join(self.folder, f"{entry.key}.png")
+        try:
+            with open(path, 'wb') as f:
+                f.write(entry.image_bytes)
+        except OSError as e:
+            print(f"Failed to spill gallery image, keeping it in memory: {e}")
+            return
+        entry.path = path
+        entry.image_bytes = None
+
+
+class ListingSignals(QObject):
+    ready = pyqtSignal(int, list)  # request id, entries
+
+
+class ListingTask(QRunnable):
+    """Build a list of folder entries off the GUI thread (folder scans, history searches)"""
+
+    def __init__(self, request_id: int, function, *args):
+        super().__init__()
+        self.request_id = request_id
+        self.function = function
+        self.args = args
+        self.signals = ListingSignals()
+
+    def run(self):
+        try:
+            entries = self.function(*self.args)
+        except Exception as e:
+            print(f"Failed to list images: {e}")
+            entries = []
+        self.signals.ready.emit(self.request_id, entries)
+
+
+def scan_folder(folder: str) -> list:
+    """Entries for the PNGs under folder, newest first"""
+    files = []
+    for root, _, names in os.walk(folder):
+        for name in names:
+            if name.lower().endswith('.png'):
+                path = os.path.join(root, name)
+                try:
+                    files.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+    files.sort(reverse=True)
+    return [GalleryEntry(path=path, label=os.path.basename(path)) for _, path in files]
+
+
+def search_history(history_store, query: str) -> list:
+    """Entries for saved images in the history store that match query and still exist"""
+    entries = []
+    for record in history_store.query(query, limit=5000):
+        if record['path'] and os.path.exists(record['path']):
+            entries.append(GalleryEntry(path=record['path'], label=record['prompt'][:200]))
+    return entries
+
+
+class ThumbnailSignals(QObject):
+    ready = pyqtSignal(object, QImage)  # entry, thumbnail
+
+
+class ThumbnailTask(QRunnable):
+    """Load a thumbnail from the persistent cache, or generate and store it"""
+
+    def __init__(self, entry: GalleryEntry, thumbnail_cache):
+        super().__init__()
+        self.entry = entry
+        self.thumbnail_cache = thumbnail_cache
+        self.signals = ThumbnailSignals()
+
+    def run(self):
+        entry = self.entry
+        cache = self.thumbnail_cache
+        image_bytes = entry.image_bytes
+
+        try:
+            key = entry.key or cache.key_for_file(entry.path)
+            encoded = cache.get(key) if key else None
+
+            if encoded is None and image_bytes is None:
+                with open(entry.path, 'rb') as f:
+                    image_bytes = f.read()
+                if not entry.session:  # Spilled session images already know their key
+                    key = content_key(image_bytes)
+                    cache.remember_file(entry.path, key)
+                    encoded = cache.get(key)
+
+            if encoded is not None:
+                thumbnail = QImage.fromData(encoded)
+            else:
+                thumbnail = QImage.fromData(image_bytes).scaled(
+                    cache.size, cache.size, Qt.AspectRatioMode.KeepAspectRatio,
+                    Qt.TransformationMode.SmoothTransformation)
+                buffer = QBuffer()
+                buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+                thumbnail.save(buffer, "JPG", 85)
+                cache.put(key, bytes(buffer.data()))
+
+            entry.key = key
+        except Exception as e:  # Unreadable or corrupt file; the view keeps its placeholder
+            print(f"Failed to load thumbnail: {e}")
+            thumbnail = QImage()
+
+        self.signals.ready.emit(entry, thumbnail)
+
+
+class GalleryModel(QAbstractListModel):
+    """Virtualized list of gallery entries.
+
+    Thumbnails are only requested for rows the view actually paints, and at most
+    max_thumbnails decoded thumbnails are kept in memory (LRU).
+    """
+
+    def __init__(self, thumbnail_cache, max_thumbnails: int = 512, parent=None):
+        super().__init__(parent)
+        self.thumbnail_cache = thumbnail_cache
+        self.max_thumbnails = max_thumbnails
+        self.entries = []
+        self._thumbnails = OrderedDict()  # entry -> QPixmap
+        self._pending = set()
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(2, QThreadPool.globalInstance().maxThreadCount() // 2))
+        self._spill_dir = None  # Created on the first session image, removed at exit
+
+        self._placeholder = QPixmap(thumbnail_cache.size, thumbnail_cache.size)
+        self._placeholder.fill(QColor("#2d2d2d"))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.entries[index.row()]
+
+        if role == Qt.ItemDataRole.DecorationRole:
+            pixmap = self._thumbnails.get(entry)
+            if pixmap is not None:
+                self._thumbnails.move_to_end(entry)
+                return pixmap
+            self.request_thumbnail(entry)
+            return self._placeholder
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return entry.label
+        if role == Qt.ItemDataRole.UserRole:
+            return entry
+        return None
+
+    def request_thumbnail(self, entry: GalleryEntry):
+        if entry in self._pending:
+            return
+        self._pending.add(entry)
+        task = ThumbnailTask(entry, self.thumbnail_cache)
+        task.signals.ready.connect(self.on_thumbnail_ready)
+        self.pool.start(task)
+
+    def on_thumbnail_ready(self, entry: GalleryEntry, thumbnail: QImage):
+        self._pending.discard(entry)
+        if entry.row < 0 or entry.row >= len(self.entries) or self.entries[entry.row] is not entry:
+            return  # Entry was removed while the thumbnail was loading
+
+        self._thumbnails[entry] = QPixmap.fromImage(thumbnail) if not thumbnail.isNull() else self._placeholder
+        while len(self._thumbnails) > self.max_thumbnails:
+            self._thumbnails.popitem(last=False)
+
+        index = self.index(entry.row)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+    def add_entry(self, entry: GalleryEntry):
+        row = len(self.entries)
+        self.beginInsertRows(QModelIndex(), row, row)
+        entry.row = row
+        self.entries.append(entry)
+        self.endInsertRows()
+        if entry.image_bytes is not None:
+            self.spill(entry)
+
+    def spill(self, entry: GalleryEntry):
+        if self._spill_dir is None:
+            try:
+                self._spill_dir = tempfile.TemporaryDirectory(prefix="localnai_gallery_")
+            except OSError as e:
+                print(f"Failed to create gallery spill folder: {e}")
+                return
+        self.pool.start(SpillTask(entry, self._spill_dir.name))
+
+    def set_folder_entries(self, entries: list):
+        """Replace the on-disk entries, keeping this session's images"""
+        self.beginResetModel()
+        session = [entry for entry in self.entries if entry.session]
+        self.entries = entries + session
+        for row, entry in enumerate(self.entries):
+            entry.row = row
+        self._thumbnails = OrderedDict((entry, pixmap) for entry, pixmap in self._thumbnails.items()
+                                       if entry.session)
+        self.endResetModel()
+
+
+class GalleryPanel(QWidget):
+    """Thumbnail strip of this session's generations and a browsable output folder"""
+
+    image_selected = pyqtSignal(bytes, dict)
+
+    def __init__(self, thumbnail_cache, history_store=None, parent=None):
+        super().__init__(parent)
+        self.history_store = history_store
+        self.model = GalleryModel(thumbnail_cache, parent=self)
+        self._listing_id = 0  # Only the latest folder scan or search is shown
+        self.setup_ui(thumbnail_cache.size)
+
+    def setup_ui(self, thumb_size):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(4)
+
+        header = QHBoxLayout()
+        title = QLabel("🗂️ History")
+        title.setStyleSheet("font-weight: 600; font-size: 12px; color: #ffffff;")
+        header.addWidget(title)
+        
+        # History search, e.g. "tag:long hair cfg>6 sunset"
+        if self.history_store is not None:
+            self.search_input = QLineEdit()
+            self.search_input.setPlaceholderText("Search history: text, tag:…, model:…, seed:…, cfg>6")
+            self.search_input.setMaximumHeight(24)
+            self.search_input.returnPressed.connect(self.run_search)
+            header.addWidget(self.search_input, stretch=1)
+        else:
+            header.addStretch()
+
+        open_btn = QPushButton("📁 Open Folder")
+        open_btn.setMaximumHeight(24)
+        open_btn.clicked.connect(self.choose_folder)
+        header.addWidget(open_btn)
+        layout.addLayout(header)
+
+        # Horizontal strip; uniform item sizes let the view lay out thousands of rows instantly
+        self.list_view = QListView()
+        self.list_view.setModel(self.model)
+        self.list_view.setViewMode(QListView.ViewMode.IconMode)
+        self.list_view.setFlow(QListView.Flow.LeftToRight)
+        self.list_view.setWrapping(False)
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setLayoutMode(QListView.LayoutMode.Batched)
+        self.list_view.setBatchSize(200)
+        self.list_view.setIconSize(QSize(thumb_size, thumb_size))
+        self.list_view.setMovement(QListView.Movement.Static)
+        self.list_view.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.list_view.setHorizontalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.list_view.setFixedHeight(thumb_size + 24)
+        self.list_view.clicked.connect(self.on_item_clicked)
+        layout.addWidget(self.list_view)
+
+    def add_image(self, image_bytes: bytes, metadata: dict):
+        """Add a freshly generated image to the strip"""
+        label = f"Seed: {metadata.get('seed', '?')}"
+        self.model.add_entry(GalleryEntry(image_bytes=image_bytes, metadata=metadata, label=label))
+        self.list_view.scrollToBottom()
+
+    def choose_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Open Image Folder")
+        if folder:
+            self.load_folder(folder)
+
+    def load_folder(self, folder: str):
+        """List the PNGs in folder, newest first; thumbnails load lazily as they scroll into view"""
+        self.start_listing(scan_folder, folder)
+        
+        # Make the folder searchable; only new or modified files are read
+        if self.history_store is not None:
+            threading.Thread(target=index_folder, args=(self.history_store, folder),
+                             name="FolderIndexer", daemon=True).start()
+
+    def run_search(self):
+        """Show saved images from the history store that match the search box"""
+        query = self.search_input.text().strip()
+        if not query:
+            self._listing_id += 1  # Drop any search still running
+            self.model.set_folder_entries([])
+            return
+        self.start_listing(search_history, self.history_store, query)
+    
+    def start_listing(self, function, *args):
+        """Run function(*args) on the worker pool and show the entries it returns"""
+        self._listing_id += 1
+        task = ListingTask(self._listing_id, function, *args)
+        task.signals.ready.connect(self.on_listing_ready)
+        self.model.pool.start(task)
+    
+    def on_listing_ready(self, request_id, entries):
+        if request_id == self._listing_id:
+            self.model.set_folder_entries(entries)
+    
+    def on_item_clicked(self, index):
+        entry = self.model.data(index, Qt.ItemDataRole.UserRole)
+        if entry is None:
+            return
+        try:
+            image_bytes, metadata = entry.load()
+        except OSError as e:
+            print(f"Failed to open image: {e}")
+            return
+        self.image_selected.emit(image_bytes, metadata)
@@ -0,0 +1,100 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QGridLayout, QLabel, QComboBox, QLineEdit,
+                             QSpinBox, QDialogButtonBox, QMessageBox)
+from utils.grid import AXES, GridAxis, parse_axis_values, grid_size, check_grid_size
+
+NO_AXIS = "—"
+
+# Starting values offered when an axis is picked
+DEFAULT_VALUES = {
+    'Seed': "1-4",
+    'CFG': "4-6:1",
+    'Steps': "20, 28",
+    'Sampler': "k_euler_ancestral, k_dpmpp_2m",
+    'Scheduler': "karras, native",
+}
+
+
+class GridDialog(QDialog):
+    """Choose the X/Y/Z axes of a seed sweep or parameter grid"""
+
+    def __init__(self, max_workers: int = 1, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Grid / XYZ Plot")
+        self.setMinimumWidth(460)
+        self.axes = []
+
+        layout = QVBoxLayout(self)
+        grid = QGridLayout()
+        self.rows = []
+        for row, (label, default) in enumerate((("X (columns):", 'Seed'), ("Y (rows):", NO_AXIS),
+                                                ("Z (sheets):", NO_AXIS))):
+            grid.addWidget(QLabel(label), row, 0)
+            combo = QComboBox()
+            combo.addItems([NO_AXIS] + list(AXES) if row else list(AXES))
+            combo.setCurrentText(default)
+            values = QLineEdit(DEFAULT_VALUES.get(default, ""))
+            values.setPlaceholderText("Comma separated; ranges like 1-8 or 4-6:0.5")
+            values.setEnabled(default != NO_AXIS)
+            combo.currentTextChanged.connect(lambda name, values=values: self.on_axis_changed(name, values))
+            values.textChanged.connect(self.update_summary)
+            grid.addWidget(combo, row, 1)
+            grid.addWidget(values, row, 2)
+            self.rows.append((combo, values))
+
+        grid.addWidget(QLabel("Concurrent:"), 3, 0)
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, 8)
+        self.workers_spin.setValue(max_workers)
+        self.workers_spin.setToolTip("Requests in flight at once (NovelAI rate-limits concurrent requests)")
+        grid.addWidget(self.workers_spin, 3, 1)
+        layout.addLayout(grid)
+
+        self.summary_label = QLabel()
+        self.summary_label.setStyleSheet("font-size: 11px; color: #a0a0a0;")
+        layout.addWidget(self.summary_label)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+        self.update_summary()
+
+    def on_axis_changed(self, name, values):
+        values.setEnabled(name != NO_AXIS)
+        values.setText(DEFAULT_VALUES.get(name, ""))
+        self.update_summary()
+
+    def read_axes(self):
+        """[x, y or None, z or None]; raises ValueError for invalid input"""
+        axes = []
+        names = set()
+        for combo, values in self.rows:
+            name = combo.currentText()
+            if name == NO_AXIS:
+                axes.append(None)
+                continue
+            if name in names:
+                raise ValueError(f"{name} is used on more than one axis")
+            names.add(name)
+            axes.append(GridAxis(name, parse_axis_values(name, values.text())))
+        if axes[1] is None and axes[2] is not None:
+            axes[1], axes[2] = axes[2], None  # Fill Y before Z
+        check_grid_size([axis for axis in axes if axis is not None])
+        return axes
+
+    def update_summary(self):
+        try:
+            axes = self.read_axes()
+        except ValueError as e:
+            self.summary_label.setText(f"⚠️ {e}")
+            return
+        total = grid_size([axis for axis in axes if axis is not None])
+        self.summary_label.setText(f"{total} image(s), one request each")
+
+    def accept(self):
+        try:
+            self.axes = self.read_axes()
+        except ValueError as e:
+            QMessageBox.warning(self, "Grid", str(e))
+            return
+        super().accept()
@@ -0,0 +1,78 @@
+from PyQt6.QtCore import QObject, QRunnable, QSize, Qt, pyqtSignal
+from PyQt6.QtGui import QImage
+from utils.image_cache import decoded_image_cache
+
+# Pyramid levels kept per image: full, 1/2 and 1/4 resolution
+PYRAMID_LEVELS = 3
+
+
+def build_pyramid(image: QImage) -> list:
+    """Return [full, 1/2, 1/4] smooth-downscaled copies of image, largest first"""
+    levels = [image]
+    for _ in range(PYRAMID_LEVELS - 1):
+        previous = levels[-1]
+        if previous.width() < 128 or previous.height() < 128:
+            break
+        levels.append(previous.scaled(previous.width() // 2, previous.height() // 2,
+                                      Qt.AspectRatioMode.IgnoreAspectRatio,
+                                      Qt.TransformationMode.SmoothTransformation))
+    return levels
+
+
+def nearest_pyramid_level(levels: list, target_size: QSize) -> QImage:
+    """Smallest level that still has at least as many pixels as the fitted target"""
+    full = levels[0]
+    if full.width() == 0 or full.height() == 0:
+        return full
+    fit = min(target_size.width() / full.width(), target_size.height() / full.height())
+    needed_width = full.width() * fit
+    
+    best = full
+    for level in levels[1:]:
+        if level.width() < needed_width:
+            break
+        best = level
+    return best
+
+
+def scale_to_fit(levels: list, target_size: QSize, smooth: bool = True) -> QImage:
+    """Scale from the nearest pyramid level to fit target_size"""
+    mode = Qt.TransformationMode.SmoothTransformation if smooth else Qt.TransformationMode.FastTransformation
+    return nearest_pyramid_level(levels, target_size).scaled(target_size, Qt.AspectRatioMode.KeepAspectRatio, mode)
+
+
+class ImageDecodeSignals(QObject):
+    """Signals for ImageDecodeTask (QRunnable can't emit signals itself)"""
+    decoded = pyqtSignal(int, list, QImage)  # request id, pyramid levels, image scaled to the target size
+
+
+class ImageDecodeTask(QRunnable):
+    """Decode an image, build its scaling pyramid and smooth-scale it on a worker thread.
+    
+    The task checks is_current(request_id) between steps and quietly gives up
+    once a newer image has been requested, so stale work never reaches the viewer.
+    """
+    
+    def __init__(self, request_id: int, image_bytes: bytes, target_size: QSize, is_current):
+        super().__init__()
+        self.request_id = request_id
+        self.image_bytes = image_bytes
+        self.target_size = target_size
+        self.is_current = is_current
+        self.signals = ImageDecodeSignals()
+    
+    def run(self):
+        if not self.is_current(self.request_id):
+            return
+        
+        image = decoded_image_cache.qimage(self.image_bytes)
+        if image.isNull() or not self.is_current(self.request_id):
+            return
+        
+        levels = build_pyramid(image)
+        if not self.is_current(self.request_id):
+            return
+        
+        scaled = scale_to_fit(levels, self.target_size)
+        if self.is_current(self.request_id):
+            self.signals.decoded.emit(self.request_id, levels, scaled)
@@ -1,34 +1,98 @@
-from PyQt6.QtWidgets import QLabel, QMenu, QMessageBox, QApplication
-from PyQt6.QtCore import Qt, pyqtSignal
-from PyQt6.QtGui import QPixmap, QAction
+from PyQt6.QtWidgets import QLabel, QMenu, QMessageBox, QApplication, QSizePolicy
+from PyQt6.QtCore import Qt, pyqtSignal, QMimeData, QByteArray, QThreadPool, QTimer
+from PyQt6.QtGui import QPixmap, QImage, QAction
 import json
-import io
-from PIL import Image
-from PIL.PngImagePlugin import PngInfo
+from utils.png_metadata import insert_text_chunks, novelai_text_chunks
+from utils.image_cache import decoded_image_cache
+from gui.image_loader import ImageDecodeTask, scale_to_fit
 
 class ImageViewer(QLabel):
     """Custom QLabel with right-click context menu for image operations"""
     
+    # Emitted with the index of the sample now on display
+    image_changed = pyqtSignal(int)
+    
     def __init__(self, parent=None):
         super().__init__(parent)
         self.current_image_data = None
         self.current_metadata = None
+        self.images = []  # [(image_bytes, metadata), ...] for multi-sample results
+        self.current_index = 0
+        
+        # Decoding and scaling happen on a worker; only the newest request is shown
+        self.decode_pool = QThreadPool(self)
+        self.decode_pool.setMaxThreadCount(2)
+        self._decode_request_id = 0
+        self._pyramid = []  # [full, 1/2, 1/4] QImages of the displayed image
+        
+        # Live resizes show a fast preview; the smooth pass runs once resizing stops
+        self.smooth_timer = QTimer(self)
+        self.smooth_timer.setSingleShot(True)
+        self.smooth_timer.timeout.connect(self.apply_smooth_scale)
+        
+        # Let the layout size the viewer - otherwise the pixmap would stop it shrinking
+        self.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
         self.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.setStyleSheet("border: 1px solid gray; min-height: 400px;")
         self.setText("No image generated yet")
         
+    def set_images(self, images: list):
+        """Set a group of (image_bytes, metadata) samples and show the first one"""
+        self.images = list(images)
+        if self.images:
+            self.show_image(0)
+    
+    def show_image(self, index: int):
+        """Display the sample at index from the current set"""
+        if not 0 <= index < len(self.images):
+            return
+        self.current_index = index
+        image_data, metadata = self.images[index]
+        self._display(image_data, metadata)
+        self.image_changed.emit(index)
+    
     def set_image(self, image_data: bytes, metadata: dict):
         """Set the image and its metadata"""
+        self.set_images([(image_data, metadata)])
+    
+    def _display(self, image_data: bytes, metadata: dict):
+        """Decode and show a single image"""
         self.current_image_data = image_data
         self.current_metadata = metadata
         
-        # Convert to pixmap and display
-        pixmap = QPixmap()
-        pixmap.loadFromData(image_data)
+        # Bumping the id cancels any decode still queued or running for the previous image
+        self._decode_request_id += 1
+        task = ImageDecodeTask(self._decode_request_id, image_data, self.size(), self.is_current_decode)
+        task.signals.decoded.connect(self.on_image_decoded)
+        self.decode_pool.start(task)
+    
+    def is_current_decode(self, request_id: int) -> bool:
+        """Whether request_id is still the image the viewer wants (called from workers)"""
+        return request_id == self._decode_request_id
+    
+    def on_image_decoded(self, request_id: int, levels: list, image: QImage):
+        """Show a decoded, pre-scaled image posted by the worker"""
+        if request_id != self._decode_request_id:
+            return
+        self._pyramid = levels
+        self.setPixmap(QPixmap.fromImage(image))
         
-        # Scale to fit
-        scaled_pixmap = pixmap.scaled(self.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-        self.setPixmap(scaled_pixmap)
+        # The viewer may have been resized while the worker was busy
+        if image.size() != image.size().scaled(self.size(), Qt.AspectRatioMode.KeepAspectRatio):
+            self.apply_smooth_scale()
+    
+    def resizeEvent(self, event):
+        """Rescale from the nearest pyramid level: fast now, smooth once resizing settles"""
+        super().resizeEvent(event)
+        if not self._pyramid:
+            return
+        self.setPixmap(QPixmap.fromImage(scale_to_fit(self._pyramid, self.size(), smooth=False)))
+        self.smooth_timer.start(150)
+    
+    def apply_smooth_scale(self):
+        """High-quality scale of the current image from its nearest pyramid level"""
+        if self._pyramid:
+            self.setPixmap(QPixmap.fromImage(scale_to_fit(self._pyramid, self.size())))
         
     def contextMenuEvent(self, event):
         """Show context menu on right click"""
@@ -37,6 +101,18 @@ class ImageViewer(QLabel):
             
         menu = QMenu(self)
         
+        # Sample navigation for multi-sample results
+        if len(self.images) > 1:
+            prev_action = QAction("Previous Sample", self)
+            prev_action.triggered.connect(lambda: self.show_image((self.current_index - 1) % len(self.images)))
+            menu.addAction(prev_action)
+            
+            next_action = QAction("Next Sample", self)
+            next_action.triggered.connect(lambda: self.show_image((self.current_index + 1) % len(self.images)))
+            menu.addAction(next_action)
+            
+            menu.addSeparator()
+        
         # Copy image action
         copy_action = QAction("Copy Image", self)
         copy_action.triggered.connect(self.copy_image_to_clipboard)
@@ -62,8 +138,7 @@ class ImageViewer(QLabel):
             return
             
         try:
-            pixmap = QPixmap()
-            pixmap.loadFromData(self.current_image_data)
+            pixmap = decoded_image_cache.pixmap(self.current_image_data)
             
             clipboard = QApplication.clipboard()
             clipboard.setPixmap(pixmap)
@@ -77,34 +152,18 @@ class ImageViewer(QLabel):
             return
             
         try:
-            # Load the original image
-            image = Image.open(io.BytesIO(self.current_image_data))
-            
-            # Create PNG metadata
-            png_info = PngInfo()
-            
-            # Add NovelAI-style metadata
-            # Convert metadata to the format NovelAI uses
+            # Splice NovelAI-style text chunks into the original PNG stream -
+            # no decode/re-encode of the pixel data
             novelai_metadata = self.format_novelai_metadata(self.current_metadata)
+            image_with_metadata = insert_text_chunks(self.current_image_data, novelai_text_chunks(novelai_metadata))
             
-            # Add metadata chunks
-            png_info.add_text("Title", "AI generated image")
-            png_info.add_text("Description", novelai_metadata["prompt"])
-            png_info.add_text("Software", "NovelAI")
-            png_info.add_text("Source", "Stable Diffusion")
-            png_info.add_text("Comment", json.dumps(novelai_metadata))
-            
-            # Save to bytes with metadata
-            output = io.BytesIO()
-            image.save(output, format="PNG", pnginfo=png_info)
-            image_with_metadata = output.getvalue()
-            
-            # Copy to clipboard
-            pixmap = QPixmap()
-            pixmap.loadFromData(image_with_metadata)
+            # Offer the PNG bytes as-is, plus one decoded bitmap for apps that can't read PNG
+            mime_data = QMimeData()
+            mime_data.setData("image/png", QByteArray(image_with_metadata))
+            mime_data.setImageData(decoded_image_cache.qimage(self.current_image_data))
             
             clipboard = QApplication.clipboard()
-            clipboard.setPixmap(pixmap)
+            clipboard.setMimeData(mime_data)
             
         except Exception as e:
             print(f"Failed to copy image with metadata: {e}")
@@ -135,7 +194,7 @@ class ImageViewer(QLabel):
             "uncond_scale": 1.0,
             "cfg_rescale": 0.0,
             "seed": metadata.get('seed', 0),
-            "n_samples": 1,
+            "n_samples": metadata.get('n_samples', 1),
             "hide_debug_overlay": False,
             "noise_schedule": metadata.get('scheduler', 'karras'),
             "legacy_v3_extend": False,
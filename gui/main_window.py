@@ -3,49 +3,85 @@ from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QComboBox, QProgressBar, QScrollArea, QGridLayout,
                              QMessageBox, QFileDialog, QDoubleSpinBox, QLineEdit,
                              QCheckBox, QFrame, QSplitter, QGroupBox)
-from PyQt6.QtCore import QThread, pyqtSignal, Qt
+from PyQt6.QtCore import QThread, QTimer, QObject, pyqtSignal, Qt
 from PyQt6.QtGui import QPixmap, QFont
 import io
+import os
 from datetime import datetime
+from itertools import islice
 from novelai_api import NovelAIClient
+from api.payloads import MODELS
 from utils.image_handler import ImageHandler
 from gui.tag_autocomplete import TagCompleteWidget
 from gui.image_viewer import ImageViewer
+from gui.gallery import GalleryPanel
 from gui.styles import MAIN_STYLE
 from gui.custom_widgets import ModernCheckBox
-from utils.prompt_converter import sd_to_nai_format, nai_to_sd_format
+from gui.grid_dialog import GridDialog
+from utils.prompt_converter import nai_to_sd_format
+from utils.prompt_assembly import (PromptInputs, assemble_prompt,
+                                   POSITIVE_QUALITY_TAGS, NEGATIVE_QUALITY_TAGS)
+from utils.thumbnail_cache import ThumbnailCache
+from utils.auto_saver import AutoSaver
+from utils.history_store import HistoryStore
+from utils.image_cache import content_key
+from utils.png_metadata import read_text_chunks_from_file, novelai_parameters_from_text
+from utils.wildcards import PromptExpander, WildcardLibrary, has_wildcards, expand_prompt_inputs
+from utils.token_counter import get_token_counter
+from utils.generation_queue import GenerationQueue
+from utils.grid import GridRun
+from config import Config
 
 class ImageGenerationThread(QThread):
-    finished = pyqtSignal(bytes, int)
+    finished = pyqtSignal(list, dict)  # [(image_bytes, seed), ...], job metadata
     error = pyqtSignal(str)
     
-    def __init__(self, client, prompt, params):
+    def __init__(self, client, prompt, params, metadata):
         super().__init__()
         self.client = client
         self.prompt = prompt
         self.params = params
+        self.metadata = metadata  # Describes exactly what this job sent
     
     def run(self):
         try:
-            result = self.client.generate_image(self.prompt, **self.params)
-            if result and len(result) == 2:
-                image_data, actual_seed = result
-                if image_data:
-                    self.finished.emit(image_data, actual_seed)
-                else:
-                    self.error.emit("Failed to generate image")
+            images = self.client.generate_images(self.prompt, **self.params)
+            if images:
+                self.finished.emit(images, self.metadata)
             else:
-                self.error.emit("Invalid response from API")
+                self.error.emit("Failed to generate image")
         except Exception as e:
             self.error.emit(str(e))
 
+class GridSignals(QObject):
+    """Carries grid results from queue workers to the GUI thread"""
+    cell_done = pyqtSignal(object, object, object, str, str)  # run, cell, image bytes, cell path, sheet path
+    cell_failed = pyqtSignal(object, object, str, str)  # run, cell, sheet path, error
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.client = NovelAIClient()
         self.image_handler = ImageHandler()
         self.current_image_data = None
+        self.current_images = []  # [(image_bytes, seed), ...] from the last generation
         self.generation_thread = None
+        self.auto_saver = AutoSaver(Config.AUTO_SAVE_DIR, Config.AUTO_SAVE_TEMPLATE, Config.AUTO_SAVE_FSYNC)
+        self.history = HistoryStore(Config.HISTORY_DB)
+        self.prompt_expander = PromptExpander(WildcardLibrary(Config.WILDCARD_DIR))
+        self.pending_jobs = None  # Lazily expanded PromptInputs still to generate
+        self.batch_params = None
+        self.fixed_seed = None
+        self.batch_done = 0
+        self.batch_total = 0
+        self.grid_run = None  # GridRun of the grid being generated
+        self.grid_queue = None
+        self.grid_cells = None  # Cells of the running grid not yet handed to the queue
+        self.grid_prompt = ""
+        self.grid_done = 0
+        self.grid_signals = GridSignals()
+        self.grid_signals.cell_done.connect(self.on_grid_cell_done)
+        self.grid_signals.cell_failed.connect(self.on_grid_cell_failed)
         
         self.setWindowTitle("NovelAI Local - Modern Interface")
         self.setMinimumSize(1440, 840)  # 20% bigger than 1200x700
@@ -73,6 +109,19 @@ class MainWindow(QMainWindow):
         
         self.setup_ui()
         
+        # Token counts refresh shortly after typing stops
+        self.token_count_timer = QTimer(self)
+        self.token_count_timer.setSingleShot(True)
+        self.token_count_timer.timeout.connect(self.update_token_counts)
+        for signal in (self.prompt_input.textChanged, self.negative_prompt_input.textChanged,
+                       self.positive_quality_check.toggled, self.negative_quality_check.toggled,
+                       self.model_combo.currentTextChanged):
+            signal.connect(lambda *_: self.token_count_timer.start(150))
+        self.update_token_counts()
+        
+        # Drop a NovelAI PNG on the window to load its generation settings
+        self.setAcceptDrops(True)
+        
     def setup_ui(self):
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -141,7 +190,8 @@ class MainWindow(QMainWindow):
         self.positive_quality_check = ModernCheckBox("✨ Enhanced Quality")
         self.positive_quality_check.setChecked(True)
         self.positive_quality_check.setStyleSheet("margin: 2px;")
-        layout.addWidget(self.positive_quality_check)
+        self.prompt_token_label = QLabel()
+        layout.addLayout(self.with_token_label(self.positive_quality_check, self.prompt_token_label))
         
         # Weighting hint
         hint_label = QLabel("💡 Highlight text + Ctrl+↑/↓ to adjust weights (weight::tag::)")
@@ -168,9 +218,32 @@ class MainWindow(QMainWindow):
         self.negative_quality_check = ModernCheckBox("🛡️ Quality Filtering")
         self.negative_quality_check.setChecked(True)
         self.negative_quality_check.setStyleSheet("margin: 2px;")
-        layout.addWidget(self.negative_quality_check)
+        self.negative_token_label = QLabel()
+        layout.addLayout(self.with_token_label(self.negative_quality_check, self.negative_token_label))
         
         return group
+    
+    @staticmethod
+    def with_token_label(check, label):
+        """Row with a quality toggle on the left and a token count on the right"""
+        row = QHBoxLayout()
+        row.addWidget(check)
+        row.addStretch()
+        row.addWidget(label)
+        return row
+    
+    def update_token_counts(self):
+        """Show token counts of the prompts as sent (quality tags included, weights excluded)"""
+        assembled = assemble_prompt(self.snapshot_prompt_inputs())
+        counter = get_token_counter(self.model_combo.currentText())
+        prefix = "" if counter.exact else "~"
+        for label, prompt in ((self.prompt_token_label, assembled.prompt),
+                              (self.negative_token_label, assembled.negative_prompt)):
+            count, fits = counter.check(prompt)
+            label.setText(f"{prefix}{count} / {counter.limit} tokens")
+            color = "#a0a0a0" if fits else "#ff6347"
+            label.setStyleSheet(f"font-size: 11px; color: {color}; margin: 2px;")
+            label.setToolTip("" if fits else "Tokens past the limit are ignored by the model")
         
     def create_parameters_section(self):
         group = QGroupBox("⚙️ Parameters")
@@ -186,14 +259,7 @@ class MainWindow(QMainWindow):
         # Row 1: Model and Opus Limit (separate sections)
         grid.addWidget(QLabel("Model:"), 0, 0)
         self.model_combo = QComboBox()
-        self.model_combo.addItems([
-            'nai-diffusion-4-5-full',
-            'nai-diffusion-4-5-curated', 
-            'nai-diffusion-4-full',
-            'nai-diffusion-4-curated-preview',
-            'nai-diffusion-3',
-            'nai-diffusion-furry-3'
-        ])
+        self.model_combo.addItems(MODELS)
         grid.addWidget(self.model_combo, 0, 1)
         
         # Opus limit section - separate from model
@@ -300,6 +366,30 @@ class MainWindow(QMainWindow):
         seed_widget.setLayout(seed_layout)
         grid.addWidget(seed_widget, 5, 1, 1, 3)
         
+        # Row 7: Samples per request
+        grid.addWidget(QLabel("Samples:"), 6, 0)
+        self.samples_spin = QSpinBox()
+        self.samples_spin.setRange(1, 4)
+        self.samples_spin.setValue(1)
+        self.samples_spin.setToolTip("Images per request (seeds increase by 1 per sample)")
+        grid.addWidget(self.samples_spin, 6, 1)
+        
+        grid.addWidget(QLabel("Batch:"), 6, 2)
+        self.batch_spin = QSpinBox()
+        self.batch_spin.setRange(1, 999)
+        self.batch_spin.setValue(1)
+        self.batch_spin.setToolTip("Requests to queue; {a|b} and __wildcard__ prompts are expanded once per request")
+        self.batch_spin.setMaximumWidth(80)
+        grid.addWidget(self.batch_spin, 6, 3)
+        
+        # Row 8: How wildcards are expanded across a batch
+        grid.addWidget(QLabel("Wildcards:"), 7, 0)
+        self.wildcard_mode_combo = QComboBox()
+        self.wildcard_mode_combo.addItems(['random', 'combinatorial'])
+        self.wildcard_mode_combo.setToolTip("random: independent seeded picks per image (may repeat); "
+                                            "combinatorial: every combination in order")
+        grid.addWidget(self.wildcard_mode_combo, 7, 1, 1, 3)
+        
         layout.addLayout(grid)
         
         # Apply initial opus limit
@@ -336,6 +426,18 @@ class MainWindow(QMainWindow):
         self.generate_btn.clicked.connect(self.generate_image)
         layout.addWidget(self.generate_btn)
         
+        # Seed sweeps and parameter grids; doubles as the cancel button while a grid runs
+        self.grid_btn = QPushButton("🔢 Grid / XYZ Plot")
+        self.grid_btn.setToolTip("Sweep seeds, CFG, steps, sampler or scheduler into a labelled contact sheet")
+        self.grid_btn.clicked.connect(self.open_grid_dialog)
+        layout.addWidget(self.grid_btn)
+        
+        # Load settings from an existing image (also possible by drag and drop)
+        load_settings_btn = QPushButton("📂 Load Settings from PNG")
+        load_settings_btn.setToolTip("Fill all controls from a NovelAI PNG's metadata (or drop a PNG on the window)")
+        load_settings_btn.clicked.connect(self.open_settings_png)
+        layout.addWidget(load_settings_btn)
+        
         # Progress bar
         self.progress_bar = QProgressBar()
         self.progress_bar.setVisible(False)
@@ -366,6 +468,7 @@ class MainWindow(QMainWindow):
         
         # Image display
         self.image_viewer = ImageViewer()
+        self.image_viewer.image_changed.connect(self.on_sample_changed)
         self.image_viewer.setStyleSheet("""
             QLabel {
                 border: 2px dashed #3d3d3d;
@@ -396,6 +499,13 @@ class MainWindow(QMainWindow):
         self.seed_display.setMaximumHeight(24)  # Limit height
         bottom_layout.addWidget(self.seed_display)
         
+        # Sample selector - only shown for multi-sample results
+        self.sample_combo = QComboBox()
+        self.sample_combo.setMaximumHeight(28)
+        self.sample_combo.setVisible(False)
+        self.sample_combo.currentIndexChanged.connect(self.image_viewer.show_image)
+        bottom_layout.addWidget(self.sample_combo)
+        
         # Save button
         self.save_btn = QPushButton("💾 Save")
         self.save_btn.clicked.connect(self.save_image)
@@ -404,8 +514,26 @@ class MainWindow(QMainWindow):
         self.save_btn.setMaximumHeight(28)  # Limit height
         bottom_layout.addWidget(self.save_btn)
         
+        # Auto-save toggle and output folder
+        self.auto_save_check = ModernCheckBox("Auto-save")
+        self.auto_save_check.setChecked(Config.AUTO_SAVE)
+        self.auto_save_check.setToolTip(f"Save every result to {self.auto_saver.output_dir}")
+        bottom_layout.addWidget(self.auto_save_check)
+        
+        auto_save_dir_btn = QPushButton("📂")
+        auto_save_dir_btn.setToolTip("Choose auto-save folder")
+        auto_save_dir_btn.setMaximumWidth(32)
+        auto_save_dir_btn.setMaximumHeight(28)
+        auto_save_dir_btn.clicked.connect(self.choose_auto_save_dir)
+        bottom_layout.addWidget(auto_save_dir_btn)
+        
         layout.addLayout(bottom_layout)
         
+        # Session history / folder browser
+        self.gallery = GalleryPanel(ThumbnailCache(Config.THUMBNAIL_DIR), self.history)
+        self.gallery.image_selected.connect(self.on_gallery_image_selected)
+        layout.addWidget(self.gallery)
+        
         return widget
 
     def on_opus_limit_changed(self):
@@ -459,84 +587,22 @@ class MainWindow(QMainWindow):
         random_seed = random.randint(0, 2147483647)
         self.seed_input.setText(str(random_seed))
     
-    def get_full_prompt(self):
-        """Get the complete prompt including quality tags, converted to NAI format"""
-        prompt = self.prompt_input.toPlainText().strip()
-        
-        if self.positive_quality_check.isChecked():
-            positive_quality_tags = "best quality, very aesthetic, absurdres"
-            if prompt:
-                prompt = f"{prompt}, {positive_quality_tags}"
-            else:
-                prompt = positive_quality_tags
-        
-        # Convert SD format to NAI format for API
-        return sd_to_nai_format(prompt)
-    
-    def get_full_negative_prompt(self):
-        """Get the complete negative prompt including quality tags, converted to NAI format"""
-        negative_prompt = self.negative_prompt_input.toPlainText().strip()
-        
-        if self.negative_quality_check.isChecked():
-            negative_quality_tags = "blurry, lowres, error, film grain, scan artifacts, worst quality, bad quality, jpeg artifacts, very displeasing, chromatic aberration, multiple views, logo, too many watermarks, white blank page, blank page"
-            if negative_prompt:
-                negative_prompt = f"{negative_prompt}, {negative_quality_tags}"
-            else:
-                negative_prompt = negative_quality_tags
-        
-        # Convert SD format to NAI format for API
-        return sd_to_nai_format(negative_prompt)
-    
-    def get_display_prompt(self):
-        """Get the prompt as displayed (SD format) for metadata"""
-        prompt = self.prompt_input.toPlainText().strip()
-        
-        if self.positive_quality_check.isChecked():
-            positive_quality_tags = "best quality, very aesthetic, absurdres"
-            if prompt:
-                prompt = f"{prompt}, {positive_quality_tags}"
-            else:
-                prompt = positive_quality_tags
-                
-        return prompt
-    
-    def get_display_negative_prompt(self):
-        """Get the negative prompt as displayed (SD format) for metadata"""
-        negative_prompt = self.negative_prompt_input.toPlainText().strip()
-        
-        if self.negative_quality_check.isChecked():
-            negative_quality_tags = "blurry, lowres, error, film grain, scan artifacts, worst quality, bad quality, jpeg artifacts, very displeasing, chromatic aberration, multiple views, logo, too many watermarks, white blank page, blank page"
-            if negative_prompt:
-                negative_prompt = f"{negative_prompt}, {negative_quality_tags}"
-            else:
-                negative_prompt = negative_quality_tags
-                
-        return negative_prompt
+    def snapshot_prompt_inputs(self):
+        """Read the prompt boxes and quality toggles once"""
+        return PromptInputs(self.prompt_input.toPlainText(), self.negative_prompt_input.toPlainText(),
+                            self.positive_quality_check.isChecked(), self.negative_quality_check.isChecked())
     
-    def generate_image(self):
-        # Get NAI-formatted prompts for API
-        prompt = self.get_full_prompt()  # This now returns NAI format
-        negative_prompt = self.get_full_negative_prompt()  # This now returns NAI format
-        
-        if not prompt:
-            QMessageBox.warning(self, "Warning", "Please enter a prompt or enable positive quality tags")
-            return
-        
+    def resolve_seed(self):
+        """Seed from the seed box, or None if it asks for a random seed"""
         try:
-            seed_text = self.seed_input.text().strip()
-            if seed_text == "-1" or seed_text == "":
-                import random
-                seed_value = random.randint(0, 2147483647)
-            else:
-                seed_value = int(seed_text)
-                if seed_value < 0:
-                    import random
-                    seed_value = random.randint(0, 2147483647)
+            seed_value = int(self.seed_input.text().strip())
         except ValueError:
-            import random
-            seed_value = random.randint(0, 2147483647)
-        
-        params = {
+            return None
+        return seed_value if seed_value >= 0 else None
+    
+    def read_generation_params(self):
+        """Generation parameters from the widgets (everything but prompts and seed)"""
+        return {
             'model': self.model_combo.currentText(),
             'width': self.width_spin.value(),
             'height': self.height_spin.value(),
@@ -544,54 +610,289 @@ class MainWindow(QMainWindow):
             'scale': self.scale_spin.value(),
             'sampler': self.sampler_combo.currentText(),
             'scheduler': self.scheduler_combo.currentText(),
-            'seed': seed_value,
-            'negative_prompt': negative_prompt  # NAI format
+            'n_samples': self.samples_spin.value(),
         }
+    
+    def generate_image(self):
+        inputs = self.snapshot_prompt_inputs()
+        if not assemble_prompt(inputs).prompt:
+            QMessageBox.warning(self, "Warning", "Please enter a prompt or enable positive quality tags")
+            return
         
-        print(f"Sending to API - Prompt: {prompt}")  # Debug - shows NAI format
-        print(f"Sending to API - Negative: {negative_prompt}")  # Debug - shows NAI format
+        import random
+        self.fixed_seed = self.resolve_seed()
+        first_seed = self.fixed_seed if self.fixed_seed is not None else random.randint(0, 2147483647)
+        
+        # Jobs are expanded one at a time as the previous one finishes; the first
+        # seed also seeds wildcard sampling so a batch can be reproduced
+        self.batch_total = self.batch_spin.value()
+        self.batch_done = 0
+        if self.batch_total > 1 or has_wildcards(inputs.prompt) or has_wildcards(inputs.negative_prompt):
+            self.pending_jobs = expand_prompt_inputs(inputs, self.prompt_expander, self.batch_total,
+                                                     self.wildcard_mode_combo.currentText(), first_seed)
+        else:
+            self.pending_jobs = iter([inputs])
+        
+        # Widgets are read once per batch
+        self.batch_params = self.read_generation_params()
         
         self.generate_btn.setEnabled(False)
-        self.generate_btn.setText("🔄 Generating...")
+        self.grid_btn.setEnabled(False)
         self.progress_bar.setVisible(True)
         self.progress_bar.setRange(0, 0)
         
-        self.generation_thread = ImageGenerationThread(self.client, prompt, params)
+        if not self.start_next_job(first_seed):
+            QMessageBox.warning(self, "Warning", "The wildcard prompt expanded to nothing")
+            self.finish_batch()
+    
+    def start_next_job(self, seed_value=None):
+        """Start generating the next queued job; False once the batch is exhausted"""
+        counter = get_token_counter(self.batch_params['model'])
+        while True:
+            inputs = next(self.pending_jobs, None) if self.pending_jobs is not None else None
+            if inputs is None:
+                return False
+            
+            # Assemble the NAI-formatted prompts once; they travel with the job to its metadata
+            assembled = assemble_prompt(inputs)
+            prompt = assembled.prompt
+            negative_prompt = assembled.negative_prompt
+            
+            # Batches skip expansions that would be truncated rather than spend a request on them
+            # (without a vocabulary only estimates well past the limit are skipped)
+            if self.batch_total > 1:
+                count, too_long = counter.over_limit(prompt)
+                if too_long:
+                    self.batch_done += 1
+                    print(f"Skipping prompt over the {counter.limit} token limit ({count} tokens): {prompt}")
+                    continue
+            break
+        
+        if seed_value is None:
+            import random
+            seed_value = self.fixed_seed if self.fixed_seed is not None else random.randint(0, 2147483647)
+        params = dict(self.batch_params, seed=seed_value, negative_prompt=negative_prompt)  # NAI format
+        
+        # Store metadata in NAI format, i.e. exactly what is sent
+        metadata = dict(params, prompt=prompt)
+        del metadata['seed']  # Filled in per sample
+        
+        print(f"Sending to API - Prompt: {prompt}")  # Debug - shows NAI format
+        print(f"Sending to API - Negative: {negative_prompt}")  # Debug - shows NAI format
+        
+        self.batch_done += 1
+        if self.batch_total > 1:
+            self.generate_btn.setText(f"🔄 Generating {self.batch_done}/{self.batch_total}...")
+        else:
+            self.generate_btn.setText("🔄 Generating...")
+        
+        # The previous job's thread emits its result just before returning; let it finish
+        # so replacing the reference doesn't destroy a running QThread
+        if self.generation_thread is not None:
+            self.generation_thread.wait()
+        self.generation_thread = ImageGenerationThread(self.client, prompt, params, metadata)
         self.generation_thread.finished.connect(self.on_image_generated)
         self.generation_thread.error.connect(self.on_generation_error)
         self.generation_thread.start()
+        return True
     
-    def on_image_generated(self, image_data, actual_seed):
-        self.current_image_data = image_data
-        
-        self.seed_display.setText(f"Seed: {actual_seed}")
+    def finish_batch(self):
+        self.pending_jobs = None
+        self.generate_btn.setEnabled(True)
+        self.generate_btn.setText("🚀 Generate Image")
+        self.grid_btn.setEnabled(True)
+        self.progress_bar.setVisible(False)
+    
+    def open_grid_dialog(self):
+        if self.grid_run is not None:
+            self.finish_grid(cancelled=True)
+            return
+        dialog = GridDialog(Config.GRID_CONCURRENCY, self)
+        if dialog.exec():
+            self.start_grid(dialog.axes, dialog.workers_spin.value())
+    
+    def start_grid(self, axes, max_workers):
+        """Start a grid run; the contact sheet fills in as results arrive"""
+        inputs = self.snapshot_prompt_inputs()
+        if not assemble_prompt(inputs).prompt:
+            QMessageBox.warning(self, "Warning", "Please enter a prompt or enable positive quality tags")
+            return
         
-        # Store metadata in NAI format to verify conversion is working
-        metadata = {
-            'prompt': self.get_full_prompt(),  # NAI format for verification
-            'negative_prompt': self.get_full_negative_prompt(),  # NAI format for verification
-            'model': self.model_combo.currentText(),
-            'width': self.width_spin.value(),
-            'height': self.height_spin.value(),
-            'steps': self.steps_spin.value(),
-            'scale': self.scale_spin.value(),
-            'sampler': self.sampler_combo.currentText(),
-            'scheduler': self.scheduler_combo.currentText(),
-            'seed': actual_seed
-        }
+        # Every cell shares one prompt and (unless seed is an axis) one seed, so only the axes differ
+        import random
+        seed_value = self.resolve_seed()
+        if seed_value is None:
+            seed_value = random.randint(0, 2147483647)
+        if has_wildcards(inputs.prompt) or has_wildcards(inputs.negative_prompt):
+            inputs = next(expand_prompt_inputs(inputs, self.prompt_expander, 1,
+                                               self.wildcard_mode_combo.currentText(), seed_value), inputs)
+        assembled = assemble_prompt(inputs)
+        params = dict(self.read_generation_params(), n_samples=1, seed=seed_value,
+                      negative_prompt=assembled.negative_prompt)
+        
+        x_axis, y_axis, z_axis = axes
+        output_dir = os.path.join(Config.GRID_DIR, datetime.now().strftime("%Y%m%d_%H%M%S"))
+        try:
+            self.grid_run = GridRun(output_dir, x_axis, y_axis, z_axis, (params['width'], params['height']))
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Grid", f"Could not start the grid in {output_dir}: {e}")
+            return
+        self.grid_prompt = assembled.prompt
+        self.grid_done = 0
+        self.grid_queue = GenerationQueue(self.client, max_workers)
         
-        self.image_viewer.set_image(image_data, metadata)
+        # Cells are fed to the queue as requests finish, so only a few are ever pending
+        run = self.grid_run
+        self.grid_cells = run.cells(params)
+        self.queue_grid_cells(2 * max_workers)
         
+        print(f"Grid: {run.total} image(s) -> {output_dir}")
+        self.generate_btn.setEnabled(False)
+        self.grid_btn.setText(f"⏹ Cancel Grid (0/{run.total})")
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, run.total)
+        self.progress_bar.setValue(0)
+    
+    def queue_grid_cells(self, count):
+        """Hand up to count more cells of the running grid to the queue"""
+        run = self.grid_run
+        for cell in islice(self.grid_cells, count):
+            self.grid_queue.submit(cell, self.grid_prompt, cell.params,
+                                   lambda cell, images, run=run: self.store_grid_cell(run, cell, images),
+                                   lambda cell, message, run=run: self.store_grid_failure(run, cell, message))
+    
+    def store_grid_cell(self, run, cell, images):
+        """Worker thread: write the cell to disk and composite it, then notify the GUI"""
+        image_bytes = images[0][0]
+        cell_path, sheet_path = run.add(cell, image_bytes)
+        self.grid_signals.cell_done.emit(run, cell, image_bytes, cell_path or "", sheet_path or "")
+    
+    def store_grid_failure(self, run, cell, message):
+        """Worker thread: mark the cell as failed on the sheet"""
+        try:
+            _, sheet_path = run.add(cell, None)
+        except OSError as e:
+            print(f"Failed to update contact sheet: {e}")
+            sheet_path = None
+        self.grid_signals.cell_failed.emit(run, cell, sheet_path or "", message)
+    
+    def on_grid_cell_done(self, run, cell, image_bytes, cell_path, sheet_path):
+        if run is not self.grid_run:
+            return  # Result of a cancelled grid
+        metadata = dict(cell.params, prompt=self.grid_prompt)
+        self.history.add(metadata, content_hash=content_key(image_bytes), path=cell_path or None)
+        self.advance_grid(sheet_path)
+    
+    def on_grid_cell_failed(self, run, cell, sheet_path, message):
+        if run is not self.grid_run:
+            return
+        print(f"Grid cell ({cell.x}, {cell.y}, {cell.z}) failed: {message}")
+        self.advance_grid(sheet_path)
+    
+    def advance_grid(self, sheet_path):
+        self.grid_done += 1
+        self.queue_grid_cells(1)
+        self.progress_bar.setValue(self.grid_done)
+        self.grid_btn.setText(f"⏹ Cancel Grid ({self.grid_done}/{self.grid_run.total})")
+        if sheet_path:
+            self.show_grid_sheet(sheet_path)
+        if self.grid_done >= self.grid_run.total:
+            self.finish_grid()
+    
+    def show_grid_sheet(self, sheet_path):
+        try:
+            with open(sheet_path, 'rb') as f:
+                sheet_bytes = f.read()
+        except OSError as e:
+            print(f"Failed to open contact sheet: {e}")
+            return
+        self.current_images = [(sheet_bytes, 0)]
+        self.current_image_data = sheet_bytes
+        self.sample_combo.setVisible(False)
+        self.image_viewer.set_image(sheet_bytes, {})
+        self.seed_display.setText(f"Grid {self.grid_done}/{self.grid_run.total}: {os.path.basename(sheet_path)}")
         self.save_btn.setEnabled(True)
+    
+    def finish_grid(self, cancelled=False):
+        """Stop queueing grid requests and save whatever the sheets hold"""
+        run = self.grid_run
+        if cancelled:
+            self.grid_queue.cancel()
+        else:
+            self.grid_queue.close(wait=False)
+        try:
+            paths = run.finish()
+        except OSError as e:
+            print(f"Failed to save contact sheet: {e}")
+            paths = []
+        if paths:
+            self.show_grid_sheet(paths[-1])
+        print(f"Grid {'cancelled' if cancelled else 'finished'}: {run.output_dir}")
+        
+        self.grid_run = None
+        self.grid_queue = None
+        self.grid_cells = None
         self.generate_btn.setEnabled(True)
-        self.generate_btn.setText("🚀 Generate Image")
+        self.grid_btn.setText("🔢 Grid / XYZ Plot")
         self.progress_bar.setVisible(False)
     
+    def on_image_generated(self, images, job_metadata):
+        self.current_images = images
+        self.current_image_data = images[0][0]
+        
+        # The job's own snapshot - the widgets may have changed while it ran
+        base_metadata = dict(job_metadata, n_samples=len(images))
+        
+        samples = [(image_data, dict(base_metadata, seed=seed)) for image_data, seed in images]
+        
+        # Refill the sample selector without re-triggering show_image
+        self.sample_combo.blockSignals(True)
+        self.sample_combo.clear()
+        self.sample_combo.addItems([f"#{i + 1} ({seed})" for i, (_, seed) in enumerate(images)])
+        self.sample_combo.blockSignals(False)
+        self.sample_combo.setVisible(len(images) > 1)
+        
+        self.image_viewer.set_images(samples)
+        for image_data, metadata in samples:
+            self.gallery.add_image(image_data, metadata)
+            
+            # Record in the searchable history; the path is filled in once auto-save has written it
+            image_hash = content_key(image_data)
+            self.history.add(metadata, content_hash=image_hash)
+            if self.auto_save_check.isChecked():
+                self.auto_saver.submit(image_data, metadata,
+                                       on_saved=lambda path, image_hash=image_hash: self.history.set_path(image_hash, path))
+        
+        self.save_btn.setEnabled(True)
+        
+        # Continue with the next queued job of a batch
+        if not self.start_next_job():
+            self.finish_batch()
+    
+    def on_sample_changed(self, index):
+        """Keep the seed display and selector in sync with the displayed sample"""
+        if not 0 <= index < len(self.current_images):
+            return
+        self.current_image_data, seed = self.current_images[index]
+        self.seed_display.setText(f"Seed: {seed}")
+        if self.sample_combo.currentIndex() != index:
+            self.sample_combo.blockSignals(True)
+            self.sample_combo.setCurrentIndex(index)
+            self.sample_combo.blockSignals(False)
+    
+    def on_gallery_image_selected(self, image_data, metadata):
+        """Show an image picked from the history strip"""
+        seed = metadata.get('seed', 0)
+        self.current_images = [(image_data, seed)]
+        self.current_image_data = image_data
+        self.sample_combo.setVisible(False)
+        self.image_viewer.set_image(image_data, metadata)
+        self.save_btn.setEnabled(True)
+    
     def on_generation_error(self, error_message):
+        # Stop the batch first so the rest of the queue isn't spent on a failing request
+        self.finish_batch()
         QMessageBox.critical(self, "Generation Error", f"Failed to generate image: {error_message}")
-        self.generate_btn.setEnabled(True)
-        self.generate_btn.setText("🚀 Generate Image")
-        self.progress_bar.setVisible(False)
     
     def save_image(self):
         if self.current_image_data is None:
@@ -600,15 +901,121 @@ class MainWindow(QMainWindow):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"generated_image_{timestamp}.png"
         
-        file_path, _ = QFileDialog.getSaveFileName(
+        file_path, selected_filter = QFileDialog.getSaveFileName(
             self, 
             "Save Image", 
             filename, 
             "PNG Files (*.png);;JPEG Files (*.jpg);;All Files (*)"
         )
         
-        if file_path:
+        if not file_path:
+            return
+        
+        # PNG is written byte-for-byte; only an explicit JPEG choice re-encodes
+        if not os.path.splitext(file_path)[1]:
+            file_path += '.jpg' if selected_filter.startswith("JPEG") else '.png'
+        
+        if len(self.current_images) == 1:
             self.image_handler.save_image(self.current_image_data, file_path)
+            return
+        
+        # Multi-sample: save every image, suffixing the chosen name with its seed
+        base, ext = os.path.splitext(file_path)
+        for image_data, seed in self.current_images:
+            self.image_handler.save_image(image_data, f"{base}_{seed}{ext or '.png'}")
+
+    def choose_auto_save_dir(self):
+        """Pick the folder auto-save writes into"""
+        folder = QFileDialog.getExistingDirectory(self, "Auto-save Folder", self.auto_saver.output_dir)
+        if folder:
+            self.auto_saver.output_dir = folder
+            self.auto_save_check.setToolTip(f"Save every result to {folder}")
+            self.auto_save_check.setChecked(True)
+    
+    def closeEvent(self, event):
+        # Let queued auto-saves and history writes reach the disk before exiting
+        self.pending_jobs = None
+        if self.grid_queue is not None:
+            self.grid_queue.cancel()
+        self.auto_saver.close()
+        self.history.close()
+        self.prompt_expander.library.close()
+        super().closeEvent(event)
+
+    def dragEnterEvent(self, event):
+        if self._dropped_png_path(event) is not None:
+            event.acceptProposedAction()
+    
+    def dropEvent(self, event):
+        path = self._dropped_png_path(event)
+        if path is not None:
+            event.acceptProposedAction()
+            self.load_settings_from_png(path)
+    
+    @staticmethod
+    def _dropped_png_path(event):
+        mime_data = event.mimeData()
+        if mime_data.hasUrls():
+            for url in mime_data.urls():
+                if url.isLocalFile() and url.toLocalFile().lower().endswith('.png'):
+                    return url.toLocalFile()
+        return None
+    
+    def open_settings_png(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Load Settings from PNG", "", "PNG Files (*.png)")
+        if file_path:
+            self.load_settings_from_png(file_path)
+    
+    def load_settings_from_png(self, file_path):
+        """Fill every control from a PNG's NovelAI metadata (reads chunks only, no image decode)"""
+        try:
+            metadata = novelai_parameters_from_text(read_text_chunks_from_file(file_path))
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Load Settings", f"Could not read {file_path}: {e}")
+            return
+        
+        if metadata is None:
+            QMessageBox.warning(self, "Load Settings", "No NovelAI generation metadata found in this image")
+            return
+        
+        self.apply_generation_settings(metadata)
+    
+    def apply_generation_settings(self, metadata):
+        """Set prompts and parameters from a metadata dict (NAI-format prompts)"""
+        prompt, has_quality = self._split_quality_tags(nai_to_sd_format(metadata.get('prompt', '')), POSITIVE_QUALITY_TAGS)
+        self.prompt_input.setPlainText(prompt)
+        self.positive_quality_check.setChecked(has_quality)
+        
+        negative_prompt, has_quality = self._split_quality_tags(nai_to_sd_format(metadata.get('negative_prompt', '')), NEGATIVE_QUALITY_TAGS)
+        self.negative_prompt_input.setPlainText(negative_prompt)
+        self.negative_quality_check.setChecked(has_quality)
+        
+        for combo, key in ((self.model_combo, 'model'), (self.sampler_combo, 'sampler'),
+                           (self.scheduler_combo, 'scheduler')):
+            index = combo.findText(str(metadata.get(key, '')))
+            if index >= 0:
+                combo.setCurrentIndex(index)
+        
+        if 'width' in metadata:
+            self.width_spin.setValue(int(metadata['width']))
+        if 'height' in metadata:
+            self.height_spin.setValue(int(metadata['height']))
+        if 'steps' in metadata:
+            self.steps_spin.setValue(int(metadata['steps']))
+        if 'scale' in metadata:
+            self.scale_spin.setValue(float(metadata['scale']))
+        if 'seed' in metadata:
+            self.seed_input.setText(str(metadata['seed']))
+    
+    @staticmethod
+    def _split_quality_tags(prompt, quality_tags):
+        """Strip the quality toggle's tags from the end of a prompt - returns (prompt, had_tags)"""
+        prompt = prompt.strip()
+        if prompt == quality_tags:
+            return "", True
+        if prompt.endswith(f", {quality_tags}"):
+            return prompt[:-len(quality_tags) - 2], True
+        return prompt, False
 
     def reset_seed(self):
         """Reset seed to -1 (random)"""
@@ -0,0 +1,140 @@
+from PyQt6.QtGui import QSyntaxHighlighter, QTextCharFormat, QColor
+from PyQt6.QtCore import QTimer, QPoint
+from utils.tag_manager import TagManager
+
+# Block states: whether a weight group continues into the next block, or not highlighted yet
+STATE_PLAIN = 0
+STATE_IN_GROUP = 1
+STATE_DIRTY = 2
+
+# Documents with more blocks than this only highlight blocks near the viewport
+LAZY_BLOCK_THRESHOLD = 200
+VISIBLE_MARGIN = 20
+
+# Foreground colours by tag category (general tags keep the editor's colour)
+CATEGORY_COLORS = {
+    1: QColor(144, 238, 144),  # Artist - light green
+    3: QColor(255, 236, 139),  # Copyright - light yellow
+    4: QColor(135, 206, 250),  # Character - light blue
+    5: QColor(170, 170, 170),  # Meta - grey
+}
+UNKNOWN_TAG_COLOR = QColor(255, 99, 71)
+WEIGHT_SYNTAX_COLOR = QColor(128, 128, 128)
+EMPHASIS_BACKGROUND = QColor(255, 140, 0, 45)
+DEEMPHASIS_BACKGROUND = QColor(0, 120, 215, 60)
+
+
+class PromptHighlighter(QSyntaxHighlighter):
+    """Colours prompt tags by tag database category and marks weight groups.
+
+    Tokens come from the editor's incrementally maintained token list, so a
+    block is highlighted without re-parsing it; each tag is one dict lookup in
+    the shared TagManager. Qt only re-highlights changed blocks, and in long
+    documents blocks away from the viewport are deferred until scrolled into view.
+    """
+
+    def __init__(self, editor):
+        super().__init__(editor.document())
+        self.editor = editor
+        self.tag_manager = TagManager.shared()
+        self._formats = {}
+        # Block numbers near the viewport; refreshed outside highlightBlock since
+        # querying the layout while the document is changing isn't safe
+        self._visible = (0, 60)
+
+        self.visible_timer = QTimer(self)
+        self.visible_timer.setSingleShot(True)
+        self.visible_timer.timeout.connect(self.highlight_visible)
+        editor.verticalScrollBar().valueChanged.connect(lambda _: self.visible_timer.start(50))
+        editor.document().contentsChange.connect(lambda *_: self.visible_timer.start(0))
+
+    def update_visible_range(self):
+        viewport = self.editor.viewport()
+        first = self.editor.cursorForPosition(QPoint(0, 0)).blockNumber()
+        last = self.editor.cursorForPosition(QPoint(0, viewport.height())).blockNumber()
+        self._visible = (first - VISIBLE_MARGIN, last + VISIBLE_MARGIN)
+
+    def highlight_visible(self):
+        """Highlight deferred blocks that are now on screen"""
+        self.update_visible_range()
+        first, last = self._visible
+        block = self.document().findBlockByNumber(max(0, first))
+        while block.isValid() and block.blockNumber() <= last:
+            if block.userState() == STATE_DIRTY:
+                self.rehighlightBlock(block)
+            block = block.next()
+
+    def highlightBlock(self, text):
+        block = self.currentBlock()
+        if self.document().blockCount() > LAZY_BLOCK_THRESHOLD:
+            first, last = self._visible
+            if not first <= block.blockNumber() <= last:
+                self.setCurrentBlockState(STATE_DIRTY)
+                return
+
+        start = block.position()
+        end = start + len(text)
+        state = STATE_PLAIN
+        for token in self.editor.prompt_tokens.tokens_in(start, end):
+            self.highlight_token(token, start, end, 1.0)
+            if token.weighted and token.end > end:
+                state = STATE_IN_GROUP
+        self.setCurrentBlockState(state)
+
+    def highlight_token(self, token, block_start, block_end, weight):
+        if not token.weighted:
+            info = self.lookup(token.tag)
+            category = info['category'] if info is not None else None
+            self.apply(token.start, token.end, block_start, block_end, self.format(category, weight))
+            return
+
+        weight *= token.weight
+        prompt = self.editor.prompt_tokens.text
+        # Group background (covers separators too), then the weight syntax, then each child tag
+        self.apply(token.start, token.end, block_start, block_end, self.format(0, weight))
+        if token.syntax == 'nai':
+            opener_end = prompt.find('::', token.start) + 2
+            self.apply(token.start, opener_end, block_start, block_end, self.format('syntax', weight))
+            if prompt.startswith('::', token.end - 2) and token.end - 2 >= opener_end:
+                self.apply(token.end - 2, token.end, block_start, block_end, self.format('syntax', weight))
+        else:
+            colon = prompt.rfind(':', token.start, token.end)
+            self.apply(token.start, token.start + 1, block_start, block_end, self.format('syntax', weight))
+            self.apply(colon, token.end, block_start, block_end, self.format('syntax', weight))
+
+        for child in token.children:
+            self.highlight_token(child, block_start, block_end, weight)
+
+    def lookup(self, tag):
+        info = self.tag_manager.lookup(tag)
+        if info is None and tag.lower().startswith('artist:'):
+            info = self.tag_manager.lookup(tag[7:])
+        return info
+
+    def apply(self, start, end, block_start, block_end, char_format):
+        start = max(start, block_start)
+        end = min(end, block_end)
+        if end > start:
+            self.setFormat(start - block_start, end - start, char_format)
+
+    def format(self, kind, weight):
+        """Cached format for a category (None = unknown tag, 'syntax' = weight syntax)"""
+        emphasis = (weight > 1.0) - (weight < 1.0)
+        key = (kind, emphasis)
+        char_format = self._formats.get(key)
+        if char_format is None:
+            char_format = QTextCharFormat()
+            if kind is None:
+                char_format.setForeground(UNKNOWN_TAG_COLOR)
+                char_format.setUnderlineStyle(QTextCharFormat.UnderlineStyle.WaveUnderline)
+                char_format.setUnderlineColor(UNKNOWN_TAG_COLOR)
+            elif kind == 'syntax':
+                char_format.setForeground(WEIGHT_SYNTAX_COLOR)
+            elif kind in CATEGORY_COLORS:
+                char_format.setForeground(CATEGORY_COLORS[kind])
+            if emphasis > 0:
+                char_format.setBackground(EMPHASIS_BACKGROUND)
+            elif emphasis < 0:
+                char_format.setBackground(DEEMPHASIS_BACKGROUND)
+            self._formats[key] = char_format
+        return char_format
@@ -3,7 +3,8 @@ from PyQt6.QtWidgets import (QTextEdit, QListWidget, QListWidgetItem, QHBoxLayou
 from PyQt6.QtCore import Qt, pyqtSignal, QTimer
 from PyQt6.QtGui import QTextCursor, QKeyEvent, QColor, QFontMetrics
 from utils.tag_manager import TagManager
-import re
+from utils.prompt_parser import tokenize, IncrementalTokens
+from gui.prompt_highlighter import PromptHighlighter
 import math
 
 class TagCompleteWidget(QWidget):
@@ -11,7 +12,7 @@ class TagCompleteWidget(QWidget):
     
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.tag_manager = TagManager()
+        self.tag_manager = TagManager.shared()
         self.setup_ui()
         
         # Timer to delay search while typing
@@ -233,21 +234,21 @@ class TagCompleteWidget(QWidget):
         
     def get_current_word(self, cursor):
         """Get the word currently being typed at cursor position"""
-        text = self.text_edit.toPlainText()
         pos = cursor.position()
-        
-        # Find start of current word (after comma or beginning)
-        start = pos
-        while start > 0 and text[start-1] not in [',', '\n']:
-            start -= 1
-            
-        # Skip whitespace at start
-        while start < len(text) and text[start] in [' ', '\t']:
-            start += 1
-            
-        # Get text from start to cursor position
-        current_word = text[start:pos].strip()
-        return current_word
+        start = self.current_word_start(pos)
+        return self.text_edit.prompt_tokens.text[start:pos].strip()
+    
+    def current_word_start(self, pos):
+        """Start of the tag under the cursor (the cursor position itself between tags)"""
+        text = self.text_edit.prompt_tokens.text
+        # A space just typed inside a multi-word tag doesn't end it
+        probe = pos
+        while probe > 0 and text[probe - 1] in ' \t':
+            probe -= 1
+        token = self.text_edit.prompt_tokens.token_at(probe)
+        if token is None or token.weighted:
+            return pos
+        return token.start
         
     def insert_completion(self, item):
         """Insert the selected completion"""
@@ -256,20 +257,9 @@ class TagCompleteWidget(QWidget):
         
         cursor = self.text_edit.textCursor()
         
-        # Get current word to replace
-        current_word = self.get_current_word(cursor)
-        
         # Find the start position of the current word
-        text = self.text_edit.toPlainText()
         pos = cursor.position()
-        start = pos
-        
-        while start > 0 and text[start-1] not in [',', '\n']:
-            start -= 1
-        
-        # Skip whitespace
-        while start < len(text) and text[start] in [' ', '\t']:
-            start += 1
+        start = self.current_word_start(pos)
             
         # Select current word and replace it
         cursor.setPosition(start)
@@ -301,6 +291,19 @@ class TagCompleteWidget(QWidget):
 class WeightedTextEdit(QTextEdit):
     """QTextEdit with tag weighting support via Ctrl+Up/Down using weight::tag:: format"""
     
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Token list patched from each document change instead of re-parsed per lookup
+        self.prompt_tokens = IncrementalTokens()
+        self.document().contentsChange.connect(self.on_contents_change)
+        # Created after the connection above so tokens are current when blocks are highlighted
+        self.highlighter = PromptHighlighter(self)
+    
+    def on_contents_change(self, position, removed, added):
+        # Qt counts the document's final paragraph separator in some changes (e.g. setPlainText);
+        # apply_edit falls back to a full re-tokenize when the counts don't add up
+        self.prompt_tokens.apply_edit(position, removed, added, self.toPlainText())
+    
     def adjust_weight(self, delta):
         """Adjust weight of selected text or current tag"""
         cursor = self.textCursor()
@@ -352,54 +355,26 @@ class WeightedTextEdit(QTextEdit):
     
     def find_weighted_tag_boundaries(self, selection_start, selection_end):
         """Find boundaries of a weighted tag that contains the selection"""
-        text = self.toPlainText()
-        
-        # Look for weight::tag:: pattern that contains the selection
-        # Search backwards from selection_start to find potential start
-        search_start = max(0, selection_start - 50)  # Look back up to 50 chars
-        search_end = min(len(text), selection_end + 50)  # Look forward up to 50 chars
-        
-        search_text = text[search_start:search_end]
-        
-        # Find all weighted tag patterns in the search area
-        weighted_pattern = r'([0-9.]+)::([^:,]+)::'
-        
-        for match in re.finditer(weighted_pattern, search_text):
-            match_start = search_start + match.start()
-            match_end = search_start + match.end()
-            
-            # Check if this weighted tag contains our selection
-            if match_start <= selection_start and match_end >= selection_end:
-                return match_start, match_end
+        # Innermost weight group (SD or NAI) around the selection
+        group = self.prompt_tokens.group_at(selection_start, selection_end)
+        if group is not None:
+            return group.start, group.end
         
         # No weighted tag found containing the selection
         return selection_start, selection_start
             
     def find_tag_boundaries(self, position):
         """Find the start and end of the current tag (weighted or unweighted)"""
-        text = self.toPlainText()
-        
         # First check if we're inside a weighted tag
-        weighted_start, weighted_end = self.find_weighted_tag_boundaries(position, position)
-        if weighted_start != weighted_end:
-            return weighted_start, weighted_end
-        
-        # Fallback to regular tag boundaries
-        # Find start (after comma or beginning)
-        start = position
-        while start > 0 and text[start-1] not in [',', '\n']:
-            start -= 1
-        while start < len(text) and text[start] in [' ', '\t']:
-            start += 1
-            
-        # Find end (before comma or end)
-        end = position
-        while end < len(text) and text[end] not in [',', '\n']:
-            end += 1
-        while end > start and text[end-1] in [' ', '\t']:
-            end -= 1
-            
-        return start, end
+        group = self.prompt_tokens.group_at(position)
+        if group is not None:
+            return group.start, group.end
+        
+        # Fallback to the plain tag under the cursor
+        token = self.prompt_tokens.token_at(position)
+        if token is None:
+            return position, position
+        return token.start, token.end
         
     def modify_tag_weight(self, tag_text, delta):
         """Modify the weight of a tag using weight::tag:: format"""
@@ -419,19 +394,10 @@ class WeightedTextEdit(QTextEdit):
         """Parse weight from tag in either SD or NAI weight::tag:: format"""
         tag_text = tag_text.strip()
         
-        # Check for NAI weight::tag:: format
-        nai_match = re.match(r'^([0-9.]+)::([^:]+)::$', tag_text)
-        if nai_match:
-            weight = float(nai_match.group(1))
-            tag = nai_match.group(2).strip()
-            return weight, tag
-        
-        # Check for SD format: (tag:weight) - for backwards compatibility
-        sd_match = re.match(r'\(([^:]+):([0-9.]+)\)', tag_text)
-        if sd_match:
-            tag = sd_match.group(1).strip()
-            weight = float(sd_match.group(2))
-            return weight, tag
+        # A single weight group spanning the whole text, NAI weight::tag:: or SD (tag:weight)
+        tokens = tokenize(tag_text)
+        if len(tokens) == 1 and tokens[0].weighted and tokens[0].end == len(tag_text):
+            return tokens[0].weight, tokens[0].tag
                 
         # No weight found, assume 1.0
         return 1.0, tag_text
@@ -1,112 +1,169 @@
-import requests
 import base64
 import io
 import zipfile
 import random
-from typing import Optional, Dict, Any
+import threading
+from typing import Optional, Dict, Any, List, Tuple
 from config import Config
+from api.payloads import get_payload_template, encode_payload
+from api.transport import Transport, RequestsTransport
+from utils.request_cache import RequestCache, canonical_request_key
 
-class NovelAIClient:
+class _InFlightCall:
+    """A request being sent on behalf of every caller with the same payload"""
+    
     def __init__(self):
-        Config.validate()
-        self.api_key = Config.API_KEY
-        self.image_base_url = "https://image.novelai.net"
+        self.done = threading.Event()
+        self.images = []
+        self.error = None
+
+class NovelAIClient:
+    def __init__(self, cache: Optional[RequestCache] = None, transport: Optional[Transport] = None,
+                 image_base_url: Optional[str] = None, api_key: Optional[str] = None):
+        if api_key is None:
+            Config.validate()
+            api_key = Config.API_KEY
+        self.api_key = api_key
+        self.image_base_url = (image_base_url or Config.IMAGE_BASE_URL).rstrip('/')
+        self.transport = transport or RequestsTransport()
         self.headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         }
+        
+        # Optional on-disk response cache - an explicit cache wins over the config
+        if cache is None and Config.REQUEST_CACHE:
+            cache = RequestCache(Config.REQUEST_CACHE_DIR, Config.REQUEST_CACHE_MAX_MB * 1024 * 1024)
+        self.cache = cache
+        
+        # Identical concurrent requests share one HTTP call (single-flight)
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
     
     def generate_image(self, prompt: str, **kwargs) -> Optional[tuple]:
         """Generate image using NovelAI API - returns (image_bytes, actual_seed)"""
+        images = self.generate_images(prompt, **kwargs)
+        if images:
+            return images[0]
+        return None, None
+    
+    def generate_images(self, prompt: str, **kwargs) -> List[Tuple[bytes, int]]:
+        """Generate n_samples images in one request - returns [(image_bytes, seed), ...]"""
         
         model = kwargs.get('model', 'nai-diffusion-3')
-        action = "generate"
         
         # Handle seed - always use the seed passed in (GUI handles -1 conversion)
         seed = kwargs.get('seed', 0)
+        n_samples = max(1, int(kwargs.get('n_samples', 1)))
         
-        # Build parameters
-        params = {
-            "params_version": 1,
-            "width": kwargs.get('width', 832),
-            "height": kwargs.get('height', 1216),
-            "scale": kwargs.get('scale', 5.0),
-            "sampler": kwargs.get('sampler', 'k_euler'),
-            "steps": kwargs.get('steps', 28),
-            "seed": seed,
-            "n_samples": 1,
-            "ucPreset": 3,
-            "qualityToggle": False,
-            "sm": False,
-            "sm_dyn": False,
-            "dynamic_thresholding": False,
-            "skip_cfg_above_sigma": None,
-            "controlnet_strength": 1.0,
-            "legacy": False,
-            "add_original_image": False,
-            "cfg_rescale": 0.0,
-            "noise_schedule": kwargs.get('scheduler', 'native'),
-            "legacy_v3_extend": False,
-            "uncond_scale": 1.0,
-            "negative_prompt": kwargs.get('negative_prompt', 'lowres'),
-            "prompt": prompt,
-            "reference_image_multiple": [],
-            "reference_information_extracted_multiple": [],
-            "reference_strength_multiple": [],
-            "extra_noise_seed": seed,
-            "v4_prompt": {
-                "use_coords": False,
-                "use_order": False,
-                "caption": {
-                    "base_caption": prompt,
-                    "char_captions": []
-                }
-            },
-            "v4_negative_prompt": {
-                "use_coords": False,
-                "use_order": False,
-                "caption": {
-                    "base_caption": kwargs.get('negative_prompt', 'lowres'),
-                    "char_captions": []
-                }
-            }
-        }
+        # Fill the prebuilt per-model payload with the per-call fields
+        request_data = get_payload_template(model).build(
+            prompt,
+            negative_prompt=kwargs.get('negative_prompt', 'lowres'),
+            width=kwargs.get('width', 832),
+            height=kwargs.get('height', 1216),
+            scale=kwargs.get('scale', 5.0),
+            sampler=kwargs.get('sampler', 'k_euler'),
+            steps=kwargs.get('steps', 28),
+            seed=seed,
+            n_samples=n_samples,
+            scheduler=kwargs.get('scheduler', 'native')
+        )
         
-        request_data = {
-            "input": prompt,
-            "model": model,
-            "action": action,
-            "parameters": params
-        }
+        request_key = canonical_request_key(request_data)
+        
+        # Same payload with a fixed seed is deterministic - serve it from disk
+        if self.cache is not None:
+            cached = self.cache.get(request_key)
+            if cached is not None:
+                try:
+                    images = self.extract_images(cached, seed)
+                except zipfile.BadZipFile:
+                    images = []
+                if images:
+                    print(f"✓ Served from cache (seed: {seed})")
+                    return images
+                print("Discarding unreadable cache entry")
+                self.cache.discard(request_key)
         
         try:
-            response = requests.post(
-                f'{self.image_base_url}/ai/generate-image',
-                headers=self.headers,
-                json=request_data,
-                timeout=120
-            )
-            
-            if response.status_code == 200:
-                # Success! Extract the image
-                zip_content = response.content
-                with zipfile.ZipFile(io.BytesIO(zip_content)) as zip_file:
-                    image_files = zip_file.namelist()
-                    if image_files:
-                        print(f"✓ Image generated successfully (seed: {seed})")
-                        return zip_file.read(image_files[0]), seed
-            
-            elif response.status_code == 400:
-                print(f"Bad request: {response.text}")
-            elif response.status_code == 401:
-                print("Authentication failed - check your API key")
-            elif response.status_code == 402:
-                print("Payment required - check your subscription")
-            elif response.status_code == 500:
-                print(f"Server error: {response.text}")
-            
-            return None, None
+            images = self._fetch_coalesced(request_key, request_data, seed)
+            if images:
+                print(f"✓ {len(images)} image(s) generated successfully (seed: {seed})")
+            return images
             
         except Exception as e:
             print(f"Error generating image: {e}")
-            return None, None
\ No newline at end of file
+            return []
+    
+    def _fetch_coalesced(self, request_key: str, request_data: dict, seed: int) -> List[Tuple[bytes, int]]:
+        """Send the request, or wait on an identical one that is already in flight.
+        
+        A response is only cached once its zip has been read successfully.
+        """
+        with self._in_flight_lock:
+            call = self._in_flight.get(request_key)
+            is_leader = call is None
+            if is_leader:
+                call = _InFlightCall()
+                self._in_flight[request_key] = call
+        
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.images
+        
+        try:
+            zip_content = self._fetch(request_data)
+            if zip_content is None:
+                return []
+            call.images = self.extract_images(zip_content, seed)
+            if call.images and self.cache is not None:
+                try:
+                    self.cache.put(request_key, zip_content)
+                except OSError as e:
+                    print(f"Failed to cache response: {e}")
+            return call.images
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[request_key]
+            call.done.set()
+    
+    def _fetch(self, request_data: dict) -> Optional[bytes]:
+        """POST the generation request - returns the response zip or None on an API error"""
+        response = self.transport.post(
+            f'{self.image_base_url}/ai/generate-image',
+            self.headers,
+            encode_payload(request_data),
+            timeout=120
+        )
+        
+        if response.status_code == 200:
+            return response.content
+        elif response.status_code == 400:
+            print(f"Bad request: {response.text}")
+        elif response.status_code == 401:
+            print("Authentication failed - check your API key")
+        elif response.status_code == 402:
+            print("Payment required - check your subscription")
+        elif response.status_code == 429:
+            print("Rate limited - too many concurrent requests")
+        elif response.status_code == 500:
+            print(f"Server error: {response.text}")
+        
+        return None
+    
+    @staticmethod
+    def extract_images(zip_content: bytes, seed: int) -> List[Tuple[bytes, int]]:
+        """Read every image in the response zip, pairing each with its derived seed"""
+        images = []
+        with zipfile.ZipFile(io.BytesIO(zip_content)) as zip_file:
+            # NovelAI numbers samples image_0.png, image_1.png, ... and
+            # gives sample i the seed (seed + i)
+            for index, name in enumerate(zip_file.namelist()):
+                images.append((zip_file.read(name), seed + index))
+        return images
\ No newline at end of file
@@ -0,0 +1,46 @@
+import os
+import sys
+import types
+import pytest
+
+# Tests import the app's packages (utils, api, ...) from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeClient:
+    """NovelAIClient stand-in that records requests and returns one PNG signature per sample"""
+
+    def __init__(self, fail=False):
+        self.requests = []
+        self.fail = fail
+
+    def generate_images(self, prompt, **params):
+        self.requests.append((prompt, params))
+        if self.fail:
+            return []
+        return [(b'\x89PNG\r\n\x1a\n', params['seed'] + index) for index in range(params['n_samples'])]
+
+
+@pytest.fixture
+def fake_client():
+    return FakeClient()
+
+
+@pytest.fixture
+def config(monkeypatch, tmp_path):
+    """Temporary config.Config (the real module needs python-dotenv and a .env); returns the class"""
+    module = types.ModuleType('config')
+    module.Config = type('Config', (), {
+        'API_KEY': 'test',
+        'IMAGE_BASE_URL': 'http://127.0.0.1:8765',
+        'REQUEST_CACHE': False,
+        'REQUEST_CACHE_DIR': str(tmp_path / 'request_cache'),
+        'REQUEST_CACHE_MAX_MB': 64,
+        'AUTO_SAVE_DIR': str(tmp_path / 'out'),
+        'AUTO_SAVE_TEMPLATE': '{seed}_{model}',
+        'AUTO_SAVE_FSYNC': 'never',
+        'WILDCARD_DIR': str(tmp_path / 'wildcards'),
+        'TOKENIZER_DIR': None,
+    })
+    monkeypatch.setitem(sys.modules, 'config', module)
+    return module.Config
@@ -0,0 +1,100 @@
+import json
+import pytest
+from utils.batch_runner import BatchRunner, Journal, output_paths, read_manifest
+
+
+# Token counting reads TOKENIZER_DIR from Config
+pytestmark = pytest.mark.usefixtures('config')
+
+
+def write_manifest(path, jobs):
+    path.write_text('\n'.join(json.dumps(job) for job in jobs) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def test_manifest_keys(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    path.write_text('{"id": "first", "prompt": "a"}\n# comment\n\n{"prompt": "b"}\n{"prompt": "b"}\n',
+                    encoding='utf-8')
+    keys = [key for key, _ in read_manifest(str(path))]
+    assert keys[0] == "first"
+    assert keys[1].endswith("-1") and keys[2].endswith("-2") and keys[1][:-2] == keys[2][:-2]
+
+    path.write_text('{"prompt": "a"}\n[1]\n', encoding='utf-8')
+    with pytest.raises(ValueError, match=":2:"):
+        list(read_manifest(str(path)))
+
+
+def test_journal_ignores_a_torn_last_line(tmp_path):
+    path = tmp_path / "jobs.journal"
+    path.write_text('{"event": "start", "job": "a", "seed": 5}\n{"event": "done", "jo', encoding='utf-8')
+    journal = Journal(str(path))
+    assert journal.started == {'a': 5} and not journal.finished
+    journal.append('done', 'a', seed=5, files=[])
+    journal.close()
+
+    journal = Journal(str(path))
+    assert journal.finished == {'a'}
+    journal.close()
+
+
+def test_rerun_skips_finished_jobs(tmp_path, fake_client):
+    manifest = write_manifest(tmp_path / "jobs.jsonl", [
+        {'id': 'one', 'prompt': "1girl", 'seed': 10},
+        {'id': 'two', 'prompt': "{red|blue} dress", 'seed': 20, 'n_samples': 2},
+    ])
+    runner = BatchRunner(fake_client, manifest)
+    assert runner.run() == {'done': 2, 'skipped': 0, 'failed': 0, 'already_done': 0}
+    assert fake_client.requests[1][0] in ("red dress", "blue dress")
+    assert sorted(p.name for p in (tmp_path / "jobs_output").iterdir()) == \
+        ["one_10.png", "two_20.png", "two_21.png"]
+
+    assert BatchRunner(fake_client, manifest).run()['already_done'] == 2
+    assert len(fake_client.requests) == 2
+
+
+def test_interrupted_job_resumes_with_its_seed(tmp_path, fake_client):
+    manifest = write_manifest(tmp_path / "jobs.jsonl", [{'id': 'a', 'prompt': "cat"}, {'id': 'b', 'prompt': "dog"}])
+    journal = Journal(manifest + '.journal')
+    journal.append('start', 'a', seed=123)
+    journal.append('start', 'b', seed=456)
+    journal.close()
+    # 'a' was saved before the interruption, 'b' was not
+    output_dir = str(tmp_path / "jobs_output")
+    (tmp_path / "jobs_output").mkdir()
+    for path in output_paths(output_dir, 'a', 123, 1):
+        open(path, 'wb').close()
+
+    assert BatchRunner(fake_client, manifest).run()['done'] == 2
+    assert [(prompt, params['seed']) for prompt, params in fake_client.requests] == [("dog", 456)]
+
+
+def test_stops_after_repeated_failures(tmp_path, fake_client):
+    manifest = write_manifest(tmp_path / "jobs.jsonl", [{'prompt': f"tag{index}"} for index in range(5)])
+    fake_client.fail = True
+    assert BatchRunner(fake_client, manifest).run()['failed'] == 3
+    assert len(fake_client.requests) == 3
+
+
+def test_invalid_and_over_long_jobs_are_skipped(tmp_path, fake_client):
+    manifest = write_manifest(tmp_path / "jobs.jsonl", [
+        {'prompt': "cat", 'seed': "not a number"},
+        {'prompt': ', '.join(f"tag{index}" for index in range(200)), 'model': 'nai-diffusion-3'},
+        {'prompt': "dog"},
+    ])
+    assert BatchRunner(fake_client, manifest).run() == {'done': 1, 'skipped': 2, 'failed': 0, 'already_done': 0}
+    assert [prompt for prompt, _ in fake_client.requests] == ["dog"]
+
+
+def test_save_failure_is_journaled(tmp_path, fake_client, monkeypatch):
+    manifest = write_manifest(tmp_path / "jobs.jsonl", [{'id': 'a', 'prompt': "cat", 'seed': 1}])
+
+    def fail_replace(source, destination):
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr('utils.batch_runner.os.replace', fail_replace)
+    assert BatchRunner(fake_client, manifest).run()['failed'] == 1
+    assert list((tmp_path / "jobs_output").iterdir()) == []  # No stray .tmp file
+
+    journal = Journal(manifest + '.journal')
+    assert journal.started == {} and not journal.finished  # Retried from scratch next run
+    journal.close()
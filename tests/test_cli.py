@@ -0,0 +1,51 @@
+import sys
+import types
+import pytest
+import cli
+
+
+@pytest.fixture
+def client(monkeypatch, config, fake_client):
+    """Run cli.generate against a fake client and a temporary Config"""
+    api = types.ModuleType('novelai_api')
+    api.NovelAIClient = lambda: fake_client
+    monkeypatch.setitem(sys.modules, 'novelai_api', api)
+    return fake_client
+
+
+def test_count_sends_that_many_requests(client, capsys):
+    assert cli.main(["1girl, solo", "--count", "4"]) == 0
+    assert len(client.requests) == 4
+    output = capsys.readouterr().out
+    assert "[4/4]" in output
+    assert "Done (4/4 requests succeeded)" in output
+
+
+def test_count_with_alternatives_sends_that_many_requests(client):
+    assert cli.main(["{red|blue} dress", "--count", "4"]) == 0
+    assert len(client.requests) == 4
+
+
+def test_combinatorial_progress_reports_real_total(client, capsys):
+    assert cli.main(["{red|blue} dress", "--count", "5", "--wildcard-mode", "combinatorial"]) == 0
+    assert len(client.requests) == 2
+    assert "[2/2]" in capsys.readouterr().out
+
+
+def test_fixed_seed_steps_per_request(client):
+    cli.main(["cat", "--count", "3", "--seed", "7"])
+    assert [params['seed'] for _, params in client.requests] == [7, 8, 9]
+    client.requests.clear()
+    cli.main(["cat", "--count", "2", "--seed", "7", "--samples", "2"])
+    assert [params['seed'] for _, params in client.requests] == [7, 9]
+
+
+def test_prompt_is_required_without_a_manifest(client):
+    with pytest.raises(SystemExit):
+        cli.main([])
+    assert client.requests == []
+
+
+def test_prompt_and_manifest_are_exclusive():
+    with pytest.raises(SystemExit):
+        cli.main(["cat", "--manifest", "jobs.jsonl"])
@@ -0,0 +1,68 @@
+import pytest
+
+pytest.importorskip('PIL')
+from utils.grid import (MAX_AXIS_VALUES, MAX_SHEET_SIZE, GridAxis, GridRun, check_grid_size,  # noqa: E402
+                        iter_grid_cells, parse_axis_values, sheet_tile_width)
+
+
+def test_axis_values_take_lists_and_ranges():
+    assert parse_axis_values('Seed', "1-4, 10") == [1, 2, 3, 4, 10]
+    assert parse_axis_values('CFG', "4-5:0.5") == [4.0, 4.5, 5.0]
+    assert parse_axis_values('Steps', "28-20:4") == [28, 24, 20]
+    assert parse_axis_values('Sampler', "a, b") == ['a', 'b']
+    with pytest.raises(ValueError):
+        parse_axis_values('Steps', "many")
+    with pytest.raises(ValueError):
+        parse_axis_values('Lora', "1")
+
+
+def test_axis_and_grid_sizes_are_capped():
+    assert len(parse_axis_values('Seed', f"1-{MAX_AXIS_VALUES}")) == MAX_AXIS_VALUES
+    with pytest.raises(ValueError):
+        parse_axis_values('Seed', "1-2147483647")  # Rejected without building the range
+    with pytest.raises(ValueError):
+        parse_axis_values('CFG', "1-2:0.0001")
+    with pytest.raises(ValueError):
+        parse_axis_values('Steps', ', '.join(['20'] * (MAX_AXIS_VALUES + 1)))
+    axis = GridAxis('Seed', list(range(20)))
+    check_grid_size([axis, axis])
+    with pytest.raises(ValueError):
+        check_grid_size([axis, axis, axis])
+
+
+def test_sheets_stay_within_the_size_limit():
+    assert sheet_tile_width(4, 2, (832, 1216), 256) == 256
+    width = sheet_tile_width(100, 10, (832, 1216), 256)
+    assert 100 * width <= MAX_SHEET_SIZE
+    height = round(width * 1216 / 832)
+    assert 10 * height <= MAX_SHEET_SIZE
+
+
+def test_cells_cover_the_grid_sheet_by_sheet():
+    x, y, z = GridAxis('Seed', [1, 2]), GridAxis('CFG', [4.0, 5.0]), GridAxis('Steps', [20, 28])
+    cells = list(iter_grid_cells({'seed': 0, 'steps': 23}, x, y, z))
+    assert len(cells) == 8
+    assert [(cell.x, cell.y, cell.z) for cell in cells[:4]] == [(0, 0, 0), (1, 0, 0), (0, 1, 0), (1, 1, 0)]
+    assert cells[-1].params == {'seed': 2, 'steps': 28, 'scale': 5.0}
+
+
+def test_complete_sheet_is_saved(tmp_path):
+    run = GridRun(str(tmp_path), GridAxis('Seed', [1, 2, 3]), image_size=(64, 64), tile_width=16, save_interval=60)
+    first, second, third = run.cells({})
+    run.add(first, None)  # The first tile is shown right away
+    assert run.add(second, None) == (None, None)
+    _, sheet_path = run.add(third, None)
+    assert sheet_path == str(tmp_path / "sheet.png")
+    assert (tmp_path / "sheet.png").exists()
+    assert run.finish() == []
+
+
+def test_results_after_finish_are_dropped(tmp_path):
+    run = GridRun(str(tmp_path), GridAxis('Seed', [1, 2, 3]), image_size=(64, 64), tile_width=16, save_interval=60)
+    cells = list(run.cells({}))
+    run.add(cells[0], None)
+    assert run.finish() == [str(tmp_path / "sheet.png")]
+    saved = (tmp_path / "sheet.png").stat().st_mtime_ns
+    assert run.add(cells[1], None) == (None, None)
+    assert run.finish() == []
+    assert (tmp_path / "sheet.png").stat().st_mtime_ns == saved
@@ -0,0 +1,57 @@
+import threading
+import pytest
+from utils.history_store import HistoryStore, extract_tags, normalize_tag
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    yield store
+    store.close()
+
+
+def add(store, prompt, **metadata):
+    store.add(dict(metadata, prompt=prompt))
+
+
+def test_tags_are_normalized():
+    assert normalize_tag("(Long_Hair:1.2)") == "long hair"
+    assert normalize_tag(r"\(cosplay\)") == "(cosplay)"
+    assert extract_tags("1girl, (smile:1.2), 1.1::blue eyes::, smile") == ['1girl', 'smile', 'blue eyes']
+
+
+def test_query_filters(store):
+    add(store, "1girl, long_hair, sunset", model='nai-diffusion-3', scale=5.0, seed=1)
+    add(store, "1boy, (long hair:1.1), beach", model='nai-diffusion-4-5-full', scale=7.0, seed=2)
+    add(store, "landscape, sunset", model='nai-diffusion-3', scale=6.0, seed=3)
+    store.flush()
+
+    def seeds(query):
+        return [record['seed'] for record in store.query(query)]
+
+    assert seeds("tag:long hair") == [2, 1]
+    assert seeds("sunset") == [3, 1]
+    assert seeds("sunset model:nai-diffusion-3 cfg>5") == [3]
+    assert seeds("cfg<=5") == [1]
+    assert seeds("seed:2") == [2]
+    assert seeds("seed:two") == []
+    assert seeds('"unbalanced') == []
+    assert store.count() == 3
+
+
+def test_set_path_fills_in_saved_images(store):
+    add(store, "1girl")
+    store.add({'prompt': "1girl"}, content_hash='abc')
+    store.set_path('abc', '/images/a.png')
+    store.flush()
+    assert [record['path'] for record in store.query("1girl")] == ['/images/a.png', None]
+
+
+def test_failed_write_does_not_hang_flush(store):
+    store._queue.put(('set_path', ('missing a parameter',)))
+    add(store, "still stored")
+    done = threading.Thread(target=store.flush, daemon=True)
+    done.start()
+    done.join(5)
+    assert not done.is_alive()
+    assert store.count() == 1
@@ -0,0 +1,24 @@
+import pytest
+
+QtCore = pytest.importorskip('PyQt6.QtCore')
+from PyQt6.QtGui import QImage  # noqa: E402
+from utils.image_cache import DecodedImageCache  # noqa: E402
+
+
+def png_bytes(width, height):
+    image = QImage(width, height, QImage.Format.Format_RGB32)
+    image.fill(0)
+    buffer = QtCore.QBuffer()
+    buffer.open(QtCore.QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "PNG")
+    return bytes(buffer.data())
+
+
+def test_growing_an_evicted_entry_leaves_the_total_alone():
+    first, second = png_bytes(64, 64), png_bytes(64, 65)
+    cache = DecodedImageCache(max_bytes=64 * 65 * 4 + 100)
+    entry = cache._entry(first)
+    cache._entry(second)  # Evicts the first image
+    total = cache._total_bytes
+    cache._grow(entry, 10000)
+    assert cache._total_bytes == total
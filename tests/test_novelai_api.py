@@ -0,0 +1,58 @@
+import io
+import zipfile
+import pytest
+from api.transport import TransportResponse
+from utils.request_cache import RequestCache
+
+
+class FakeTransport:
+    def __init__(self, *bodies):
+        self.bodies = list(bodies)
+        self.posts = 0
+
+    def post(self, url, headers, body, timeout=None):
+        self.posts += 1
+        return TransportResponse(200, self.bodies.pop(0))
+
+
+def response_zip(*images):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zip_file:
+        for index, image in enumerate(images):
+            zip_file.writestr(f"image_{index}.png", image)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def make_client(config, tmp_path):
+    from novelai_api import NovelAIClient
+
+    def make(*bodies):
+        cache = RequestCache(str(tmp_path / "cache"))
+        return NovelAIClient(cache=cache, transport=FakeTransport(*bodies), api_key='test'), cache
+    return make
+
+
+def test_valid_response_is_cached(make_client):
+    client, _ = make_client(response_zip(b'a', b'b'))
+    assert client.generate_images("cat", seed=5, n_samples=2) == [(b'a', 5), (b'b', 6)]
+    assert client.generate_images("cat", seed=5, n_samples=2) == [(b'a', 5), (b'b', 6)]
+    assert client.transport.posts == 1
+
+
+def test_broken_response_is_not_cached(make_client):
+    client, _ = make_client(b'<html>gateway timeout</html>', response_zip(b'a'))
+    assert client.generate_images("cat", seed=5) == []
+    assert client.generate_images("cat", seed=5) == [(b'a', 5)]
+    assert client.transport.posts == 2
+
+
+def test_unreadable_cache_entry_is_refetched(make_client):
+    client, cache = make_client(response_zip(b'a'), response_zip(b'b'))
+    client.generate_images("cat", seed=5)
+    (key,) = cache._entries
+    with open(cache._path(key), 'wb') as f:
+        f.write(b'truncated')
+    assert client.generate_images("cat", seed=5) == [(b'b', 5)]
+    assert client.generate_images("cat", seed=5) == [(b'b', 5)]
+    assert client.transport.posts == 2
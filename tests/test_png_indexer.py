@@ -0,0 +1,55 @@
+import json
+import os
+import pytest
+from utils.history_store import HistoryStore
+from utils.png_indexer import index_folder
+from utils.png_metadata import make_chunk, text_chunk
+
+SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def write_png(path, comment=None):
+    chunks = [text_chunk('Comment', json.dumps(comment))] if comment is not None else []
+    path.write_bytes(SIGNATURE + b''.join(chunks) + make_chunk(b'IEND', b''))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    yield store
+    store.close()
+
+
+def test_index_is_incremental(tmp_path, store, monkeypatch):
+    folder = tmp_path / "images"
+    folder.mkdir()
+    write_png(folder / "a.png", {'prompt': "1girl, sunset", 'seed': 7, 'scale': 5.0})
+    write_png(folder / "plain.png")
+
+    assert index_folder(store, str(folder), workers=2) == (1, 1)
+    assert [record['seed'] for record in store.query("sunset")] == [7]
+    assert store.count() == 1
+
+    # Nothing changed: neither file, with or without metadata, is read again
+    read = []
+    monkeypatch.setattr('utils.png_indexer.read_png_metadata', lambda path: read.append(path))
+    assert index_folder(store, str(folder), workers=2) == (0, 2)
+    assert read == []
+
+    monkeypatch.undo()
+    write_png(folder / "plain.png", {'prompt': "beach", 'seed': 8})
+    os.utime(folder / "plain.png", (1, 1))
+    assert index_folder(store, str(folder), workers=2) == (1, 1)
+    assert [record['seed'] for record in store.query("beach")] == [8]
+
+
+def test_malformed_metadata_does_not_stop_the_run(tmp_path, store):
+    folder = tmp_path / "images"
+    folder.mkdir()
+    write_png(folder / "good.png", {'prompt': "sunset", 'seed': 1})
+    (folder / "list.png").write_bytes(SIGNATURE + text_chunk('Comment', "[1, 2]") + make_chunk(b'IEND', b''))
+    (folder / "ztxt.png").write_bytes(SIGNATURE + make_chunk(b'zTXt', b'Comment\x00\x00not zlib') +
+                                      make_chunk(b'IEND', b''))
+
+    assert index_folder(store, str(folder), workers=2) == (1, 2)
+    assert [record['seed'] for record in store.query("sunset")] == [1]
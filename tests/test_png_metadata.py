@@ -0,0 +1,41 @@
+import json
+import pytest
+from utils.png_metadata import (PNG_SIGNATURE, insert_text_chunks, make_chunk, novelai_parameters_from_text,
+                                novelai_text_chunks, read_text_chunks, read_text_chunks_from_file, text_chunk)
+
+IHDR = make_chunk(b'IHDR', b'\x00\x00\x00\x01\x00\x00\x00\x01\x08\x02\x00\x00\x00')
+IEND = make_chunk(b'IEND', b'')
+
+
+def test_metadata_round_trip(tmp_path):
+    comment = {'prompt': "1girl", 'uc': "lowres", 'seed': 5, 'scale': 5.0, 'noise_schedule': 'karras'}
+    png = insert_text_chunks(PNG_SIGNATURE + IHDR + IEND, novelai_text_chunks(comment))
+    path = tmp_path / "image.png"
+    path.write_bytes(png)
+    assert read_text_chunks(png) == read_text_chunks_from_file(str(path))
+    assert novelai_parameters_from_text(read_text_chunks(png)) == {
+        'prompt': "1girl", 'negative_prompt': "lowres", 'seed': 5, 'scale': 5.0, 'scheduler': 'karras'}
+
+
+def test_non_latin_text_uses_itxt():
+    png = PNG_SIGNATURE + text_chunk('Comment', json.dumps({'prompt': "猫"}, ensure_ascii=False)) + IEND
+    assert novelai_parameters_from_text(read_text_chunks(png)) == {'prompt': "猫", 'negative_prompt': ''}
+
+
+def test_comment_that_is_not_an_object_has_no_parameters():
+    png = PNG_SIGNATURE + text_chunk('Comment', "[1, 2]") + IEND
+    assert novelai_parameters_from_text(read_text_chunks(png)) is None
+
+
+@pytest.mark.parametrize('chunk', [
+    make_chunk(b'zTXt', b'Comment\x00\x00not zlib'),
+    make_chunk(b'iTXt', b'Comment\x00\x01\x00\x00\x00not zlib'),
+])
+def test_corrupt_compressed_text_raises_value_error(tmp_path, chunk):
+    png = PNG_SIGNATURE + chunk + IEND
+    path = tmp_path / "image.png"
+    path.write_bytes(png)
+    with pytest.raises(ValueError):
+        read_text_chunks(png)
+    with pytest.raises(ValueError):
+        read_text_chunks_from_file(str(path))
@@ -0,0 +1,44 @@
+import pytest
+from utils.prompt_assembly import (NEGATIVE_QUALITY_TAGS, POSITIVE_QUALITY_TAGS, PromptInputs,
+                                   assemble_prompt)
+from utils.prompt_normalizer import dedupe_prompt
+from utils.tag_manager import TagManager
+
+
+@pytest.fixture(scope='module')
+def tags():
+    return TagManager.shared()
+
+
+def test_prompt_without_duplicates_is_unchanged(tags):
+    assert dedupe_prompt("1girl,smile ,\n(solo:1.1)", tags) == "1girl,smile ,\n(solo:1.1)"
+
+
+def test_duplicates_are_dropped_with_their_separator(tags):
+    assert dedupe_prompt("1girl, smile, 1girl, beach", tags) == "1girl, smile, beach"
+    assert dedupe_prompt("long hair\nsmile\nlong_hair\nbeach", tags) == "long hair\nsmile\nbeach"
+    assert dedupe_prompt("smile, smile, smile", tags) == "smile"
+
+
+def test_weights_are_merged_into_the_first_mention(tags):
+    assert dedupe_prompt("1girl, smile, (smile:1.2)", tags) == "1girl, (smile:1.2)"
+    assert dedupe_prompt("(smile:1.2), smile", tags) == "(smile:1.2)"
+
+
+def test_reserved_tags_are_left_to_the_quality_block(tags):
+    assert dedupe_prompt("best quality, 1girl, absurdres", tags, reserved=POSITIVE_QUALITY_TAGS) == "1girl"
+    assert dedupe_prompt("1girl, (best quality:1.3)", tags, reserved=POSITIVE_QUALITY_TAGS) == \
+        "1girl, (best quality:1.3)"
+
+
+def test_quality_block_stays_at_the_end():
+    assembled = assemble_prompt(PromptInputs("1girl\nabsurdres\nsmile, 1girl", "lowres, bad hands"))
+    assert assembled.display_prompt == f"1girl\nsmile, {POSITIVE_QUALITY_TAGS}"
+    assert assembled.display_negative_prompt == f"bad hands, {NEGATIVE_QUALITY_TAGS}"
+    assert assembled.prompt.endswith(f", {POSITIVE_QUALITY_TAGS}")
+
+
+def test_quality_tags_are_optional():
+    assembled = assemble_prompt(PromptInputs("1girl, (smile:1.2), 1girl", "", False, False))
+    assert assembled.prompt == "1girl, 1.2::smile::"
+    assert assembled.negative_prompt == ""
@@ -0,0 +1,72 @@
+import random
+import time
+from utils.prompt_converter import nai_to_sd_format, sd_to_nai_format
+from utils.prompt_parser import IncrementalTokens, group_at, token_at, tokenize
+
+
+def tags(text):
+    return [(token.tag, token.weight, token.syntax) for token in tokenize(text)]
+
+
+def test_plain_and_weighted_tags():
+    assert tags("1girl, (smile:1.2), 0.8::blue eyes::") == [
+        ('1girl', 1.0, 'plain'), ('smile', 1.2, 'sd'), ('blue eyes', 0.8, 'nai')]
+
+
+def test_escaped_parentheses_are_plain():
+    assert tags(r"\(cosplay\), solo") == [(r'\(cosplay\)', 1.0, 'plain'), ('solo', 1.0, 'plain')]
+
+
+def test_sd_groups_nest():
+    group, = tokenize("((a:1.1), b:1.2)")
+    assert [child.tag for child in group.children] == ['a', 'b']
+    assert sd_to_nai_format("((a:1.1), b:1.2)") == "1.3::a::, 1.2::b::"
+
+
+def test_new_nai_opener_ends_the_open_group():
+    assert tags("1.2::a, 0.8::b, c::") == [('a', 1.2, 'nai'), ('b, c', 0.8, 'nai')]
+
+
+def test_conversion_leaves_nai_syntax_untouched():
+    for text in ("1.2::a, 0.8::b, c::", "1.2::a::, 2::b", "1girl, 1.1::smile::"):
+        assert sd_to_nai_format(text) == text
+
+
+def test_conversion_round_trip():
+    assert sd_to_nai_format("1girl, (smile:1.2)") == "1girl, 1.2::smile::"
+    assert nai_to_sd_format("1girl, 1.2::smile::") == "1girl, (smile:1.2)"
+
+
+def test_long_prompts_do_not_recurse():
+    assert len(tokenize('1.1::a, ' * 350 + 'x::')) == 350
+    assert len(tokenize('2::a, ' * 400)) == 400
+    deep = '(' * 500 + 'a' + ':1.1)' * 500
+    assert tokenize(deep)
+    assert sd_to_nai_format(deep)
+
+
+def test_long_digit_runs_tokenize_in_linear_time():
+    # A weight pattern that could split a digit run several ways took seconds here
+    start = time.perf_counter()
+    for text in ('1' * 100000, '1.' + '1' * 100000, '-' + '1' * 100000 + ', x'):
+        assert len(tokenize(text)) >= 1
+    assert time.perf_counter() - start < 3
+
+
+def test_incremental_edits_match_full_tokenize():
+    rng = random.Random(1)
+    alphabet = "ab c,,\n1.2:()\\-x"
+    for _ in range(300):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randrange(0, 40)))
+        incremental = IncrementalTokens(text)
+        for _ in range(10):
+            pos = rng.randrange(0, len(text) + 1)
+            removed = rng.randrange(0, min(4, len(text) - pos) + 1)
+            inserted = ''.join(rng.choice(alphabet) for _ in range(rng.randrange(0, 4)))
+            text = text[:pos] + inserted + text[pos + removed:]
+            incremental.apply_edit(pos, removed, len(inserted), text)
+            full = tokenize(text)
+            assert incremental.tokens == full, repr(text)
+            position = rng.randrange(0, len(text) + 1)
+            assert incremental.token_at(position) == token_at(full, position)
+            assert incremental.group_at(position) == group_at(full, position)
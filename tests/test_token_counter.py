@@ -0,0 +1,40 @@
+import json
+from utils.token_counter import TokenCounter, model_family
+
+
+def write_tokenizer(directory, family, model):
+    (directory / f"{family}_tokenizer.json").write_text(json.dumps({'model': model}), encoding='utf-8')
+
+
+def test_model_family():
+    assert model_family('nai-diffusion-4-5-full') == 't5'
+    assert model_family('nai-diffusion-3') == 'clip'
+
+
+def test_estimate_ignores_weight_syntax():
+    counter = TokenCounter('clip')
+    assert not counter.exact
+    assert counter.count("1girl, smile") == counter.count("(1girl:1.2), 1.1::smile::") == 4
+
+
+def test_estimates_are_only_over_the_limit_past_the_margin():
+    counter = TokenCounter('clip')
+    slightly_over = ', '.join(['tag'] * 120)  # 239 estimated tokens against a 225 limit
+    assert not counter.check(slightly_over)[1]
+    assert counter.over_limit(slightly_over) == (239, False)
+    assert counter.over_limit(', '.join(['tag'] * 150))[1]
+
+
+def test_exact_counts_use_the_limit_as_is(tmp_path):
+    write_tokenizer(tmp_path, 'clip', {'type': 'BPE', 'merges': ["t a", "ta g</w>"], 'end_of_word_suffix': '</w>'})
+    counter = TokenCounter('clip', str(tmp_path))
+    assert counter.exact
+    assert counter.count("tag, tags") == 1 + 1 + 3
+    assert counter.over_limit(', '.join(['tag'] * 120)) == (239, True)
+
+
+def test_unigram_picks_the_best_split(tmp_path):
+    vocab = [['▁', -1.0], ['▁long', -2.0], ['hair', -2.0], ['▁longhair', -10.0], ['h', -5.0]]
+    write_tokenizer(tmp_path, 't5', {'type': 'Unigram', 'vocab': vocab})
+    counter = TokenCounter('t5', str(tmp_path))
+    assert counter.count("longhair") == 2
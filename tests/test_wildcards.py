@@ -0,0 +1,97 @@
+import random
+from utils.prompt_assembly import PromptInputs
+from utils.wildcards import (PromptExpander, WildcardLibrary, WildcardFile, expand_prompt_inputs,
+                             has_wildcards, parse_template)
+
+
+def write_wildcard(directory, name, text):
+    path = directory / f"{name}.txt"
+    path.write_text(text, encoding='utf-8')
+    return path
+
+
+def test_braces_without_alternatives_are_left_alone():
+    assert not has_wildcards("{masterpiece}, 1girl")
+    assert has_wildcards("{red|blue} hair")
+    assert has_wildcards("__colors__ hair")
+
+
+def test_combinations_walk_every_alternative_in_order():
+    expander = PromptExpander()
+    assert list(expander.combinations("{a|b} {x|y}")) == ["a x", "a y", "b x", "b y"]
+    assert expander.count("{a|b} {x|{y|z}}") == 6
+
+
+def test_escaped_braces_are_literal():
+    assert parse_template(r"\{a|b\}") == ("{a|b}",)
+
+
+def test_batch_of_plain_prompt_yields_every_job():
+    jobs = list(expand_prompt_inputs(PromptInputs('1girl, solo', ''), PromptExpander(), 5, 'random', 42))
+    assert len(jobs) == 5
+    assert all(job.prompt == '1girl, solo' for job in jobs)
+
+
+def test_random_batch_yields_count_even_with_few_alternatives():
+    jobs = list(expand_prompt_inputs(PromptInputs('{a|b}', ''), PromptExpander(), 5, 'random', 42))
+    assert len(jobs) == 5
+    assert {job.prompt for job in jobs} <= {'a', 'b'}
+
+
+def test_random_batch_is_reproducible_from_its_seed():
+    inputs = PromptInputs('{a|b|c|d} {x|y|z}', '{n1|n2}')
+    first = list(expand_prompt_inputs(inputs, PromptExpander(), 8, 'random', 7))
+    second = list(expand_prompt_inputs(inputs, PromptExpander(), 8, 'random', 7))
+    assert first == second
+
+
+def test_combinatorial_batch_stops_when_combinations_run_out():
+    jobs = list(expand_prompt_inputs(PromptInputs('{a|b}', ''), PromptExpander(), 5, 'combinatorial', 1))
+    assert [job.prompt for job in jobs] == ['a', 'b']
+
+
+def test_plain_prompt_in_combinatorial_mode_still_fills_the_batch():
+    jobs = list(expand_prompt_inputs(PromptInputs('cat', ''), PromptExpander(), 3, 'combinatorial', 1))
+    assert len(jobs) == 3
+
+
+def test_self_including_wildcard_stops_at_depth_limit(tmp_path):
+    write_wildcard(tmp_path, 'loop', "x __loop__\n")
+    library = WildcardLibrary(str(tmp_path))
+    try:
+        expander = PromptExpander(library)
+        result = expander.sample("__loop__", random.Random(1))
+        assert result.startswith("x x ")
+        assert list(expander.combinations("__loop__")) == []
+        assert expander.count("__loop__") == 0
+    finally:
+        library.close()
+
+
+def test_wildcard_lines_are_sampled(tmp_path):
+    write_wildcard(tmp_path, 'colors', "red\nblue\n")
+    library = WildcardLibrary(str(tmp_path))
+    try:
+        expander = PromptExpander(library)
+        assert sorted(expander.combinations("__colors__ hair")) == ["blue hair", "red hair"]
+        assert expander.sample("__colors__", random.Random(3)) in ("red", "blue")
+        assert expander.sample("__missing__", random.Random(3)) == "__missing__"
+    finally:
+        library.close()
+
+
+def test_comments_and_blank_lines_are_skipped(tmp_path):
+    write_wildcard(tmp_path, 'colors', "red\n  # indented comment\n   \n\t\n# comment\n  blue  \r\n")
+    library = WildcardLibrary(str(tmp_path))
+    try:
+        assert sorted(PromptExpander(library).combinations("__colors__")) == ["blue", "red"]
+    finally:
+        library.close()
+
+
+def test_empty_wildcard_file(tmp_path):
+    wildcard_file = WildcardFile(str(write_wildcard(tmp_path, 'empty', "")))
+    try:
+        assert len(wildcard_file) == 0
+    finally:
+        wildcard_file.close()
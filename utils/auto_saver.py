@@ -0,0 +1,175 @@
+"""Background writer that streams generated images into an output directory"""
+import os
+import re
+import threading
+from collections import deque
+from datetime import datetime
+
+DEFAULT_FILENAME_TEMPLATE = "{timestamp}_{seed}_{model}"
+
+# fsync policies: never - leave flushing to the OS
+#                 always - fsync every file before it appears under its final name
+#                 batch - fsync everything written so far whenever the queue drains
+FSYNC_POLICIES = ('never', 'always', 'batch')
+
+_UNSAFE_FILENAME_CHARS = re.compile(r'[^\w.\-]+')
+
+
+class AutoSaver:
+    """Queue images for writing on a background thread.
+
+    Queued image bytes are capped at max_queued_bytes; submit() only blocks when
+    the disk falls that far behind, so normal disk latency never delays the
+    caller. Files are written to a temporary name and renamed into place.
+    """
+
+    def __init__(self, output_dir: str, filename_template: str = DEFAULT_FILENAME_TEMPLATE,
+                 fsync_policy: str = 'batch', max_queued_bytes: int = 256 * 1024 * 1024):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy must be one of {FSYNC_POLICIES}")
+
+        self.output_dir = output_dir
+        self.filename_template = filename_template
+        self.fsync_policy = fsync_policy
+        self.max_queued_bytes = max_queued_bytes
+
+        self._queue = deque()
+        self._queued_bytes = 0
+        self._busy = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._unsynced = []  # Paths written since the last batch fsync
+        self._thread = None
+
+    def format_filename(self, metadata: dict, timestamp: datetime) -> str:
+        """Expand the filename template (without extension) for one image"""
+        fields = {
+            'timestamp': timestamp.strftime("%Y%m%d_%H%M%S_%f"),
+            'date': timestamp.strftime("%Y-%m-%d"),
+            'seed': metadata.get('seed', 0),
+            'model': metadata.get('model', ''),
+            'sampler': metadata.get('sampler', ''),
+            'scheduler': metadata.get('scheduler', ''),
+            'steps': metadata.get('steps', ''),
+            'scale': metadata.get('scale', ''),
+            'width': metadata.get('width', ''),
+            'height': metadata.get('height', ''),
+        }
+        try:
+            name = self.filename_template.format(**fields)
+        except (KeyError, IndexError, ValueError) as e:
+            print(f"Invalid auto-save filename template: {e}")
+            name = DEFAULT_FILENAME_TEMPLATE.format(**fields)
+
+        # Template fields may contain path separators or other unsafe characters
+        return _UNSAFE_FILENAME_CHARS.sub('_', name).strip('._') or fields['timestamp']
+
+    def submit(self, image_bytes: bytes, metadata: dict, on_saved=None):
+        """Queue an image for saving (blocks only while the queue is over its byte budget).
+        
+        on_saved(path) is called from the writer thread once the file is in place.
+        """
+        name = self.format_filename(metadata, datetime.now())
+        size = len(image_bytes)
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("AutoSaver is closed")
+            while self._queue and self._queued_bytes + size > self.max_queued_bytes:
+                self._condition.wait()
+            self._queue.append((name, image_bytes, on_saved))
+            self._queued_bytes += size
+            self._condition.notify_all()
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="AutoSaver", daemon=True)
+                self._thread.start()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until everything queued so far is on disk"""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._queue and not self._busy, timeout)
+
+    def close(self):
+        """Write out the remaining queue and stop the writer thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                name, image_bytes, on_saved = self._queue.popleft()
+                self._busy = True
+
+            try:
+                path = self._write(name, image_bytes)
+                if on_saved is not None:
+                    on_saved(path)
+            except OSError as e:
+                print(f"Auto-save failed for {name}: {e}")
+
+            with self._condition:
+                self._queued_bytes -= len(image_bytes)
+                drained = not self._queue
+                self._condition.notify_all()
+
+            if drained and self.fsync_policy == 'batch':
+                self._sync_batch()
+
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+
+    def _write(self, name: str, image_bytes: bytes):
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        path = os.path.join(self.output_dir, f"{name}.png")
+        counter = 1
+        while os.path.exists(path):
+            path = os.path.join(self.output_dir, f"{name}_{counter}.png")
+            counter += 1
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            # NovelAI PNGs already carry their metadata chunks - write them untouched
+            f.write(image_bytes)
+            if self.fsync_policy == 'always':
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        if self.fsync_policy == 'always':
+            self._fsync_dir()
+        elif self.fsync_policy == 'batch':
+            self._unsynced.append(path)
+        return path
+
+    def _sync_batch(self):
+        for path in self._unsynced:
+            try:
+                with open(path, 'rb') as f:
+                    os.fsync(f.fileno())
+            except OSError:
+                pass
+        self._unsynced = []
+        self._fsync_dir()
+
+    def _fsync_dir(self):
+        # Directory fsync makes the rename durable; not supported on Windows
+        if os.name != 'posix':
+            return
+        try:
+            fd = os.open(self.output_dir, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
@@ -0,0 +1,297 @@
+"""Headless, resumable batch runs from a JSONL job manifest
+
+Each manifest line is one request, with the fields the app stores as image
+metadata:
+
+    {"prompt": "1girl, (smile:1.2)", "negative_prompt": "lowres", "model": "nai-diffusion-4-5-full",
+     "width": 832, "height": 1216, "steps": 28, "scale": 5.0, "sampler": "k_euler_ancestral",
+     "scheduler": "karras", "n_samples": 1, "seed": 1234}
+
+Missing fields fall back to the app's defaults. A negative or missing seed is
+picked at random. Prompts go through the same wildcard expansion (seeded by the
+job's seed) and assembly as the GUI; quality tags are only added when
+"positive_quality" / "negative_quality" are true, so metadata from the app's
+images can be used as-is. An optional "id" names the job.
+
+Progress is appended to a journal next to the manifest (<manifest>.journal).
+Every line is fsync'd before the runner moves on:
+
+    {"event": "start", "job": ..., "seed": ...}    before the request is sent
+    {"event": "done", "job": ..., "files": [...]}  after the images are on disk
+    {"event": "failed" | "skipped", "job": ..., "error": ...}
+
+A rerun skips finished jobs. A job that was started but never finished is
+retried with its journaled seed, unless its output files are already on disk,
+so images that were saved before an interruption are never requested again. A
+torn last line (crash mid-write) is ignored.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+from utils.prompt_assembly import PromptInputs, assemble_prompt
+from utils.token_counter import get_token_counter
+from utils.wildcards import PromptExpander, WildcardLibrary, has_wildcards
+
+# Used for fields a manifest line leaves out (the GUI's defaults)
+DEFAULT_PARAMS = {
+    'model': 'nai-diffusion-4-5-full',
+    'width': 832,
+    'height': 1216,
+    'steps': 23,
+    'scale': 5.0,
+    'sampler': 'k_euler_ancestral',
+    'scheduler': 'karras',
+    'n_samples': 1,
+}
+
+MAX_CONSECUTIVE_FAILURES = 3  # Stop instead of burning through the manifest while the API is down
+
+
+def read_manifest(path: str) -> Iterator[Tuple[str, dict]]:
+    """Yield (job key, job) for each manifest line, streaming the file.
+
+    Jobs without an "id" are keyed by their content, so a manifest can be
+    edited or reordered between runs without confusing the journal.
+    """
+    occurrences = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON: {e}") from None
+            if not isinstance(job, dict):
+                raise ValueError(f"{path}:{line_number}: expected a JSON object")
+
+            key = job.get('id')
+            if key is None:
+                digest = hashlib.sha1(json.dumps(job, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+                occurrences[digest] = occurrences.get(digest, 0) + 1
+                key = f"{digest}-{occurrences[digest]}"
+            yield str(key), job
+
+
+class Journal:
+    """Append-only, fsync'd record of a manifest's progress"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.started: Dict[str, int] = {}  # job -> seed of the latest start
+        self.finished = set()
+        torn = self._load()
+        self._file = open(path, 'a', encoding='utf-8')
+        if torn:
+            self._file.write('\n')  # Keep the next record off the torn line
+
+    def _load(self) -> bool:
+        """Replay the journal - returns True if its last line is incomplete"""
+        try:
+            f = open(self.path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return False
+        line = '\n'
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Torn write from a crash
+                event, job = record.get('event'), record.get('job')
+                if event == 'start':
+                    self.started[job] = record['seed']
+                elif event == 'done':
+                    self.finished.add(job)
+                elif event in ('failed', 'skipped'):
+                    self.started.pop(job, None)  # Retried with a fresh start on the next run
+        return not line.endswith('\n')
+
+    def append(self, event: str, job: str, **fields):
+        """Write one record and make it durable before returning"""
+        record = dict(event=event, job=job, time=time.time(), **fields)
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        if event == 'start':
+            self.started[job] = fields['seed']
+        elif event == 'done':
+            self.finished.add(job)
+
+    def close(self):
+        self._file.close()
+
+
+def _fsync_dir(path: str):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # Not supported on this platform
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_durably(path: str, data: bytes):
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)  # NovelAI PNGs already carry their metadata chunks
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def output_paths(output_dir: str, key: str, seed: int, n_samples: int) -> List[str]:
+    """Where a job's images go; deterministic so a resumed run can find them"""
+    safe_key = ''.join(char if char.isalnum() or char in '-_.' else '_' for char in key)
+    return [os.path.join(output_dir, f"{safe_key}_{seed + index}.png") for index in range(n_samples)]
+
+
+class BatchRunner:
+    """Run a manifest through a NovelAIClient, one request at a time"""
+
+    def __init__(self, client, manifest_path: str, output_dir: Optional[str] = None,
+                 journal_path: Optional[str] = None, check_tokens: bool = True,
+                 expander: Optional[PromptExpander] = None):
+        self.client = client
+        self.manifest_path = manifest_path
+        self.output_dir = output_dir or os.path.splitext(manifest_path)[0] + '_output'
+        self.journal_path = journal_path or manifest_path + '.journal'
+        self.check_tokens = check_tokens
+        self.expander = expander or PromptExpander()
+
+    def prepare(self, job: dict, seed: int) -> Tuple[str, dict]:
+        """(prompt, request params) for a manifest job, in the form sent to the API.
+
+        {a|b} and __wildcard__ prompts are sampled from the job's seed, so a
+        resumed job sends the same prompt it did before.
+        """
+        inputs = PromptInputs(job.get('prompt', ''), job.get('negative_prompt', ''),
+                              bool(job.get('positive_quality', False)), bool(job.get('negative_quality', False)))
+        if has_wildcards(inputs.prompt) or has_wildcards(inputs.negative_prompt):
+            rng = random.Random(seed)
+            inputs = inputs._replace(prompt=self.expander.sample(inputs.prompt, rng),
+                                     negative_prompt=self.expander.sample(inputs.negative_prompt, rng))
+        assembled = assemble_prompt(inputs)
+        params = {name: job.get(name, default) for name, default in DEFAULT_PARAMS.items()}
+        params['negative_prompt'] = assembled.negative_prompt
+        return assembled.prompt, params
+
+    def run(self) -> dict:
+        """Run every unfinished job - returns counts of done, skipped, failed and already finished jobs"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        journal = Journal(self.journal_path)
+        counts = {'done': 0, 'skipped': 0, 'failed': 0, 'already_done': 0}
+        consecutive_failures = 0
+        try:
+            for key, job in read_manifest(self.manifest_path):
+                if key in journal.finished:
+                    counts['already_done'] += 1
+                    continue
+
+                result = self.run_job(journal, key, job)
+                counts[result] += 1
+                consecutive_failures = consecutive_failures + 1 if result == 'failed' else 0
+                if consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                    print(f"Stopping after {consecutive_failures} failures in a row; rerun to resume")
+                    break
+        finally:
+            journal.close()
+        return counts
+
+    def run_job(self, journal: Journal, key: str, job: dict) -> str:
+        # A job interrupted after its start record reuses that seed, which also identifies its files
+        seed = journal.started.get(key)
+        resumed = seed is not None
+        try:
+            if seed is None:
+                seed = int(job.get('seed', -1))
+                if seed < 0:
+                    seed = random.randint(0, 2147483647)
+            prompt, params = self.prepare(job, seed)
+            paths = output_paths(self.output_dir, key, seed, int(params['n_samples']))
+        except Exception as e:
+            journal.append('skipped', key, error=f"Invalid job: {e}")
+            print(f"[{key}] skipped: invalid job ({e})")
+            return 'skipped'
+
+        if self.check_tokens:
+            counter = get_token_counter(params['model'])
+            count, too_long = counter.over_limit(prompt)
+            if too_long:
+                journal.append('skipped', key, error=f"{count} tokens, limit {counter.limit}")
+                print(f"[{key}] skipped: {count} tokens exceeds the {counter.limit} token limit")
+                return 'skipped'
+
+        if resumed and all(os.path.exists(path) for path in paths):
+            journal.append('done', key, seed=seed, files=paths)
+            print(f"[{key}] already on disk")
+            return 'done'
+
+        journal.append('start', key, seed=seed)
+        print(f"[{key}] generating (seed: {seed})")
+        try:
+            images = self.client.generate_images(prompt, seed=seed, **params)
+        except Exception as e:
+            images = []
+            print(f"[{key}] error: {e}")
+        if not images:
+            journal.append('failed', key, seed=seed, error="Failed to generate image")
+            print(f"[{key}] failed")
+            return 'failed'
+
+        written = []
+        try:
+            for (image_bytes, _), path in zip(images, paths):
+                _write_durably(path, image_bytes)
+                written.append(path)
+        except OSError as e:  # Disk full, permissions
+            journal.append('failed', key, seed=seed, error=f"Failed to save image: {e}")
+            print(f"[{key}] failed to save: {e}")
+            return 'failed'
+        _fsync_dir(self.output_dir)
+        journal.append('done', key, seed=seed, files=written)
+        print(f"[{key}] saved {len(written)} image(s)")
+        return 'done'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a JSONL batch manifest (resumable)")
+    parser.add_argument('manifest', help="JSONL file, one generation per line")
+    parser.add_argument('--output', help="output folder (default: <manifest>_output)")
+    parser.add_argument('--journal', help="progress journal (default: <manifest>.journal)")
+    parser.add_argument('--no-token-check', action='store_true',
+                        help="send prompts even if they exceed the model's token limit")
+    args = parser.parse_args(argv)
+
+    from novelai_api import NovelAIClient
+    from config import Config
+    library = WildcardLibrary(Config.WILDCARD_DIR)
+    runner = BatchRunner(NovelAIClient(), args.manifest, args.output, args.journal,
+                         check_tokens=not args.no_token_check, expander=PromptExpander(library))
+    try:
+        counts = runner.run()
+    finally:
+        library.close()
+    print(f"Done: {counts['done']} generated, {counts['already_done']} already finished, "
+          f"{counts['skipped']} skipped, {counts['failed']} failed -> {runner.output_dir}")
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,47 @@
+"""Concurrent generation queue shared by grid runs"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, List, Optional, Tuple
+
+
+class GenerationQueue:
+    """Run generation requests on a small pool of worker threads.
+
+    Jobs are started in submission order, at most max_workers at a time (NovelAI
+    answers extra concurrent requests with 429, so the default is one). Callbacks
+    run on the worker thread; GUI code must hand results over with a signal.
+    """
+
+    def __init__(self, client, max_workers: int = 1):
+        self.client = client
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="Generation")
+        self._cancelled = threading.Event()
+
+    def submit(self, job, prompt: str, params: dict,
+               on_result: Callable[[object, List[Tuple[bytes, int]]], None],
+               on_error: Optional[Callable[[object, str], None]] = None) -> Future:
+        """Queue one request; on_result(job, images) or on_error(job, message) is called when it ends"""
+        return self._executor.submit(self._run, job, prompt, params, on_result, on_error)
+
+    def _run(self, job, prompt, params, on_result, on_error):
+        if self._cancelled.is_set():
+            return
+        try:
+            images = self.client.generate_images(prompt, **params)
+            if not images:
+                raise RuntimeError("Failed to generate image")
+            on_result(job, images)
+        except Exception as e:
+            if on_error is not None:
+                on_error(job, str(e))
+            else:
+                print(f"Generation failed: {e}")
+
+    def cancel(self):
+        """Drop queued jobs; requests already sent still finish"""
+        self._cancelled.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
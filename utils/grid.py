@@ -0,0 +1,277 @@
+"""Seed sweeps and parameter grids (X/Y/Z plots) with incrementally built contact sheets
+
+Each axis varies one generation parameter. X and Y span a contact sheet; every
+Z value gets its own sheet. Full-size images are written to disk as they
+arrive and only a downscaled tile is pasted into the sheet. Tiles shrink so a
+sheet is never more than MAX_SHEET_SIZE pixels a side, and a grid has at most
+MAX_GRID_CELLS cells, so each sheet being filled holds one canvas of bounded
+size. The sheet file is rewritten as tiles arrive, so a partial grid is
+viewable at any time.
+"""
+import io
+import os
+import re
+import threading
+import time
+from itertools import product
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from PIL import Image, ImageDraw, ImageFont
+
+# Axis name -> generation parameter it varies
+AXES = {
+    'Seed': 'seed',
+    'CFG': 'scale',
+    'Steps': 'steps',
+    'Sampler': 'sampler',
+    'Scheduler': 'scheduler',
+}
+
+_RANGE = re.compile(r'^(-?\d+(?:\.\d+)?)\s*-\s*(-?\d+(?:\.\d+)?)(?:\s*:\s*(\d+(?:\.\d+)?))?$')
+
+MAX_AXIS_VALUES = 100
+MAX_GRID_CELLS = 1000
+MAX_SHEET_SIZE = 4096  # Pixels per side of a contact sheet
+MIN_TILE_WIDTH = 16
+
+LABEL_WIDTH = 160
+LABEL_HEIGHT = 32
+BACKGROUND = (30, 30, 30)
+LABEL_COLOR = (220, 220, 220)
+MISSING_COLOR = (60, 30, 30)
+
+
+class GridAxis(NamedTuple):
+    name: str    # Key of AXES
+    values: list
+
+    def label(self, index: int) -> str:
+        return f"{self.name}: {self.values[index]}"
+
+
+class GridCell(NamedTuple):
+    x: int
+    y: int
+    z: int
+    params: dict  # Complete generation parameters for this cell
+
+
+def parse_axis_values(name: str, text: str) -> list:
+    """Values for an axis from comma separated items; numeric axes also take ranges like 1-8 or 4-6:0.5"""
+    if name not in AXES:
+        raise ValueError(f"Unknown axis: {name}")
+    items = [item.strip() for item in text.split(',') if item.strip()]
+    if not items:
+        raise ValueError(f"{name} needs at least one value")
+    if name in ('Sampler', 'Scheduler'):
+        return items
+
+    number = float if name == 'CFG' else int
+    values = []
+    for item in items:
+        match = _RANGE.match(item)
+        try:
+            if match is None:
+                values.append(number(item))
+                continue
+            start, stop = number(match.group(1)), number(match.group(2))
+            step = number(match.group(3)) if match.group(3) else 1
+        except ValueError:
+            raise ValueError(f"Invalid {name} value: {item}") from None
+        if step <= 0:
+            raise ValueError(f"Invalid {name} step: {item}")
+        direction = 1 if stop >= start else -1
+        count = int(round(abs(stop - start) / step, 6)) + 1
+        # Checked before the range is built, so a typo like 1-2147483647 costs nothing
+        if len(values) + count > MAX_AXIS_VALUES:
+            raise ValueError(f"{name} has more than {MAX_AXIS_VALUES} values")
+        values.extend(number(round(start + direction * step * i, 6)) for i in range(count))
+    if len(values) > MAX_AXIS_VALUES:
+        raise ValueError(f"{name} has more than {MAX_AXIS_VALUES} values")
+    return values
+
+
+def grid_size(axes: List[GridAxis]) -> int:
+    total = 1
+    for axis in axes:
+        total *= len(axis.values)
+    return total
+
+
+def check_grid_size(axes: List[GridAxis]):
+    """Raise ValueError for a grid with more than MAX_GRID_CELLS cells"""
+    total = grid_size(axes)
+    if total > MAX_GRID_CELLS:
+        raise ValueError(f"{total} cells is more than the {MAX_GRID_CELLS} a grid may have")
+
+
+def iter_grid_cells(base_params: dict, x: GridAxis, y: Optional[GridAxis] = None,
+                    z: Optional[GridAxis] = None) -> Iterator[GridCell]:
+    """Every cell, one sheet at a time and row by row, generated lazily"""
+    def indices(axis):
+        return range(len(axis.values)) if axis is not None else (0,)
+
+    for z_index, y_index, x_index in product(indices(z), indices(y), indices(x)):
+        params = dict(base_params)
+        for axis, index in ((z, z_index), (y, y_index), (x, x_index)):
+            if axis is not None:
+                params[AXES[axis.name]] = axis.values[index]
+        yield GridCell(x_index, y_index, z_index, params)
+
+
+def tile_size_for(image_size: Tuple[int, int], tile_width: int) -> Tuple[int, int]:
+    return tile_width, max(1, round(tile_width * image_size[1] / image_size[0]))
+
+
+def sheet_tile_width(columns: int, rows: int, image_size: Tuple[int, int], tile_width: int) -> int:
+    """Largest tile width up to tile_width that keeps a columns x rows sheet within MAX_SHEET_SIZE"""
+    aspect = image_size[1] / image_size[0]
+    fit_width = (MAX_SHEET_SIZE - LABEL_WIDTH) // columns
+    fit_height = int((MAX_SHEET_SIZE - 2 * LABEL_HEIGHT) / (rows * aspect))
+    return max(MIN_TILE_WIDTH, min(tile_width, fit_width, fit_height))
+
+
+def make_tile(image_bytes: Optional[bytes], tile_size: Tuple[int, int]) -> Image.Image:
+    """Downscaled cell image, or a failure marker for None"""
+    if image_bytes is None:
+        return Image.new('RGB', tile_size, MISSING_COLOR)
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image.draft('RGB', tile_size)  # Lets JPEG decode at reduced size
+        return image.convert('RGB').resize(tile_size, Image.Resampling.LANCZOS)
+
+
+def _font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has a single bitmap font
+        return ImageFont.load_default()
+
+
+class ContactSheet:
+    """One labelled X/Y sheet, composited tile by tile"""
+
+    def __init__(self, path: str, x: GridAxis, y: Optional[GridAxis], image_size: Tuple[int, int],
+                 tile_width: int = 256, title: str = ""):
+        self.path = path
+        self.x = x
+        self.y = y
+        self.tile_size = tile_size_for(image_size, tile_width)
+        self.top = LABEL_HEIGHT * (2 if title else 1)
+        self.left = LABEL_WIDTH if y is not None else 0
+        columns = len(x.values)
+        rows = len(y.values) if y is not None else 1
+        self.canvas = Image.new('RGB', (self.left + columns * self.tile_size[0], self.top + rows * self.tile_size[1]),
+                                BACKGROUND)
+        self.filled = 0
+        self._draw_labels(title)
+
+    def _draw_labels(self, title: str):
+        draw = ImageDraw.Draw(self.canvas)
+        font = _font(14)
+        tile_width, tile_height = self.tile_size
+        if title:
+            draw.text((8, LABEL_HEIGHT // 2), title, fill=LABEL_COLOR, font=font, anchor='lm')
+        label_y = self.top - LABEL_HEIGHT // 2
+        for index in range(len(self.x.values)):
+            center = self.left + index * tile_width + tile_width // 2
+            draw.text((center, label_y), self.x.label(index), fill=LABEL_COLOR, font=font, anchor='mm')
+        if self.y is not None:
+            for index in range(len(self.y.values)):
+                middle = self.top + index * tile_height + tile_height // 2
+                draw.text((8, middle), self.y.label(index), fill=LABEL_COLOR, font=font, anchor='lm')
+
+    def tile_box(self, cell: GridCell) -> Tuple[int, int]:
+        return self.left + cell.x * self.tile_size[0], self.top + cell.y * self.tile_size[1]
+
+    def paste(self, cell: GridCell, tile: Image.Image):
+        self.canvas.paste(tile, self.tile_box(cell))
+        self.filled += 1
+
+    def save(self):
+        """Write the sheet as it stands; readers never see a half-written file"""
+        temp_path = self.path + '.tmp'
+        self.canvas.save(temp_path, format='PNG')
+        os.replace(temp_path, self.path)
+
+
+class GridRun:
+    """Output folder of one grid: full-size cell images plus one contact sheet per Z value.
+
+    Raises ValueError for a grid over MAX_GRID_CELLS. add() may be called from
+    several worker threads. Sheets are rewritten at
+    most every save_interval seconds while results stream in, and once more
+    when they are complete. Results that arrive after finish() are dropped.
+    """
+
+    def __init__(self, output_dir: str, x: GridAxis, y: Optional[GridAxis] = None, z: Optional[GridAxis] = None,
+                 image_size: Tuple[int, int] = (832, 1216), tile_width: int = 256, save_interval: float = 1.0):
+        self.output_dir = output_dir
+        check_grid_size([axis for axis in (x, y, z) if axis is not None])
+        self.x, self.y, self.z = x, y, z
+        self.image_size = image_size
+        self.tile_width = sheet_tile_width(len(x.values), len(y.values) if y is not None else 1,
+                                           image_size, tile_width)
+        self.save_interval = save_interval
+        self.total = grid_size([axis for axis in (x, y, z) if axis is not None])
+        self.cells_per_sheet = grid_size([axis for axis in (x, y) if axis is not None])
+        self._sheets: Dict[int, ContactSheet] = {}
+        self._last_save: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._finished = False
+        os.makedirs(os.path.join(output_dir, 'cells'), exist_ok=True)
+
+    def cells(self, base_params: dict) -> Iterator[GridCell]:
+        return iter_grid_cells(base_params, self.x, self.y, self.z)
+
+    def cell_path(self, cell: GridCell) -> str:
+        name = f"z{cell.z:02d}_y{cell.y:02d}_x{cell.x:02d}_{cell.params.get('seed', 0)}.png"
+        return os.path.join(self.output_dir, 'cells', name)
+
+    def sheet_path(self, z: int) -> str:
+        return os.path.join(self.output_dir, f"sheet_{z:02d}.png" if self.z is not None else "sheet.png")
+
+    def _sheet(self, z: int) -> ContactSheet:
+        sheet = self._sheets.get(z)
+        if sheet is None:
+            title = self.z.label(z) if self.z is not None else ""
+            sheet = ContactSheet(self.sheet_path(z), self.x, self.y, self.image_size, self.tile_width, title)
+            self._sheets[z] = sheet
+            self._last_save[z] = 0.0
+        return sheet
+
+    def add(self, cell: GridCell, image_bytes: Optional[bytes]) -> Tuple[Optional[str], Optional[str]]:
+        """Store a cell's image (None if it failed) - returns (cell image path, sheet path if rewritten)"""
+        if self._finished:
+            return None, None  # A request that was still in flight when the grid was cancelled
+        cell_path = None
+        if image_bytes is not None:
+            cell_path = self.cell_path(cell)
+            with open(cell_path, 'wb') as f:
+                f.write(image_bytes)  # As received, NovelAI metadata included
+        # Decoding and scaling happen outside the lock so workers overlap
+        tile = make_tile(image_bytes, tile_size_for(self.image_size, self.tile_width))
+
+        with self._lock:
+            if self._finished:
+                return cell_path, None
+            sheet = self._sheet(cell.z)
+            sheet.paste(cell, tile)
+            complete = sheet.filled >= self.cells_per_sheet
+            now = time.monotonic()
+            if complete or now - self._last_save[cell.z] >= self.save_interval:
+                sheet.save()
+                self._last_save[cell.z] = now
+                if complete:
+                    del self._sheets[cell.z]  # Finished sheets don't need their canvas any more
+                return cell_path, sheet.path
+        return cell_path, None
+
+    def finish(self) -> List[str]:
+        """Save any incomplete sheets (e.g. after cancelling) - returns their paths"""
+        with self._lock:
+            self._finished = True
+            paths = []
+            for sheet in self._sheets.values():
+                sheet.save()
+                paths.append(sheet.path)
+            self._sheets = {}
+            return paths
@@ -0,0 +1,338 @@
+"""Local SQLite generation history with full-text search over prompts"""
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from typing import List
+from utils.prompt_parser import tokenize, iter_tags
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT,
+    path TEXT,
+    created REAL,
+    prompt TEXT,
+    negative_prompt TEXT,
+    model TEXT,
+    sampler TEXT,
+    scheduler TEXT,
+    seed INTEGER,
+    steps INTEGER,
+    scale REAL,
+    width INTEGER,
+    height INTEGER,
+    file_mtime REAL,
+    file_size INTEGER
+);
+CREATE INDEX IF NOT EXISTS images_hash ON images(content_hash);
+CREATE INDEX IF NOT EXISTS images_path ON images(path);
+CREATE INDEX IF NOT EXISTS images_model ON images(model, scale);
+CREATE INDEX IF NOT EXISTS images_sampler ON images(sampler, scale);
+CREATE INDEX IF NOT EXISTS images_seed ON images(seed);
+CREATE INDEX IF NOT EXISTS images_scale ON images(scale);
+CREATE INDEX IF NOT EXISTS images_created ON images(created);
+
+CREATE TABLE IF NOT EXISTS image_tags (
+    tag TEXT NOT NULL,
+    image_id INTEGER NOT NULL REFERENCES images(id) ON DELETE CASCADE,
+    PRIMARY KEY (tag, image_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS image_tags_image ON image_tags(image_id);
+
+-- PNGs found on disk without NovelAI metadata, so indexing doesn't re-read them every run
+CREATE TABLE IF NOT EXISTS plain_files (
+    path TEXT PRIMARY KEY,
+    file_mtime REAL,
+    file_size INTEGER
+) WITHOUT ROWID;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS images_fts USING fts5(
+    prompt, negative_prompt, content='images', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS images_ai AFTER INSERT ON images BEGIN
+    INSERT INTO images_fts(rowid, prompt, negative_prompt) VALUES (new.id, new.prompt, new.negative_prompt);
+END;
+CREATE TRIGGER IF NOT EXISTS images_ad AFTER DELETE ON images BEGIN
+    INSERT INTO images_fts(images_fts, rowid, prompt, negative_prompt)
+    VALUES ('delete', old.id, old.prompt, old.negative_prompt);
+END;
+CREATE TRIGGER IF NOT EXISTS images_au AFTER UPDATE OF prompt, negative_prompt ON images BEGIN
+    INSERT INTO images_fts(images_fts, rowid, prompt, negative_prompt)
+    VALUES ('delete', old.id, old.prompt, old.negative_prompt);
+    INSERT INTO images_fts(rowid, prompt, negative_prompt) VALUES (new.id, new.prompt, new.negative_prompt);
+END;
+"""
+
+_COLUMNS = ('content_hash', 'path', 'created', 'prompt', 'negative_prompt', 'model', 'sampler',
+            'scheduler', 'seed', 'steps', 'scale', 'width', 'height', 'file_mtime', 'file_size')
+
+def normalize_tag(tag: str) -> str:
+    """Canonical spelling used for tag lookups: weight syntax removed, lower case, spaces"""
+    tokens = tokenize(tag.strip())
+    if len(tokens) == 1 and tokens[0].weighted:
+        tag = tokens[0].tag
+    tag = tag.replace('\\(', '(').replace('\\)', ')').replace('_', ' ')
+    return ' '.join(tag.lower().split())
+
+
+def extract_tags(prompt: str) -> List[str]:
+    """Split a prompt into normalized, de-duplicated tags"""
+    tags = []
+    seen = set()
+    for token, _ in iter_tags(tokenize(prompt or '')):
+        tag = normalize_tag(token.tag)
+        if tag and tag not in seen:
+            seen.add(tag)
+            tags.append(tag)
+    return tags
+
+
+def _fts_query(text: str) -> str:
+    # Quote every word so user input can't break FTS5 query syntax
+    return ' '.join('"{}"'.format(word.replace('"', '""')) for word in text.split())
+
+
+class HistoryStore:
+    """Generation history in SQLite with an FTS5 prompt index.
+
+    Writes are queued and committed in batches by a background thread; reads
+    use a separate connection (WAL mode) so they never wait on the writer.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 500):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            # Databases created before file indexing lack the mtime and size columns
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(images)")}
+            if 'file_mtime' not in columns:
+                conn.execute("ALTER TABLE images ADD COLUMN file_mtime REAL")
+            if 'file_size' not in columns:
+                conn.execute("ALTER TABLE images ADD COLUMN file_size INTEGER")
+
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        self._writer = threading.Thread(target=self._run_writer, name="HistoryWriter", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    # Writes
+
+    def add(self, metadata: dict, content_hash: str = None, path: str = None, created: float = None):
+        """Queue one generated image for insertion"""
+        self._queue.put(('add', self._row(metadata, content_hash, path, created)))
+
+    def add_file(self, metadata: dict, path: str, file_mtime: float, file_size: int = None):
+        """Queue an image file found on disk, replacing any older record of the same path"""
+        row = self._row(metadata, None, path, file_mtime)
+        row['file_mtime'] = file_mtime
+        row['file_size'] = file_size
+        self._queue.put(('add_file', row))
+
+    def add_plain_file(self, path: str, file_mtime: float, file_size: int):
+        """Queue a file found on disk without NovelAI metadata, so it is skipped until it changes"""
+        self._queue.put(('plain_file', (path, file_mtime, file_size)))
+
+    @staticmethod
+    def _row(metadata: dict, content_hash: str, path: str, created: float) -> dict:
+        return {
+            'content_hash': content_hash,
+            'path': path,
+            'created': created if created is not None else time.time(),
+            'prompt': metadata.get('prompt', ''),
+            'negative_prompt': metadata.get('negative_prompt', ''),
+            'model': metadata.get('model'),
+            'sampler': metadata.get('sampler'),
+            'scheduler': metadata.get('scheduler'),
+            'seed': metadata.get('seed'),
+            'steps': metadata.get('steps'),
+            'scale': metadata.get('scale'),
+            'width': metadata.get('width'),
+            'height': metadata.get('height'),
+            'file_mtime': None,
+            'file_size': None,
+        }
+
+    def set_path(self, content_hash: str, path: str):
+        """Record where an image was saved once the file exists"""
+        self._queue.put(('set_path', (path, content_hash)))
+
+    def flush(self):
+        """Block until every queued write is committed"""
+        done = threading.Event()
+        self._queue.put(('flush', done))
+        done.wait()
+
+    def close(self):
+        self._queue.put(('stop', None))
+        self._writer.join()
+
+    def _run_writer(self):
+        conn = self._connect()
+        running = True
+        while running:
+            ops = [self._queue.get()]
+            # Drain whatever else is waiting so it commits in the same transaction
+            while len(ops) < self.batch_size:
+                try:
+                    ops.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            writes = [(op, payload) for op, payload in ops if op not in ('flush', 'stop')]
+            try:
+                try:
+                    with conn:
+                        for op, payload in writes:
+                            self._write(conn, op, payload)
+                except sqlite3.Error:
+                    # Retry one write per transaction so a single bad row doesn't drop the batch
+                    for op, payload in writes:
+                        try:
+                            with conn:
+                                self._write(conn, op, payload)
+                        except sqlite3.Error as e:
+                            print(f"History write failed: {e}")
+            finally:
+                # Waiters are released and stop is honoured even if writing failed
+                for op, payload in ops:
+                    if op == 'flush':
+                        payload.set()
+                    elif op == 'stop':
+                        running = False
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, op: str, payload):
+        if op == 'add':
+            self._insert(conn, payload)
+        elif op == 'add_file':
+            conn.execute("DELETE FROM images WHERE path = ?", (payload['path'],))
+            conn.execute("DELETE FROM plain_files WHERE path = ?", (payload['path'],))
+            self._insert(conn, payload)
+        elif op == 'plain_file':
+            conn.execute("DELETE FROM images WHERE path = ? AND file_mtime IS NOT NULL", payload[:1])
+            conn.execute("INSERT OR REPLACE INTO plain_files (path, file_mtime, file_size) VALUES (?, ?, ?)",
+                         payload)
+        elif op == 'set_path':
+            conn.execute("UPDATE images SET path = ? WHERE content_hash = ? AND path IS NULL", payload)
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, row: dict):
+        cursor = conn.execute(
+            f"INSERT INTO images ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+            [row[column] for column in _COLUMNS])
+        conn.executemany("INSERT OR IGNORE INTO image_tags (tag, image_id) VALUES (?, ?)",
+                         [(tag, cursor.lastrowid) for tag in extract_tags(row['prompt'])])
+
+    # Reads
+
+    def search(self, text: str = None, tag: str = None, model: str = None, sampler: str = None,
+               seed: int = None, min_scale: float = None, max_scale: float = None,
+               scale_above: float = None, scale_below: float = None, limit: int = 200) -> List[dict]:
+        """Most recently recorded images matching every given filter.
+
+        text is a full-text search over prompt and negative prompt; tag matches
+        whole prompt tags regardless of weight syntax or underscores.
+        """
+        clauses = []
+        params = []
+        joins = ''
+        # Order by the id of the driving index so LIMIT can stop early instead of sorting every match
+        order_column = 'images.id'
+
+        if text:
+            joins += " JOIN images_fts ON images_fts.rowid = images.id"
+            clauses.append("images_fts MATCH ?")
+            params.append(_fts_query(text))
+            order_column = 'images_fts.rowid'
+        if tag:
+            joins += " JOIN image_tags ON image_tags.image_id = images.id"
+            clauses.append("image_tags.tag = ?")
+            params.append(normalize_tag(tag))
+            order_column = 'image_tags.image_id'
+        for column, value in (('model', model), ('sampler', sampler), ('seed', seed)):
+            if value is not None:
+                clauses.append(f"images.{column} = ?")
+                params.append(value)
+        if min_scale is not None:
+            clauses.append("images.scale >= ?")
+            params.append(min_scale)
+        if max_scale is not None:
+            clauses.append("images.scale <= ?")
+            params.append(max_scale)
+        if scale_above is not None:
+            clauses.append("images.scale > ?")
+            params.append(scale_above)
+        if scale_below is not None:
+            clauses.append("images.scale < ?")
+            params.append(scale_below)
+
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        sql = f"SELECT images.* FROM images{joins}{where} ORDER BY {order_column} DESC LIMIT ?"
+        params.append(limit)
+
+        try:
+            return [dict(row) for row in self._reader().execute(sql, params)]
+        except sqlite3.Error as e:
+            print(f"History search failed: {e}")
+            return []
+
+    def query(self, query: str, limit: int = 200) -> List[dict]:
+        """Search with a one-line query such as 'tag:long hair cfg>6 model:nai-diffusion-3 sunset'.
+
+        Filters: tag:, model:, sampler:, seed:, cfg>N, cfg<N (also >=, <=);
+        every other word is full-text matched against the prompts.
+        """
+        filters = {}
+        words = []
+        # tag: values may contain spaces, so take everything up to the next filter
+        pattern = re.compile(r'(tag|model|sampler|seed):(.+?)(?=\s+(?:tag|model|sampler|seed):|\s+cfg[<>]|$)'
+                             r'|cfg(>=|<=|>|<)\s*([0-9.]+)|(\S+)')
+        for match in pattern.finditer(query.strip()):
+            key, value, op, number, word = match.groups()
+            if key == 'seed':
+                try:
+                    filters['seed'] = int(value)
+                except ValueError:
+                    return []
+            elif key:
+                filters[key] = value.strip()
+            elif op:
+                filters[{'>': 'scale_above', '<': 'scale_below',
+                         '>=': 'min_scale', '<=': 'max_scale'}[op]] = float(number)
+            elif word:
+                words.append(word)
+
+        return self.search(text=' '.join(words) or None, limit=limit, **filters)
+
+    def indexed_files(self, folder: str) -> dict:
+        """{path: (file_mtime, file_size)} for files under folder that were indexed from disk"""
+        prefix = os.path.join(os.path.abspath(folder), '')
+        rows = self._reader().execute(
+            "SELECT path, file_mtime, file_size FROM images WHERE file_mtime IS NOT NULL AND substr(path, 1, ?) = ?"
+            " UNION ALL SELECT path, file_mtime, file_size FROM plain_files WHERE substr(path, 1, ?) = ?",
+            (len(prefix), prefix, len(prefix), prefix))
+        return {row['path']: (row['file_mtime'], row['file_size']) for row in rows}
+
+    def count(self) -> int:
+        return self._reader().execute("SELECT COUNT(*) FROM images").fetchone()[0]
@@ -0,0 +1,110 @@
+"""Shared cache of decoded images so each generated image is decoded once per session"""
+import hashlib
+import threading
+from collections import OrderedDict
+from PyQt6.QtGui import QImage, QPixmap
+
+
+def content_key(image_bytes: bytes) -> str:
+    """Content hash used to key decoded views of the same image bytes"""
+    return hashlib.sha1(image_bytes).hexdigest()
+
+
+class _DecodedEntry:
+    __slots__ = ('key', 'qimage', 'pixmap', 'pil_image', 'size')
+    
+    def __init__(self, key: str, qimage: QImage):
+        self.key = key
+        self.qimage = qimage
+        self.pixmap = None
+        self.pil_image = None
+        self.size = qimage.sizeInBytes()
+
+
+class DecodedImageCache:
+    """LRU cache of decoded QImage/QPixmap/PIL views keyed by content hash.
+    
+    The compressed bytes are decoded once into a QImage; the QPixmap and PIL
+    views are converted from it on demand rather than decoded again. QImage and
+    PIL access is thread-safe; pixmap() must be called on the GUI thread.
+    """
+    
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> _DecodedEntry, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+    
+    def _entry(self, image_bytes: bytes, key: str = None) -> _DecodedEntry:
+        key = key or content_key(image_bytes)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        
+        # Decode outside the lock so workers can decode different images in parallel
+        entry = _DecodedEntry(key, QImage.fromData(image_bytes))
+        
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                return existing
+            self._entries[key] = entry
+            self._total_bytes += entry.size
+            self._evict()
+        return entry
+    
+    def _grow(self, entry: _DecodedEntry, extra: int):
+        with self._lock:
+            # An entry evicted while its view was being built no longer counts towards the total
+            if self._entries.get(entry.key) is not entry:
+                return
+            entry.size += extra
+            self._total_bytes += extra
+            self._evict()
+    
+    def _evict(self):
+        # Never evict the most recent entry - it is the one being used
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._total_bytes -= entry.size
+    
+    def qimage(self, image_bytes: bytes, key: str = None) -> QImage:
+        """Decoded QImage for the bytes"""
+        return self._entry(image_bytes, key).qimage
+    
+    def pixmap(self, image_bytes: bytes, key: str = None) -> QPixmap:
+        """QPixmap for the bytes (GUI thread only)"""
+        entry = self._entry(image_bytes, key)
+        if entry.pixmap is None:
+            entry.pixmap = QPixmap.fromImage(entry.qimage)
+            self._grow(entry, entry.qimage.width() * entry.qimage.height() * 4)
+        return entry.pixmap
+    
+    def pil_image(self, image_bytes: bytes, key: str = None):
+        """PIL view of the bytes, converted from the cached QImage (treat as read-only)"""
+        from PIL import Image
+        
+        entry = self._entry(image_bytes, key)
+        if entry.pil_image is None:
+            if entry.qimage.hasAlphaChannel():
+                mode, qformat = 'RGBA', QImage.Format.Format_RGBA8888
+            else:
+                mode, qformat = 'RGB', QImage.Format.Format_RGB888
+            converted = entry.qimage.convertToFormat(qformat)
+            bits = converted.constBits()
+            bits.setsize(converted.sizeInBytes())
+            entry.pil_image = Image.frombuffer(mode, (converted.width(), converted.height()), bytes(bits),
+                                               'raw', mode, converted.bytesPerLine(), 1)
+            self._grow(entry, converted.sizeInBytes())
+        return entry.pil_image
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+
+# Shared by the viewer, clipboard and image handler paths
+decoded_image_cache = DecodedImageCache()
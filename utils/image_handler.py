@@ -1,28 +1,59 @@
-from PyQt6.QtGui import QPixmap
-from PyQt6.QtCore import QByteArray
-from PIL import Image
 import io
+import os
 import base64
+from typing import TYPE_CHECKING, Dict, Optional
+from utils.png_metadata import is_png, insert_text_chunks
+
+# Qt and PIL are imported where they are needed, so saving works headless (see cli.py)
+if TYPE_CHECKING:
+    from PyQt6.QtGui import QPixmap
+
+
+def _pil_image(image_bytes: bytes):
+    """PIL view of the bytes: from the shared decoded-image cache with Qt, else decoded by PIL"""
+    try:
+        from utils.image_cache import decoded_image_cache
+    except ImportError:  # No Qt (command line, batch runs)
+        from PIL import Image
+        image = Image.open(io.BytesIO(image_bytes))
+        image.load()
+        return image
+    return decoded_image_cache.pil_image(image_bytes)
+
 
 class ImageHandler:
     @staticmethod
-    def bytes_to_pixmap(image_bytes: bytes) -> QPixmap:
-        """Convert image bytes to QPixmap"""
-        byte_array = QByteArray(image_bytes)
-        pixmap = QPixmap()
-        pixmap.loadFromData(byte_array)
-        return pixmap
+    def bytes_to_pixmap(image_bytes: bytes) -> 'QPixmap':
+        """Convert image bytes to QPixmap (shared decoded-image cache)"""
+        from utils.image_cache import decoded_image_cache
+        return decoded_image_cache.pixmap(image_bytes)
     
     @staticmethod
-    def save_image(image_bytes: bytes, filepath: str):
-        """Save image bytes to file"""
-        image = Image.open(io.BytesIO(image_bytes))
+    def save_image(image_bytes: bytes, filepath: str, text: Optional[Dict[str, str]] = None):
+        """Save image bytes to file.
+        
+        PNG to PNG is written as-is (keeping NovelAI's metadata chunks), with any
+        extra text spliced in at chunk level. Only real format conversions decode
+        and re-encode the image.
+        """
+        ext = os.path.splitext(filepath)[1].lower()
+        if ext in ('', '.png') and is_png(image_bytes):
+            if text:
+                image_bytes = insert_text_chunks(image_bytes, text)
+            with open(filepath, 'wb') as f:
+                f.write(image_bytes)
+            return
+        
+        image = _pil_image(image_bytes)
+        if ext in ('.jpg', '.jpeg') and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')  # JPEG has no alpha channel
         image.save(filepath)
     
     @staticmethod
     def resize_image(image_bytes: bytes, width: int, height: int) -> bytes:
         """Resize image and return as bytes"""
-        image = Image.open(io.BytesIO(image_bytes))
+        from PIL import Image
+        image = _pil_image(image_bytes)
         resized = image.resize((width, height), Image.Resampling.LANCZOS)
         
         output = io.BytesIO()
@@ -0,0 +1,107 @@
+"""Bulk import of NovelAI PNG folders into the history store from their metadata chunks
+
+    python -m utils.png_indexer /path/to/archive [--workers 16]
+
+Only the text chunks before the first IDAT are read, so no pixel data is
+decoded. Runs are incremental: files whose mtime and size match the index are
+skipped, which also makes an interrupted run resumable. PNGs without NovelAI
+metadata are recorded too, so they are only read again once they change.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from utils.png_metadata import read_text_chunks_from_file, metadata_from_novelai_comment
+
+
+def scan_pngs(folder: str):
+    """Yield (path, mtime, size) for every PNG under folder"""
+    stack = [os.path.abspath(folder)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.lower().endswith('.png'):
+                        try:
+                            stat = entry.stat()
+                            yield entry.path, stat.st_mtime, stat.st_size
+                        except OSError:
+                            continue
+        except OSError as e:
+            print(f"Skipping {current}: {e}")
+
+
+def read_png_metadata(path: str) -> Optional[dict]:
+    """Metadata from a PNG's NovelAI Comment chunk, or None if it has none.
+
+    Raises OSError if the file can't be read.
+    """
+    try:
+        text = read_text_chunks_from_file(path)
+        comment = text.get('Comment')
+        if not comment:
+            return None
+        return metadata_from_novelai_comment(comment)
+    except ValueError as e:
+        # Malformed PNGs and invalid Comment JSON count as having no metadata
+        print(f"Skipping {path}: {e}")
+        return None
+
+
+def index_folder(history_store, folder: str, workers: int = 8, progress=None) -> Tuple[int, int]:
+    """Add new or modified PNGs under folder to history_store.
+
+    Returns (indexed, skipped). progress(done, total) is called periodically.
+    Chunk reads are I/O bound and release the GIL, so a thread pool is enough.
+    """
+    known = history_store.indexed_files(folder)
+    files = list(scan_pngs(folder))
+    pending = [(path, mtime, size) for path, mtime, size in files if known.get(path) != (mtime, size)]
+
+    def read(item):
+        path, mtime, size = item
+        try:
+            return path, mtime, size, read_png_metadata(path)
+        except Exception as e:  # One unreadable file must not end the run
+            print(f"Skipping {path}: {e}")
+            return path, mtime, size, False  # Not recorded, so it is retried next run
+
+    indexed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for done, (path, mtime, size, metadata) in enumerate(executor.map(read, pending), 1):
+            if metadata:
+                history_store.add_file(metadata, path, mtime, size)
+                indexed += 1
+            elif metadata is None:
+                history_store.add_plain_file(path, mtime, size)
+            if progress is not None and (done % 1000 == 0 or done == len(pending)):
+                progress(done, len(pending))
+
+    history_store.flush()
+    return indexed, len(files) - indexed
+
+
+def main():
+    from config import Config
+    from utils.history_store import HistoryStore
+
+    parser = argparse.ArgumentParser(description="Index NovelAI PNG metadata into the history database")
+    parser.add_argument('folder')
+    parser.add_argument('--db', default=Config.HISTORY_DB, help="history database path")
+    parser.add_argument('--workers', type=int, default=min(32, (os.cpu_count() or 4) * 4))
+    args = parser.parse_args()
+
+    store = HistoryStore(args.db)
+    start = time.perf_counter()
+    indexed, skipped = index_folder(store, args.folder, args.workers,
+                                    progress=lambda done, total: print(f"  {done}/{total} files read"))
+    store.close()
+    print(f"Indexed {indexed} images, skipped {skipped} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
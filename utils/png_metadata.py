@@ -0,0 +1,197 @@
+"""Byte-level PNG chunk helpers - read and write text metadata without touching pixel data"""
+import json
+import struct
+import zlib
+from typing import Dict, Iterator, Optional, Tuple
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+TEXT_CHUNK_TYPES = (b'tEXt', b'iTXt', b'zTXt')
+
+
+def is_png(data: bytes) -> bool:
+    """Check the PNG signature"""
+    return data[:8] == PNG_SIGNATURE
+
+
+def make_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """Encode one chunk: length, type, data, CRC"""
+    return (struct.pack('>I', len(data)) + chunk_type + data +
+            struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+
+def iter_chunks(png_bytes: bytes) -> Iterator[Tuple[bytes, int, int]]:
+    """Yield (chunk_type, start, end) for each chunk; start/end cover the whole chunk"""
+    if not is_png(png_bytes):
+        raise ValueError("Not a PNG file")
+    
+    pos = len(PNG_SIGNATURE)
+    total = len(png_bytes)
+    while pos + 8 <= total:
+        length, chunk_type = struct.unpack_from('>I4s', png_bytes, pos)
+        end = pos + 12 + length
+        if end > total:
+            raise ValueError("Truncated PNG chunk")
+        yield chunk_type, pos, end
+        pos = end
+        if chunk_type == b'IEND':
+            break
+
+
+def text_chunk(key: str, value: str) -> bytes:
+    """Build a tEXt chunk, or an uncompressed iTXt chunk when value is not Latin-1"""
+    try:
+        return make_chunk(b'tEXt', key.encode('latin-1') + b'\x00' + value.encode('latin-1'))
+    except UnicodeEncodeError:
+        # keyword, null, compression flag, compression method, empty language, empty translated keyword
+        return make_chunk(b'iTXt', key.encode('latin-1') + b'\x00\x00\x00\x00\x00' + value.encode('utf-8'))
+
+
+def decode_text_chunk(chunk_type: bytes, data: bytes) -> Tuple[str, str]:
+    """Decode the data of a tEXt/zTXt/iTXt chunk into (keyword, text); ValueError if it is corrupt"""
+    keyword, _, rest = data.partition(b'\x00')
+    key = keyword.decode('latin-1')
+    if chunk_type == b'tEXt':
+        return key, rest.decode('latin-1')
+    try:
+        if chunk_type == b'zTXt':
+            return key, zlib.decompress(rest[1:]).decode('latin-1')
+        
+        # iTXt: compression flag, compression method, language\0, translated keyword\0, text
+        compressed = rest[:1] == b'\x01'
+        _, _, rest = rest[2:].partition(b'\x00')
+        _, _, text = rest.partition(b'\x00')
+        if compressed:
+            text = zlib.decompress(text)
+        return key, text.decode('utf-8')
+    except zlib.error as e:
+        raise ValueError(f"Corrupt {chunk_type.decode('latin-1')} chunk: {e}") from None
+
+
+def read_text_chunks(png_bytes: bytes) -> Dict[str, str]:
+    """Collect text metadata from PNG bytes, stopping at the first IDAT chunk"""
+    text = {}
+    for chunk_type, start, end in iter_chunks(png_bytes):
+        if chunk_type == b'IDAT':
+            break
+        if chunk_type in TEXT_CHUNK_TYPES:
+            key, value = decode_text_chunk(chunk_type, png_bytes[start + 8:end - 4])
+            text[key] = value
+    return text
+
+
+def read_text_chunks_from_file(path: str) -> Dict[str, str]:
+    """Read text metadata from a PNG file without reading its pixel data.
+    
+    Chunk headers are read one at a time and non-text chunks are skipped with a
+    seek, stopping at the first IDAT - usually only a few KB of a large file.
+    """
+    text = {}
+    with open(path, 'rb') as f:
+        if f.read(8) != PNG_SIGNATURE:
+            raise ValueError("Not a PNG file")
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            length, chunk_type = struct.unpack('>I4s', header)
+            if chunk_type in (b'IDAT', b'IEND'):
+                break
+            if chunk_type in TEXT_CHUNK_TYPES:
+                data = f.read(length)
+                if len(data) < length:
+                    raise ValueError("Truncated PNG chunk")
+                key, value = decode_text_chunk(chunk_type, data)
+                text[key] = value
+                f.seek(4, 1)  # CRC
+            else:
+                f.seek(length + 4, 1)
+    return text
+
+
+def _chunk_keyword(png_bytes: bytes, start: int, end: int) -> str:
+    data_start = start + 8
+    null = png_bytes.find(b'\x00', data_start, end - 4)
+    if null == -1:
+        return ''
+    return png_bytes[data_start:null].decode('latin-1')
+
+
+def insert_text_chunks(png_bytes: bytes, text: Dict[str, str]) -> bytes:
+    """Return png_bytes with text chunks spliced in after IHDR.
+    
+    Existing text chunks with the same keywords are replaced. Everything else,
+    including the compressed IDAT stream, is copied through untouched.
+    """
+    if not text:
+        return png_bytes
+    
+    new_chunks = b''.join(text_chunk(key, value) for key, value in text.items())
+    parts = [PNG_SIGNATURE]
+    
+    for chunk_type, start, end in iter_chunks(png_bytes):
+        if chunk_type in TEXT_CHUNK_TYPES and _chunk_keyword(png_bytes, start, end) in text:
+            continue
+        parts.append(png_bytes[start:end])
+        if chunk_type == b'IHDR':
+            parts.append(new_chunks)
+    
+    return b''.join(parts)
+
+
+def novelai_text_chunks(novelai_metadata: dict) -> Dict[str, str]:
+    """Text chunks NovelAI writes into its PNGs, for metadata in NovelAI's format"""
+    return {
+        "Title": "AI generated image",
+        "Description": novelai_metadata.get("prompt", ""),
+        "Software": "NovelAI",
+        "Source": "Stable Diffusion",
+        "Comment": json.dumps(novelai_metadata),
+    }
+
+
+def metadata_from_novelai_comment(comment: str) -> dict:
+    """Turn a NovelAI Comment JSON string back into the app's metadata dict; ValueError if it isn't one"""
+    data = json.loads(comment)
+    if not isinstance(data, dict):
+        raise ValueError("NovelAI Comment is not a JSON object")
+    metadata = {
+        'prompt': data.get('prompt', ''),
+        'negative_prompt': data.get('uc', ''),
+        'steps': data.get('steps'),
+        'width': data.get('width'),
+        'height': data.get('height'),
+        'scale': data.get('scale'),
+        'sampler': data.get('sampler'),
+        'scheduler': data.get('noise_schedule'),
+        'seed': data.get('seed'),
+    }
+    if data.get('model'):
+        metadata['model'] = data['model']
+    return {key: value for key, value in metadata.items() if value is not None}
+
+
+# Best-effort model from the Source chunk NovelAI writes (longest prefixes first)
+_SOURCE_MODELS = (
+    ("NovelAI Diffusion V4.5", 'nai-diffusion-4-5-full'),
+    ("NovelAI Diffusion V4", 'nai-diffusion-4-full'),
+    ("Stable Diffusion XL", 'nai-diffusion-3'),
+)
+
+
+def novelai_parameters_from_text(text: Dict[str, str]) -> Optional[dict]:
+    """Generation parameters from a PNG's text chunks, or None if it has no NovelAI Comment"""
+    comment = text.get('Comment')
+    if not comment:
+        return None
+    try:
+        metadata = metadata_from_novelai_comment(comment)
+    except ValueError:
+        return None
+    
+    if 'model' not in metadata:
+        source = text.get('Source', '')
+        for prefix, model in _SOURCE_MODELS:
+            if source.startswith(prefix):
+                metadata['model'] = model
+                break
+    return metadata
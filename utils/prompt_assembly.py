@@ -0,0 +1,51 @@
+"""Prompt assembly: prompt box contents to the exact prompts sent to the API"""
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple
+from utils.prompt_converter import sd_to_nai_format
+from utils.prompt_normalizer import dedupe_prompt
+
+# Appended by the quality toggles
+POSITIVE_QUALITY_TAGS = "best quality, very aesthetic, absurdres"
+NEGATIVE_QUALITY_TAGS = "blurry, lowres, error, film grain, scan artifacts, worst quality, bad quality, jpeg artifacts, very displeasing, chromatic aberration, multiple views, logo, too many watermarks, white blank page, blank page"
+
+
+class PromptInputs(NamedTuple):
+    """Snapshot of the prompt boxes and quality toggles for one job"""
+    prompt: str
+    negative_prompt: str
+    positive_quality: bool = True
+    negative_quality: bool = True
+
+
+class AssembledPrompt(NamedTuple):
+    prompt: str                   # NAI format, as sent to the API
+    negative_prompt: str
+    display_prompt: str           # SD format, as typed plus quality tags, deduplicated
+    display_negative_prompt: str
+
+
+def with_quality_tags(prompt: str, quality_tags: str, enabled: bool) -> str:
+    prompt = prompt.strip()
+    if not enabled:
+        return prompt
+    return f"{prompt}, {quality_tags}" if prompt else quality_tags
+
+
+def _with_deduped(prompt: str, quality_tags: str, enabled: bool) -> str:
+    # The quality block is appended after deduplication so it stays intact at the end
+    deduped = dedupe_prompt(prompt, reserved=quality_tags if enabled else '')
+    return with_quality_tags(deduped, quality_tags, enabled)
+
+
+@lru_cache(maxsize=256)
+def assemble_prompt(inputs: PromptInputs) -> AssembledPrompt:
+    """Drop duplicate tags, add quality tags and convert to NAI format (cached by content)"""
+    display_prompt = _with_deduped(inputs.prompt, POSITIVE_QUALITY_TAGS, inputs.positive_quality)
+    display_negative = _with_deduped(inputs.negative_prompt, NEGATIVE_QUALITY_TAGS, inputs.negative_quality)
+    return AssembledPrompt(sd_to_nai_format(display_prompt), sd_to_nai_format(display_negative),
+                           display_prompt, display_negative)
+
+
+def assemble_prompts(inputs: Iterable[PromptInputs]) -> List[AssembledPrompt]:
+    """Assemble a batch; repeated inputs are converted once"""
+    return [assemble_prompt(item) for item in inputs]
@@ -0,0 +1,103 @@
+"""Canonicalize and deduplicate prompt tags before submission"""
+from typing import Dict, List, Optional
+from utils.prompt_parser import PromptToken, tokenize, iter_tags, format_weight
+from utils.tag_manager import TagManager
+
+
+class _MergedTag:
+    """First spelling of a tag plus every weight it was given"""
+
+    __slots__ = ('text', 'syntax', 'explicit_total', 'explicit_count')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.syntax = 'sd'
+        self.explicit_total = 0.0
+        self.explicit_count = 0
+
+    def add(self, weight: float, syntax: Optional[str]):
+        if syntax is None:
+            return
+        if not self.explicit_count:
+            self.syntax = syntax
+        self.explicit_total += weight
+        self.explicit_count += 1
+
+    def render(self) -> str:
+        # Explicit weights win over plain mentions; several explicit weights are averaged
+        if not self.explicit_count:
+            return self.text
+        weight = self.explicit_total / self.explicit_count
+        return self.text if round(weight, 1) == 1.0 else format_weight(self.text, weight, self.syntax)
+
+
+def canonical_tag(tag: str, tag_manager: TagManager) -> str:
+    """Database name for a tag or any of its aliases, else its normalized spelling"""
+    info = tag_manager.lookup(tag)
+    return info['name'] if info is not None else TagManager.normalize(tag)
+
+
+def dedupe_prompt(text: str, tag_manager: TagManager = None, reserved: str = '') -> str:
+    """Drop repeated tags (same canonical tag, any spelling), merging their weights.
+
+    Each tag keeps its first spelling and position, and the separators around
+    kept tags are left as written. Plain mentions of a tag in reserved (the
+    quality tags appended afterwards) are dropped so that block can stay
+    verbatim at the end. One pass over the tokens with a dict keyed by
+    canonical name, so it is linear in the prompt length. Prompts without
+    duplicates are returned unchanged.
+    """
+    if not text:
+        return text
+    tag_manager = tag_manager or TagManager.shared()
+    tokens = tokenize(text)
+    reserved_keys = {canonical_tag(tag, tag_manager) for tag in reserved.split(',') if tag.strip()}
+
+    merged: Dict[str, _MergedTag] = {}
+    # Per top-level token: its tags' canonical keys, or None for tags already seen
+    token_keys: List[List[Optional[str]]] = []
+    duplicates = False
+    for token in tokens:
+        keys = []
+        syntax = token.syntax if token.weighted else None
+        for leaf, weight in iter_tags([token]):
+            key = canonical_tag(leaf.tag, tag_manager)
+            if syntax is None and key in reserved_keys:
+                duplicates = True
+                keys.append(None)
+                continue
+            entry = merged.get(key)
+            if entry is None:
+                entry = merged[key] = _MergedTag(text[leaf.start:leaf.end])
+                keys.append(key)
+            else:
+                duplicates = True
+                keys.append(None)
+            entry.add(weight, syntax)
+        token_keys.append(keys)
+
+    if not duplicates:
+        return text
+
+    pieces = []
+    previous_end = 0
+    for token, keys in zip(tokens, token_keys):
+        # A kept token brings the separator before it; a dropped one takes its separator with it
+        separator = text[previous_end:token.start] if pieces else text[:tokens[0].start]
+        previous_end = token.end
+        if _unchanged(token, keys, merged):
+            pieces.append(separator + text[token.start:token.end])
+            continue
+        rendered = [merged[key].render() for key in keys if key is not None]
+        if rendered:
+            pieces.append(separator + ', '.join(rendered))
+    return ''.join(pieces) + text[tokens[-1].end:] if pieces else ''
+
+
+def _unchanged(token: PromptToken, keys: List[Optional[str]], merged: Dict[str, _MergedTag]) -> bool:
+    """True if the token can be emitted as written (none of its tags were merged away or reweighted)"""
+    if None in keys:
+        return False
+    if not token.weighted:
+        return not merged[keys[0]].explicit_count
+    return all(merged[key].explicit_count == 1 for key in keys)
@@ -0,0 +1,508 @@
+"""Single-pass prompt tokenizer shared by format conversion, weighting and highlighting
+
+A prompt is split into tokens: plain tags, SD weight groups "(tag:1.2)" and
+NAI weight groups "1.2::tag::". Groups may hold several tags; their contents
+are parsed into child tokens. SD groups nest (up to MAX_NESTING deep). NAI
+weights don't nest: a new "w::" opener inside a NAI group ends the current
+group, as it does in NovelAI. Commas, newlines and surrounding whitespace
+separate tokens and are not tokens themselves.
+
+    python -m utils.prompt_parser    # tokenizer benchmark
+"""
+import re
+import time
+from bisect import bisect_left
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+SEPARATORS = ',\n'
+MAX_NESTING = 32  # Deeper SD groups are read as plain text, bounding recursion
+
+_NAI_OPENER = re.compile(r'-?(?:\d+(?:\.\d*)?|\.\d+)::')  # One way to split any digit run
+# Characters where a plain tag may end or a weight group may begin
+_PLAIN_STOP = re.compile(r'[,\n(\\:0-9.\-]')
+_NUMBER_CHARS = '0123456789.'
+_PAREN_CHARS = re.compile(r'\\.|[()]', re.DOTALL)
+
+
+class PromptToken(NamedTuple):
+    tag: str            # Text without weight syntax (escapes kept); a group's whole content
+    weight: float
+    start: int          # Span in the source text, including weight syntax
+    end: int
+    syntax: str         # 'plain', 'sd' or 'nai'
+    children: tuple = ()  # Tokens inside a weight group
+
+    @property
+    def weighted(self) -> bool:
+        return self.syntax != 'plain'
+
+
+def _match_parens(text: str) -> dict:
+    """{open index: close index} for balanced, unescaped parentheses"""
+    pairs = {}
+    stack = []
+    escaped = False
+    for index, char in enumerate(text):
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '(':
+            stack.append(index)
+        elif char == ')' and stack:
+            pairs[stack.pop()] = index
+    return pairs
+
+
+class _Scanner:
+    """Tokenizer state for one text.
+
+    A full scan precomputes paren pairs and '::' positions up front; a lazy
+    scanner (used to re-tokenize around an edit) looks them up on demand so
+    its cost stays proportional to the region it actually reads.
+    """
+
+    def __init__(self, text: str, lazy: bool = False):
+        self.text = text
+        if lazy:
+            self.parens = {}
+            self.double_colons = None
+        else:
+            self.parens = _match_parens(text)
+            self.double_colons = [match.start() for match in re.finditer('::', text)]
+        self.lazy = lazy
+        self.depth = 0
+
+    def parse(self, pos: int, end: int, in_nai: bool = False) -> Tuple[List[PromptToken], int]:
+        """Tokens in text[pos:end]; inside a NAI group stop at its closing '::' or the next opener"""
+        tokens = []
+        while True:
+            token, pos = self.next_token(pos, end, in_nai)
+            if token is None:
+                return tokens, pos
+            tokens.append(token)
+
+    def next_token(self, pos: int, end: int, in_nai: bool = False) -> Tuple[Optional[PromptToken], int]:
+        """(token, position after it) for the first token at or after pos, or (None, stop position)"""
+        text = self.text
+        while pos < end:
+            char = text[pos]
+            if char in SEPARATORS or char.isspace():
+                pos += 1
+                continue
+            if in_nai and (text.startswith('::', pos) or self.nai_opening(pos, end)):
+                return None, pos
+            token = self.weight_group(pos, end) or self.plain(pos, end, in_nai)
+            return token, token.end
+        return None, end
+
+    def paren_close(self, pos: int) -> Optional[int]:
+        if not self.lazy or pos in self.parens:
+            return self.parens.get(pos)
+        close = None
+        depth = 0
+        for match in _PAREN_CHARS.finditer(self.text, pos):
+            char = match.group()
+            if char[0] == '\\':
+                continue
+            depth += 1 if char == '(' else -1
+            if depth == 0:
+                close = match.start()
+                break
+        self.parens[pos] = close
+        return close
+
+    def has_double_colon(self, pos: int) -> bool:
+        """True if '::' occurs at or after pos"""
+        if self.lazy:
+            return self.text.find('::', pos) >= 0
+        return bisect_left(self.double_colons, pos) < len(self.double_colons)
+
+    def weight_group(self, pos: int, end: int) -> Optional[PromptToken]:
+        opening = self.group_opening(pos, end)
+        if opening is None:
+            return None
+        text = self.text
+        syntax, content_start, weight, bound = opening
+        if syntax == 'sd':
+            self.depth += 1
+            try:
+                children, _ = self.parse(content_start, bound)
+            finally:
+                self.depth -= 1
+            return PromptToken(text[content_start:bound].strip(), weight, pos,
+                               self.paren_close(pos) + 1, 'sd', tuple(children))
+        children, close = self.parse(content_start, end, in_nai=True)
+        if text.startswith('::', close):
+            group_end = min(close + 2, end)
+            content_end = close
+        else:
+            # Ended by the next opener (or the end of the text): the group stops after its last tag
+            content_end = group_end = children[-1].end if children else content_start
+        return PromptToken(text[content_start:content_end].strip(), weight, pos,
+                           group_end, 'nai', tuple(children))
+
+    def group_opening(self, pos: int, end: int) -> Optional[tuple]:
+        """(syntax, content start, weight, content bound) if a weight group starts at pos"""
+        text = self.text
+        if text[pos] == '(':
+            if self.depth >= MAX_NESTING:
+                return None
+            close = self.paren_close(pos)
+            if close is not None and close < end:
+                colon, weight = self.sd_weight(pos + 1, close)
+                if colon is not None:
+                    return 'sd', pos + 1, weight, colon
+        else:
+            return self.nai_opening(pos, end)
+        return None
+
+    def nai_opening(self, pos: int, end: int) -> Optional[tuple]:
+        """group_opening() for a 'w::' opener at pos"""
+        if not self.may_open_nai(pos):
+            return None
+        match = _NAI_OPENER.match(self.text, pos, end)
+        # Require a '::' somewhere ahead; a group without its own closer ends at the next opener or the end
+        if match and self.has_double_colon(match.end()):
+            return 'nai', match.end(), float(match.group()[:-2]), end
+        return None
+
+    def may_open_nai(self, pos: int) -> bool:
+        text = self.text
+        if text[pos] not in _NUMBER_CHARS and text[pos] != '-':
+            return False
+        # A weight can't continue a word, e.g. the "1" in "x1::"
+        return pos == 0 or not (text[pos - 1].isalnum() or text[pos - 1] in '._')
+
+    def sd_weight(self, start: int, close: int) -> Tuple[Optional[int], float]:
+        """(colon index, weight) if text[start:close] ends in ':number', else (None, 1.0)"""
+        text = self.text
+        index = close
+        while index > start and text[index - 1].isspace():
+            index -= 1
+        number_end = index
+        while index > start and text[index - 1] in _NUMBER_CHARS:
+            index -= 1
+        if index > start and text[index - 1] == '-':
+            index -= 1
+        number_start = index
+        while index > start and text[index - 1].isspace():
+            index -= 1
+        if number_start == number_end or index <= start or text[index - 1] != ':':
+            return None, 1.0
+        try:
+            return index - 1, float(text[number_start:number_end])
+        except ValueError:
+            return None, 1.0
+
+    def plain(self, pos: int, end: int, in_nai: bool) -> PromptToken:
+        text = self.text
+        index = pos + 1
+        while index < end:
+            match = _PLAIN_STOP.search(text, index, end)
+            if match is None:
+                index = end
+                break
+            index = match.start()
+            char = text[index]
+            if char in SEPARATORS:
+                break
+            if char == '\\':
+                index += 2  # Escaped character, e.g. \( or \)
+                continue
+            if char == ':':
+                if in_nai and text.startswith('::', index):
+                    break
+            elif self.group_opening(index, end) is not None:
+                break
+            index += 1
+        index = min(index, end)
+
+        stop = index
+        while stop > pos and text[stop - 1].isspace():
+            stop -= 1
+        return PromptToken(text[pos:stop], 1.0, pos, stop, 'plain')
+
+
+def tokenize(text: str) -> List[PromptToken]:
+    """Top-level tokens of a prompt in source order (linear in the prompt length)"""
+    if not text:
+        return []
+    tokens, _ = _Scanner(text).parse(0, len(text))
+    return tokens
+
+
+def iter_tags(tokens: List[PromptToken], weight: float = 1.0) -> Iterator[Tuple[PromptToken, float]]:
+    """Yield (plain token, effective weight) for every tag, with group weights multiplied in"""
+    for token in tokens:
+        if token.weighted:
+            yield from iter_tags(token.children, weight * token.weight)
+        else:
+            yield token, weight
+
+
+def token_at(tokens: List[PromptToken], start: int, end: int = None) -> Optional[PromptToken]:
+    """Innermost token whose span contains text[start:end]"""
+    end = start if end is None else end
+    for token in tokens:
+        if token.start <= start and end <= token.end:
+            inner = token_at(token.children, start, end) if token.children else None
+            return inner or token
+        if token.start > end:
+            break
+    return None
+
+
+def group_at(tokens: List[PromptToken], start: int, end: int = None) -> Optional[PromptToken]:
+    """Innermost weight group whose span contains text[start:end]"""
+    end = start if end is None else end
+    group = None
+    while tokens:
+        for token in tokens:
+            if token.start <= start and end <= token.end:
+                if not token.weighted:
+                    return group
+                group = token
+                tokens = token.children
+                break
+            if token.start > end:
+                return group
+        else:
+            return group
+    return group
+
+
+def shift_token(token: PromptToken, delta: int) -> PromptToken:
+    """token (and its children) moved delta characters"""
+    if not delta:
+        return token
+    return token._replace(start=token.start + delta, end=token.end + delta,
+                          children=tuple(shift_token(child, delta) for child in token.children))
+
+
+def _opens_paren(text: str, token: PromptToken) -> bool:
+    """True if token's span leaves an unescaped '(' open"""
+    depth = 0
+    for match in _PAREN_CHARS.finditer(text, token.start, token.end):
+        char = match.group()
+        if char == '(':
+            depth += 1
+        elif char == ')' and depth:
+            depth -= 1
+    return depth > 0
+
+
+class IncrementalTokens:
+    """Top-level token list of a text that is kept in sync with edits.
+
+    apply_edit() re-tokenizes only from the token before the edit until the
+    new tokens line up with the old ones again. Tokens behind the most recent
+    edit are stored unshifted with a pending offset (a gap, as in a gap
+    buffer), so repeated typing in one place never shifts the rest of the
+    list. Lookups are binary searches over token starts.
+    """
+
+    # Edits touching these can re-pair parentheses or '::' anywhere in the text
+    STRUCTURAL_CHARS = frozenset('():\\')
+
+    def __init__(self, text: str = ''):
+        self.reset(text)
+
+    def reset(self, text: str):
+        """Re-tokenize the whole text"""
+        self.text = text
+        self._tokens = tokenize(text)
+        self._starts = [token.start for token in self._tokens]
+        self._gap = len(self._tokens)  # Tokens from here on still need _delta added
+        self._delta = 0
+        # Tokens with a '(' that closes after them; an edit anywhere inside such a pair
+        # can turn it into a weight group, so while any exist edits re-tokenize everything
+        self._open_flags = [_opens_paren(text, token) for token in self._tokens]
+        self._open_count = sum(self._open_flags)
+
+    def __len__(self):
+        return len(self._tokens)
+
+    @property
+    def tokens(self) -> List[PromptToken]:
+        self._move_gap(len(self._tokens))
+        return list(self._tokens)
+
+    def _start(self, index: int) -> int:
+        return self._starts[index] + (self._delta if index >= self._gap else 0)
+
+    def _token(self, index: int) -> PromptToken:
+        token = self._tokens[index]
+        return shift_token(token, self._delta) if index >= self._gap else token
+
+    def _move_gap(self, index: int):
+        """Apply the pending offset up to index (or take it back down to index)"""
+        if self._delta:
+            if index > self._gap:
+                for i in range(self._gap, index):
+                    self._tokens[i] = shift_token(self._tokens[i], self._delta)
+                    self._starts[i] += self._delta
+            elif index < self._gap:
+                for i in range(index, self._gap):
+                    self._tokens[i] = shift_token(self._tokens[i], -self._delta)
+                    self._starts[i] -= self._delta
+        self._gap = index
+
+    def _first_ending_at_or_after(self, position: int) -> int:
+        """Index of the first top-level token with end >= position"""
+        low, high = 0, len(self._tokens)
+        while low < high:
+            middle = (low + high) // 2
+            if self._start(middle) + (self._tokens[middle].end - self._tokens[middle].start) < position:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def top_level_at(self, position: int) -> Optional[PromptToken]:
+        """Top-level token whose span contains position"""
+        index = self._first_ending_at_or_after(position)
+        if index < len(self._tokens) and self._start(index) <= position:
+            return self._token(index)
+        return None
+
+    def tokens_in(self, start: int, end: int) -> List[PromptToken]:
+        """Top-level tokens overlapping text[start:end]"""
+        tokens = []
+        index = self._first_ending_at_or_after(start + 1)
+        while index < len(self._tokens) and self._start(index) < end:
+            tokens.append(self._token(index))
+            index += 1
+        return tokens
+
+    def token_at(self, start: int, end: int = None) -> Optional[PromptToken]:
+        """Innermost token containing text[start:end]"""
+        token = self.top_level_at(start)
+        return token_at([token], start, end) if token is not None else None
+
+    def group_at(self, start: int, end: int = None) -> Optional[PromptToken]:
+        """Innermost weight group containing text[start:end]"""
+        token = self.top_level_at(start)
+        return group_at([token], start, end) if token is not None else None
+
+    def apply_edit(self, position: int, removed: int, added: int, text: str):
+        """Update for text[position:position + removed] replaced by added characters (text is the new text)"""
+        old_text = self.text
+        if (position < 0 or position + removed > len(old_text)
+                or len(text) != len(old_text) - removed + added
+                or not self.STRUCTURAL_CHARS.isdisjoint(old_text[position:position + removed])
+                or not self.STRUCTURAL_CHARS.isdisjoint(text[position:position + added])
+                or self._open_count):
+            self.reset(text)
+            return
+
+        delta = added - removed
+        self.text = text
+
+        # Restart one token early: deleting a comma merges it with the edited one
+        first = self._first_ending_at_or_after(position)
+        if first > 0:
+            first -= 1
+        # Old starts before position are unchanged in the new text
+        restart = min(self._start(first), position) if first < len(self._tokens) else 0
+
+        # Re-tokenize until a new token matches an old one shifted by delta; everything after is unchanged
+        scanner = _Scanner(text, lazy=True)
+        new_tokens = []
+        old_index = first
+        edit_end = position + added
+        pos = restart
+        while True:
+            token, pos = scanner.next_token(pos, len(text))
+            if token is None:
+                old_index = len(self._tokens)
+                break
+            if token.start >= edit_end:
+                while old_index < len(self._tokens) and self._start(old_index) + delta < token.start:
+                    old_index += 1
+                if old_index < len(self._tokens) and self._start(old_index) + delta == token.start:
+                    old = self._tokens[old_index]
+                    if (old.end - old.start == token.end - token.start and old.syntax == token.syntax
+                            and old.weight == token.weight):
+                        break
+            new_tokens.append(token)
+
+        self._move_gap(old_index)
+        self._tokens[first:old_index] = new_tokens
+        self._starts[first:old_index] = [token.start for token in new_tokens]
+        new_flags = [_opens_paren(text, token) for token in new_tokens]
+        self._open_count += sum(new_flags) - sum(self._open_flags[first:old_index])
+        self._open_flags[first:old_index] = new_flags
+        self._gap = first + len(new_tokens)
+        self._delta += delta
+
+
+def format_weight(tag: str, weight: float, syntax: str) -> str:
+    """Write tag with weight in 'nai' (weight::tag::) or 'sd' ((tag:weight)) syntax"""
+    if syntax == 'nai':
+        return f"{weight:.1f}::{tag}::"
+    return f"({tag}:{weight:.1f})"
+
+
+def _join(text: str, tokens: List[PromptToken], render: Callable, start: int, end: int) -> str:
+    """Re-emit text[start:end] with each token replaced by render(token), keeping separators"""
+    pieces = []
+    last = start
+    for token in tokens:
+        pieces.append(text[last:token.start])
+        pieces.append(render(token))
+        last = token.end
+    pieces.append(text[last:end])
+    return ''.join(pieces)
+
+
+def _render(text: str, token: PromptToken, syntax: str, scale: float = None) -> str:
+    if not token.weighted:
+        return text[token.start:token.end] if scale is None else format_weight(token.tag, scale, syntax)
+
+    weight = token.weight * (scale if scale is not None else 1.0)
+    if not any(child.weighted for child in token.children):
+        return format_weight(token.tag, weight, syntax)
+    # Nested weights: push this group's weight down onto each child
+    return _join(text, token.children, lambda child: _render(text, child, syntax, weight),
+                 token.children[0].start, token.children[-1].end)
+
+
+def convert_weights(text: str, syntax: str) -> str:
+    """Rewrite every weight group of the other syntax (and any nested group) into syntax"""
+    if not text:
+        return text
+
+    def render(token):
+        if token.syntax not in ('plain', syntax) or any(child.weighted for child in token.children):
+            return _render(text, token, syntax)
+        return text[token.start:token.end]
+
+    return _join(text, tokenize(text), render, 0, len(text))
+
+
+def _benchmark():
+    base = "1girl, solo, (long hair:1.2), 1.1::blue eyes, smile::, looking at viewer, \\(cosplay\\), "
+    for length in (1_000, 2_000, 5_000, 10_000, 20_000):
+        text = (base * (length // len(base) + 1))[:length]
+        runs = 20
+        start = time.perf_counter()
+        for _ in range(runs):
+            tokens = tokenize(text)
+        elapsed = (time.perf_counter() - start) / runs
+        print(f"{length:>6} chars: {len(tokens):>5} tokens in {elapsed * 1000:7.2f} ms "
+              f"({elapsed * 1e9 / length:.0f} ns/char)")
+
+        # One keystroke in the middle, applied incrementally
+        incremental = IncrementalTokens(text)
+        position = length // 2
+        start = time.perf_counter()
+        for _ in range(runs):
+            text = text[:position] + 'k' + text[position:]
+            incremental.apply_edit(position, 0, 1, text)
+            position += 1
+        print(f"{'':>6}        keystroke update in {(time.perf_counter() - start) / runs * 1000:7.2f} ms")
+
+
+if __name__ == '__main__':
+    _benchmark()
@@ -0,0 +1,117 @@
+"""On-disk cache of generation responses keyed by the request payload"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+def canonical_request_key(request_data: dict) -> str:
+    """Hash the request JSON in canonical form (sorted keys, compact separators)"""
+    canonical = json.dumps(request_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class RequestCache:
+    """Content-addressed store of raw API responses with a size cap and LRU eviction.
+    
+    Entries are the response zips exactly as returned by /ai/generate-image, so a
+    hit goes through the same extraction path as a live response. File mtimes
+    record recency, which keeps the LRU order across restarts.
+    """
+    
+    def __init__(self, cache_dir: str, max_bytes: int = 1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+    
+    def _path(self, key: str) -> str:
+        # Shard by the first byte of the hash to keep directories small
+        return os.path.join(self.cache_dir, key[:2], f"{key}.zip")
+    
+    def _load_index(self):
+        """Rebuild the LRU order from the files already on disk"""
+        found = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.zip'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, name[:-4], stat.st_size))
+        
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+        
+        self._evict()
+    
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached response for key, or None on a miss"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+            os.utime(path)  # Persist recency for the next session
+            return content
+        except OSError:
+            with self._lock:
+                size = self._entries.pop(key, None)
+                if size is not None:
+                    self._total_bytes -= size
+            return None
+    
+    def put(self, key: str, content: bytes):
+        """Store a response, evicting least recently used entries over the cap"""
+        if len(content) > self.max_bytes:
+            return
+        
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        
+        # Write to a temporary file first so a crash never leaves a truncated entry
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous
+            self._entries[key] = len(content)
+            self._total_bytes += len(content)
+            self._evict()
+    
+    def discard(self, key: str):
+        """Drop an entry, e.g. one that turned out to be unreadable"""
+        with self._lock:
+            size = self._entries.pop(key, None)
+            if size is not None:
+                self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+    
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
@@ -1,8 +1,12 @@
 import csv
 import os
-from typing import List, Tuple, Dict
+import threading
+from typing import List, Tuple, Dict, Optional
 
 class TagManager:
+    _shared = None
+    _shared_lock = threading.Lock()
+    
     def __init__(self):
         self.tags = []
         self.tag_dict = {}
@@ -49,6 +53,24 @@ class TagManager:
         except Exception as e:
             print(f"Error loading tags: {e}")
     
+    @classmethod
+    def shared(cls) -> 'TagManager':
+        """Process-wide instance so the tag database is only loaded once"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+    
+    @staticmethod
+    def normalize(tag: str) -> str:
+        """Key used in tag_dict: lower case, underscores for spaces, escapes removed"""
+        tag = tag.replace('\\(', '(').replace('\\)', ')')
+        return '_'.join(tag.lower().split())
+    
+    def lookup(self, tag: str) -> Optional[Dict]:
+        """Tag info for a prompt tag as typed (spaces or underscores, escaped parens), or None"""
+        return self.tag_dict.get(self.normalize(tag))
+    
     def search_tags(self, query: str, limit: int = 20) -> List[Tuple[str, int, int]]:
         """Search for tags matching query. Returns (tag_name, category, count)"""
         if not query:
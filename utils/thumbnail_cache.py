@@ -0,0 +1,84 @@
+"""Persistent thumbnail store keyed by image content hash and thumbnail size"""
+import json
+import os
+import threading
+from typing import Optional
+
+
+class ThumbnailCache:
+    """Encoded thumbnails on disk, one file per (content hash, size).
+    
+    Files on disk are also mapped (path, mtime, file size) -> content hash in an
+    append-only index, so reopening a folder finds existing thumbnails without
+    reading or hashing the full images again.
+    """
+    
+    def __init__(self, cache_dir: str, size: int = 128):
+        self.cache_dir = cache_dir
+        self.size = size
+        self._lock = threading.Lock()
+        self._file_keys = {}  # (path, mtime_ns, file_size) -> content hash
+        self._index_path = os.path.join(cache_dir, 'files.jsonl')
+        
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+    
+    def _load_index(self):
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        path, mtime_ns, file_size, key = json.loads(line)
+                    except ValueError:
+                        continue  # Tolerate a torn last line
+                    self._file_keys[(path, mtime_ns, file_size)] = key
+        except FileNotFoundError:
+            pass
+    
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, str(self.size), key[:2], f"{key}.jpg")
+    
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the encoded thumbnail for key, or None"""
+        try:
+            with open(self.path_for(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+    
+    def put(self, key: str, data: bytes):
+        """Store an encoded thumbnail"""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    
+    @staticmethod
+    def _file_id(path: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+    
+    def key_for_file(self, path: str) -> Optional[str]:
+        """Content hash previously recorded for this exact file version"""
+        file_id = self._file_id(path)
+        if file_id is None:
+            return None
+        with self._lock:
+            return self._file_keys.get(file_id)
+    
+    def remember_file(self, path: str, key: str):
+        """Record the content hash of a file so it needn't be read again"""
+        file_id = self._file_id(path)
+        if file_id is None:
+            return
+        with self._lock:
+            if self._file_keys.get(file_id) == key:
+                return
+            self._file_keys[file_id] = key
+            with open(self._index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps([*file_id, key]) + '\n')
@@ -0,0 +1,185 @@
+"""Prompt token counting against NovelAI's prompt length limits
+
+V3 models encode prompts with CLIP's byte-level BPE and V4 models with T5's
+unigram (SentencePiece) vocabulary. Either tokenizer is loaded from a local
+Hugging Face style tokenizer.json:
+
+    <TOKENIZER_DIR>/clip_tokenizer.json   (V3)
+    <TOKENIZER_DIR>/t5_tokenizer.json     (V4 / V4.5)
+
+Without the file, a character-based estimate is used instead. Weight syntax
+is not counted (NAI strips it before encoding), and counts are cached per tag
+so recounting an edited prompt only encodes the changed tags.
+"""
+import json
+import math
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from utils.prompt_parser import tokenize, iter_tags
+
+# Usable prompt tokens per model family
+TOKEN_LIMITS = {'clip': 225, 't5': 512}
+# An estimate must exceed the limit by this factor before a prompt is treated as too long
+ESTIMATE_MARGIN = 1.25
+
+_CLIP_WORDS = re.compile(r"'s|'t|'re|'ve|'m|'ll|'d|[^\W\d_]+|\d|[^\s\w]+|_", re.IGNORECASE)
+_ESTIMATE_WORDS = re.compile(r"[^\W\d_]+|\d|[^\s\w]")
+
+
+def model_family(model: str) -> str:
+    """'t5' for V4 models, 'clip' for V3"""
+    return 't5' if model.startswith('nai-diffusion-4') else 'clip'
+
+
+def _bytes_to_unicode() -> Dict[int, str]:
+    # GPT-2/CLIP byte-level BPE alphabet: every byte maps to a printable character
+    printable = list(range(ord('!'), ord('~') + 1)) + list(range(ord('¡'), ord('¬') + 1)) + list(range(ord('®'), ord('ÿ') + 1))
+    codes = printable[:]
+    extra = 0
+    for byte in range(256):
+        if byte not in printable:
+            printable.append(byte)
+            codes.append(256 + extra)
+            extra += 1
+    return dict(zip(printable, map(chr, codes)))
+
+
+class BPEModel:
+    """Byte-level BPE (CLIP) from a tokenizer.json model section"""
+
+    def __init__(self, model: dict):
+        merges = model.get('merges', [])
+        self.ranks = {}
+        for rank, merge in enumerate(merges):
+            pair = tuple(merge.split(' ', 1)) if isinstance(merge, str) else tuple(merge)
+            self.ranks[pair] = rank
+        self.suffix = model.get('end_of_word_suffix') or ''
+        self.byte_map = _bytes_to_unicode()
+        self._cache = {}
+
+    def count(self, text: str) -> int:
+        return sum(self.count_word(word) for word in _CLIP_WORDS.findall(text.lower()))
+
+    def count_word(self, word: str) -> int:
+        cached = self._cache.get(word)
+        if cached is not None:
+            return cached
+        symbols = [self.byte_map[byte] for byte in word.encode('utf-8')]
+        symbols[-1] += self.suffix
+        while len(symbols) > 1:
+            # Merge the best ranked adjacent pair
+            best_rank, best_index = None, -1
+            for index in range(len(symbols) - 1):
+                rank = self.ranks.get((symbols[index], symbols[index + 1]))
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best_rank, best_index = rank, index
+            if best_rank is None:
+                break
+            symbols[best_index:best_index + 2] = [symbols[best_index] + symbols[best_index + 1]]
+        self._cache[word] = len(symbols)
+        return len(symbols)
+
+
+class UnigramModel:
+    """SentencePiece unigram (T5) from a tokenizer.json model section"""
+
+    def __init__(self, model: dict):
+        self.scores = {piece: score for piece, score in model.get('vocab', [])}
+        self.max_piece = max((len(piece) for piece in self.scores), default=1)
+        self._cache = {}
+
+    def count(self, text: str) -> int:
+        return sum(self.count_word('▁' + word) for word in text.split())
+
+    def count_word(self, word: str) -> int:
+        cached = self._cache.get(word)
+        if cached is not None:
+            return cached
+        # Viterbi: best[i] = (score, pieces) for the most likely split of word[:i]
+        best = [(0.0, 0)] + [(-math.inf, 0)] * len(word)
+        for end in range(1, len(word) + 1):
+            for start in range(max(0, end - self.max_piece), end):
+                score = self.scores.get(word[start:end])
+                if score is None:
+                    if end - start == 1:
+                        score = -100.0  # Unknown character becomes <unk>
+                    else:
+                        continue
+                candidate = best[start][0] + score
+                if candidate > best[end][0]:
+                    best[end] = (candidate, best[start][1] + 1)
+        self._cache[word] = best[-1][1]
+        return best[-1][1]
+
+
+class EstimateModel:
+    """Rough count when no vocabulary is available: long words split every ~5 characters"""
+
+    def count(self, text: str) -> int:
+        return sum(max(1, math.ceil(len(word) / 5)) for word in _ESTIMATE_WORDS.findall(text))
+
+
+def load_tokenizer_model(path: str):
+    """BPEModel or UnigramModel for a tokenizer.json, or None if unavailable"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            model = json.load(f).get('model', {})
+    except (OSError, ValueError):
+        return None
+    if model.get('type') == 'BPE':
+        return BPEModel(model)
+    if model.get('type') == 'Unigram':
+        return UnigramModel(model)
+    print(f"Unsupported tokenizer type in {path}: {model.get('type')}")
+    return None
+
+
+class TokenCounter:
+    """Count prompt tokens for a model family, caching per tag"""
+
+    def __init__(self, family: str, tokenizer_dir: str = None):
+        self.family = family
+        self.limit = TOKEN_LIMITS[family]
+        model = None
+        if tokenizer_dir:
+            model = load_tokenizer_model(os.path.join(tokenizer_dir, f"{family}_tokenizer.json"))
+        self.exact = model is not None
+        self.model = model or EstimateModel()
+        self.count_tag = lru_cache(maxsize=65536)(self.model.count)
+
+    def count(self, prompt: str) -> int:
+        """Tokens the prompt encodes to (weight syntax excluded, separators included)"""
+        tags = [token.tag for token, _ in iter_tags(tokenize(prompt))]
+        # Each comma between tags is one more token
+        return sum(self.count_tag(tag) for tag in tags) + max(0, len(tags) - 1)
+
+    def check(self, prompt: str) -> Tuple[int, bool]:
+        """(token count, fits within the limit)"""
+        count = self.count(prompt)
+        return count, count <= self.limit
+
+    def over_limit(self, prompt: str) -> Tuple[int, bool]:
+        """(token count, certainly too long) - estimates only count once past the margin"""
+        count = self.count(prompt)
+        limit = self.limit if self.exact else self.limit * ESTIMATE_MARGIN
+        return count, count > limit
+
+
+_counters = {}
+_counters_lock = threading.Lock()
+
+
+def get_token_counter(model: str, tokenizer_dir: Optional[str] = None) -> TokenCounter:
+    """Shared counter for a model's family (the vocabulary is loaded once)"""
+    if tokenizer_dir is None:
+        from config import Config
+        tokenizer_dir = Config.TOKENIZER_DIR
+    family = model_family(model)
+    with _counters_lock:
+        counter = _counters.get((family, tokenizer_dir))
+        if counter is None:
+            counter = _counters[(family, tokenizer_dir)] = TokenCounter(family, tokenizer_dir)
+        return counter
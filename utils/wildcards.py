@@ -0,0 +1,292 @@
+"""Wildcard / dynamic prompt expansion for batch generation
+
+    {red|green|blue} hair     one of the alternatives (nested braces allowed)
+    __colors__ hair           one line of <wildcard dir>/colors.txt
+
+Braces without a top-level '|' are left alone, so NAI {emphasis} keeps working.
+Wildcard files are memory-mapped with an index of line offsets, so picking a
+line from a multi-MB list is O(1) and the file is never read into memory.
+Lines may themselves contain alternations and wildcards; blank lines and
+lines starting with '#' are ignored.
+"""
+import mmap
+import os
+import random
+import re
+from array import array
+from functools import lru_cache
+from itertools import islice, repeat
+from typing import Iterator, List, Optional, Tuple
+from utils.prompt_assembly import PromptInputs
+
+MODES = ('random', 'combinatorial')
+MAX_DEPTH = 20  # Guards against wildcard files that include themselves
+
+_WILDCARD = re.compile(r'__([\w\-./]+?)__')
+# The lookahead stops [ \t]* from backtracking into indented comments and blank lines
+_LINE = re.compile(rb'^[ \t]*(?=[^ \t#\r\n])([^\r\n]*)', re.MULTILINE)
+
+
+class Choice(tuple):
+    """Alternatives of a {a|b|c} group; each one is a parsed template"""
+
+
+class Wildcard(str):
+    """Name of a wildcard file"""
+
+
+class WildcardFile:
+    """Memory-mapped wildcard list with a line offset index"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._starts = array('q')
+        self._ends = array('q')
+        self._file = open(path, 'rb')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._map = b''
+            self.has_syntax = False
+            return
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        for match in _LINE.finditer(self._map):
+            self._starts.append(match.start(1))
+            self._ends.append(match.end(1))
+        # Plain lists (the common case) can be counted and enumerated without parsing lines
+        self.has_syntax = self._map.find(b'{') >= 0 or self._map.find(b'__') >= 0
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __getitem__(self, index: int) -> str:
+        return self._map[self._starts[index]:self._ends[index]].decode('utf-8', 'replace').strip()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+
+class WildcardLibrary:
+    """Wildcard files under a directory, opened on first use"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._files = {}
+
+    def get(self, name: str) -> Optional[WildcardFile]:
+        if name not in self._files:
+            path = os.path.join(self.directory, *name.split('/')) + '.txt'
+            try:
+                self._files[name] = WildcardFile(path)
+            except OSError as e:
+                print(f"Wildcard __{name}__ not available: {e}")
+                self._files[name] = None
+        return self._files[name]
+
+    def close(self):
+        for wildcard_file in self._files.values():
+            if wildcard_file is not None:
+                wildcard_file.close()
+        self._files = {}
+
+
+def has_wildcards(text: str) -> bool:
+    """True if text contains anything to expand"""
+    return any(isinstance(part, (Choice, Wildcard)) for part in parse_template(text))
+
+
+def _split_alternatives(text: str, start: int) -> Tuple[Optional[List[str]], int]:
+    """Alternatives of the brace group opening at text[start], and the index after it"""
+    depth = 0
+    options = []
+    option_start = start + 1
+    index = start
+    while index < len(text):
+        char = text[index]
+        if char == '\\':
+            index += 2
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                options.append(text[option_start:index])
+                return (options if len(options) > 1 else None), index + 1
+        elif char == '|' and depth == 1:
+            options.append(text[option_start:index])
+            option_start = index + 1
+        index += 1
+    return None, len(text)
+
+
+@lru_cache(maxsize=4096)
+def parse_template(text: str) -> tuple:
+    """Split text into literals, Choice groups and Wildcard names"""
+    parts = []
+    literal = []
+    index = 0
+    while index < len(text):
+        char = text[index]
+        if char == '{':
+            options, after = _split_alternatives(text, index)
+            if options is not None:
+                parts.append(''.join(literal))
+                literal = []
+                parts.append(Choice(parse_template(option) for option in options))
+                index = after
+                continue
+        elif char == '_' and text.startswith('__', index):
+            match = _WILDCARD.match(text, index)
+            if match:
+                parts.append(''.join(literal))
+                literal = []
+                parts.append(Wildcard(match.group(1).strip()))
+                index = match.end()
+                continue
+        elif char == '\\' and index + 1 < len(text) and text[index + 1] in '{}|':
+            literal.append(text[index + 1])
+            index += 2
+            continue
+        literal.append(char)
+        index += 1
+    parts.append(''.join(literal))
+    return tuple(part for part in parts if part != '')
+
+
+class PromptExpander:
+    """Expand templates into concrete prompts, lazily"""
+
+    def __init__(self, library: WildcardLibrary = None):
+        self.library = library
+
+    def _options(self, part) -> Iterator[tuple]:
+        if isinstance(part, Choice):
+            yield from part
+            return
+        wildcard_file = self.library.get(part) if self.library is not None else None
+        if wildcard_file is None:
+            yield (f"__{part}__",)  # Unknown wildcards stay visible in the prompt
+            return
+        for index in range(len(wildcard_file)):
+            yield parse_template(wildcard_file[index])
+
+    def _expand(self, parts: tuple, index: int = 0, depth: int = 0) -> Iterator[str]:
+        # Odometer over the parts: the last part varies fastest, nothing is materialized
+        if index == len(parts):
+            yield ''
+            return
+        part = parts[index]
+        if not isinstance(part, (Choice, Wildcard)):
+            for tail in self._expand(parts, index + 1, depth):
+                yield part + tail
+            return
+        if depth > MAX_DEPTH:
+            return
+        for option in self._options(part):
+            for head in self._expand(option, 0, depth + 1):
+                for tail in self._expand(parts, index + 1, depth):
+                    yield head + tail
+
+    def combinations(self, template: str) -> Iterator[str]:
+        """Every expansion of template in order, generated one at a time"""
+        return self._expand(parse_template(template))
+
+    def count(self, template: str) -> int:
+        """Number of expansions combinations() yields"""
+        return self._count(parse_template(template))
+
+    def _count(self, parts: tuple, depth: int = 0) -> int:
+        total = 1
+        for part in parts:
+            if isinstance(part, (Choice, Wildcard)) and depth > MAX_DEPTH:
+                return 0
+            if isinstance(part, Choice):
+                total *= sum(self._count(option, depth + 1) for option in part)
+            elif isinstance(part, Wildcard):
+                wildcard_file = self.library.get(part) if self.library is not None else None
+                if wildcard_file is None:
+                    continue
+                if not wildcard_file.has_syntax:
+                    total *= len(wildcard_file)
+                else:
+                    total *= sum(self._count(parse_template(wildcard_file[i]), depth + 1)
+                                 for i in range(len(wildcard_file)))
+        return total
+
+    def sample(self, template: str, rng: random.Random) -> str:
+        """One random expansion (each alternative or line equally likely)"""
+        return self._sample(parse_template(template), rng)
+
+    def _sample(self, parts: tuple, rng: random.Random, depth: int = 0) -> str:
+        if depth > MAX_DEPTH:
+            return ''
+        pieces = []
+        for part in parts:
+            if isinstance(part, Choice):
+                pieces.append(self._sample(rng.choice(part), rng, depth + 1))
+            elif isinstance(part, Wildcard):
+                wildcard_file = self.library.get(part) if self.library is not None else None
+                if wildcard_file is None or not len(wildcard_file):
+                    pieces.append(f"__{part}__")
+                else:
+                    line = wildcard_file[rng.randrange(len(wildcard_file))]
+                    pieces.append(self._sample(parse_template(line), rng, depth + 1))
+            else:
+                pieces.append(part)
+        return ''.join(pieces)
+
+    def generate(self, template: str, mode: str = 'random', seed: int = None,
+                 unique: bool = True, max_misses: int = 1000) -> Iterator[str]:
+        """Stream prompts from template; take as many as needed (e.g. with itertools.islice).
+
+        random mode never ends on its own unless unique is set and max_misses
+        samples in a row were duplicates. Duplicates are tracked by hash to keep
+        memory small on long runs.
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        seen = set()
+
+        if mode == 'combinatorial':
+            for prompt in self.combinations(template):
+                if unique:
+                    key = hash(prompt)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                yield prompt
+            return
+
+        rng = random.Random(seed)
+        misses = 0
+        while misses < max_misses:
+            prompt = self.sample(template, rng)
+            if unique:
+                key = hash(prompt)
+                if key in seen:
+                    misses += 1
+                    continue
+                seen.add(key)
+            misses = 0
+            yield prompt
+
+
+def expand_prompt_inputs(inputs: PromptInputs, expander: PromptExpander, count: int,
+                         mode: str = 'random', seed: int = None) -> Iterator[PromptInputs]:
+    """Concrete PromptInputs for a batch, produced lazily.
+
+    Random mode (and a prompt without wildcards) always yields count jobs;
+    picks may repeat. Combinatorial mode stops early once every combination
+    has been used. Wildcards in the negative prompt are sampled independently
+    for each job.
+    """
+    rng = random.Random(seed)
+    negative_varies = has_wildcards(inputs.negative_prompt)
+    if not has_wildcards(inputs.prompt):
+        prompts = repeat(inputs.prompt)
+    else:
+        prompts = expander.generate(inputs.prompt, mode, seed, unique=(mode == 'combinatorial'))
+    for prompt in islice(prompts, count):
+        negative = expander.sample(inputs.negative_prompt, rng) if negative_varies else inputs.negative_prompt
+        yield inputs._replace(prompt=prompt, negative_prompt=negative)